@@ -1,6 +1,6 @@
 from django.contrib import admin
 from background_requests.models import Request, Report
-from .models import AdminDashboardSettings, RequestActivity, AdminNote, RequestAssignment
+from .models import AdminDashboardSettings, RequestActivity, AdminNote, RequestAssignment, DailyMetrics, ReportUpload
 
 @admin.register(AdminDashboardSettings)
 class AdminDashboardSettingsAdmin(admin.ModelAdmin):
@@ -30,5 +30,19 @@ class RequestAssignmentAdmin(admin.ModelAdmin):
     search_fields = ['request__name', 'assigned_to__username', 'assigned_by__username']
     readonly_fields = ['assigned_at']
 
+@admin.register(DailyMetrics)
+class DailyMetricsAdmin(admin.ModelAdmin):
+    list_display = ['date', 'plan_key', 'revenue', 'transactions', 'failed_transactions', 'requests_created', 'requests_completed']
+    list_filter = ['date', 'plan_key']
+    readonly_fields = ['updated_at']
+    ordering = ['-date', 'plan_key']
+
+@admin.register(ReportUpload)
+class ReportUploadAdmin(admin.ModelAdmin):
+    list_display = ['id', 'request', 'filename', 'file_size', 'status', 'attempts', 'created_at', 'completed_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['filename', 'request__name']
+    readonly_fields = ['received_parts', 'checksum', 'last_error', 'created_at', 'updated_at', 'completed_at']
+
 # The Request and Report models are already registered in the requests app
 # This file can be used for custom admin views or dashboard-specific admin configurations
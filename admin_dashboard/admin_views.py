@@ -1,18 +1,25 @@
+import io
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from rest_framework.decorators import action
+from rest_framework.pagination import PageNumberPagination
+from django.db import transaction
 from django.db.models import Q, Count
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+from background_check.pagination import KeysetPagination
 from background_requests.models import Request, Report
-from .models import AdminDashboardSettings, RequestActivity, AdminNote, RequestAssignment
+from background_requests.stats import request_status_counts, total_clients
+from .models import AdminDashboardSettings, RequestActivity, AdminNote, RequestAssignment, ReportUpload
 from .serializers import (
     AdminRequestSerializer, AdminReportSerializer, AdminDashboardSettingsSerializer,
     RequestActivitySerializer, AdminNoteSerializer, RequestAssignmentSerializer,
     StatusUpdateSerializer, BulkStatusUpdateSerializer, DashboardStatsSerializer,
-    AdminUserSerializer
+    AdminUserSerializer, ReportUploadInitSerializer, ReportUploadSerializer, admin_request_queryset
 )
+from .uploads import UploadError, abort_upload, complete_upload, start_upload, write_part
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
@@ -33,25 +40,21 @@ class AdminDashboardStatsView(APIView):
         }
     )
     def get(self, request):
-        # Get counts
-        total_requests = Request.objects.count()
-        pending_requests = Request.objects.filter(status='Pending').count()
-        in_progress_requests = Request.objects.filter(status='In Progress').count()
-        completed_requests = Request.objects.filter(status='Completed').count()
-        total_clients = User.objects.filter(is_staff=False).count()
+        # Get counts (one grouped query, cached briefly)
+        counts = request_status_counts()
         
         # Get recent requests (last 10)
-        recent_requests = Request.objects.all().order_by('-created_at')[:10]
+        recent_requests = admin_request_queryset().order_by('-created_at')[:10]
         
         # Get recent activities (last 10)
         recent_activities = RequestActivity.objects.all().order_by('-timestamp')[:10]
         
         data = {
-            'total_requests': total_requests,
-            'pending_requests': pending_requests,
-            'in_progress_requests': in_progress_requests,
-            'completed_requests': completed_requests,
-            'total_clients': total_clients,
+            'total_requests': counts['total'],
+            'pending_requests': counts['pending'],
+            'in_progress_requests': counts['in_progress'],
+            'completed_requests': counts['completed'],
+            'total_clients': total_clients(),
             'recent_requests': recent_requests,
             'recent_activities': recent_activities
         }
@@ -72,6 +75,9 @@ class AdminRequestManagementView(APIView):
             openapi.Parameter('status', openapi.IN_QUERY, description="Filter by status (Pending, In Progress, Completed)", type=openapi.TYPE_STRING),
             openapi.Parameter('assigned_to', openapi.IN_QUERY, description="Filter by assigned admin user ID", type=openapi.TYPE_INTEGER),
             openapi.Parameter('search', openapi.IN_QUERY, description="Search by name, email, or username", type=openapi.TYPE_STRING),
+            openapi.Parameter('pagination', openapi.IN_QUERY, description="Set to 'cursor' to page through results with keyset pagination", type=openapi.TYPE_STRING),
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="Cursor from the previous page's 'next' link", type=openapi.TYPE_STRING),
+            openapi.Parameter('page_size', openapi.IN_QUERY, description="Results per page in cursor mode (max 100)", type=openapi.TYPE_INTEGER),
         ],
         responses={
             200: AdminRequestSerializer(many=True),
@@ -84,7 +90,7 @@ class AdminRequestManagementView(APIView):
         assigned_to = request.query_params.get('assigned_to', None)
         search = request.query_params.get('search', None)
         
-        queryset = Request.objects.all().order_by('-created_at')
+        queryset = admin_request_queryset().order_by('-created_at')
         
         # Apply filters
         if status_filter:
@@ -100,6 +106,12 @@ class AdminRequestManagementView(APIView):
                 Q(user__username__icontains=search)
             )
         
+        paginator = KeysetPagination()
+        if paginator.is_keyset_requested(request):
+            page = paginator.paginate_queryset(queryset, request, view=self)
+            serializer = AdminRequestSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+        
         serializer = AdminRequestSerializer(queryset, many=True)
         return Response(serializer.data)
 
@@ -224,7 +236,7 @@ class AdminBulkStatusUpdateView(APIView):
     
     @swagger_auto_schema(
         operation_summary="Bulk Update Request Status",
-        operation_description="Update the status of multiple requests at once. Automatically logs activities for each updated request.",
+        operation_description="Update the status of multiple requests at once in a single transaction. Logs an activity and notifies the owner for each request whose status changed.",
         operation_id="admin_requests_bulk_update",
         tags=['Admin - Request Management'],
         request_body=BulkStatusUpdateSerializer,
@@ -246,38 +258,39 @@ class AdminBulkStatusUpdateView(APIView):
         serializer = BulkStatusUpdateSerializer(data=request.data)
         
         if serializer.is_valid():
-            request_ids = serializer.validated_data['request_ids']
+            request_ids = set(serializer.validated_data['request_ids'])
             new_status = serializer.validated_data['status']
             notes = serializer.validated_data.get('notes', '')
             
-            updated_requests = []
-            
-            for request_id in request_ids:
-                try:
-                    bg_request = Request.objects.get(id=request_id)
-                    old_status = bg_request.status
-                    
-                    bg_request.status = new_status
-                    bg_request.save()
-                    
-                    # Log activity
-                    RequestActivity.objects.create(
+            with transaction.atomic():
+                # Lock all rows in one query (in id order, so concurrent bulk updates cannot deadlock)
+                bg_requests = list(
+                    Request.objects.select_for_update().filter(id__in=request_ids).order_by('id')
+                )
+                old_statuses = {bg_request.id: bg_request.status for bg_request in bg_requests}
+                
+                # One bulk UPDATE; owners are notified with one batched fan-out
+                updated_requests = Request.bulk_set_status(bg_requests, new_status)
+                
+                # Log activities
+                RequestActivity.objects.bulk_create([
+                    RequestActivity(
                         request=bg_request,
                         admin_user=request.user,
                         activity_type='status_change',
-                        description=f'Bulk status change from {old_status} to {new_status}',
-                        old_value=old_status,
+                        description=f'Bulk status change from {old_statuses[bg_request.id]} to {new_status}'
+                                    + (f': {notes}' if notes else ''),
+                        old_value=old_statuses[bg_request.id],
                         new_value=new_status
                     )
-                    
-                    updated_requests.append(bg_request)
-                    
-                except Request.DoesNotExist:
-                    continue
+                    for bg_request in updated_requests
+                ], batch_size=500)
             
             return Response({
                 'message': f'Updated {len(updated_requests)} requests',
-                'updated_count': len(updated_requests)
+                'updated_count': len(updated_requests),
+                'unchanged_count': len(bg_requests) - len(updated_requests),
+                'not_found_count': len(request_ids) - len(bg_requests)
             })
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -449,6 +462,11 @@ class AdminUsersView(APIView):
         return Response(serializer.data)
 
 
+class AdminUserPagination(PageNumberPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
 class AdminAllUsersView(APIView):
     """Get all regular users (non-admin)"""
     permission_classes = [permissions.IsAdminUser]
@@ -460,7 +478,9 @@ class AdminAllUsersView(APIView):
         tags=['Admin - User Management'],
         manual_parameters=[
             openapi.Parameter('search', openapi.IN_QUERY, description="Search by name or email", type=openapi.TYPE_STRING),
-            openapi.Parameter('subscription_plan', openapi.IN_QUERY, description="Filter by plan name", type=openapi.TYPE_STRING),
+            openapi.Parameter('subscription_plan', openapi.IN_QUERY, description="Filter by plan name ('No Plan' for users without one)", type=openapi.TYPE_STRING),
+            openapi.Parameter('page', openapi.IN_QUERY, description="Page number", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('page_size', openapi.IN_QUERY, description="Results per page (default 20, max 100)", type=openapi.TYPE_INTEGER),
         ],
         responses={
             200: openapi.Response(
@@ -468,6 +488,8 @@ class AdminAllUsersView(APIView):
                 examples={
                     "application/json": {
                         "count": 10,
+                        "next": None,
+                        "previous": None,
                         "results": []
                     }
                 }
@@ -481,7 +503,12 @@ class AdminAllUsersView(APIView):
         search = request.query_params.get('search', None)
         subscription_plan = request.query_params.get('subscription_plan', None)
         
-        queryset = User.objects.filter(is_staff=False).select_related('subscription')
+        # One query per page: subscription and plan joined, request count annotated
+        queryset = User.objects.filter(is_staff=False).select_related(
+            'subscription__plan'
+        ).annotate(
+            request_count=Count('request')
+        ).order_by('-date_joined', '-id')
         
         if search:
             queryset = queryset.filter(
@@ -491,43 +518,37 @@ class AdminAllUsersView(APIView):
                 Q(last_name__icontains=search)
             )
         
+        if subscription_plan:
+            if subscription_plan.lower() == 'no plan':
+                queryset = queryset.filter(Q(subscription__isnull=True) | Q(subscription__plan__isnull=True))
+            else:
+                queryset = queryset.filter(subscription__plan__name__iexact=subscription_plan)
+        
+        paginator = AdminUserPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        
         users_data = []
-        for user in queryset:
-            # Use the select_related subscription if available
+        for user in page:
             try:
                 subscription = user.subscription
-                user_data = {
-                    'id': user.id,
-                    'name': f"{user.first_name} {user.last_name}".strip() or user.username,
-                    'email': user.email,
-                    'subscription_plan': subscription.plan.name if subscription.plan else 'No Plan',
-                    'start_date': user.date_joined.strftime('%Y-%m-%d'),
-                    'requests': Request.objects.filter(user=user).count(),
-                    'total_reports_purchased': subscription.total_reports_purchased,
-                    'total_reports_used': subscription.total_reports_used,
-                    'available_reports': subscription.available_reports,
-                    'status': 'active' if subscription.plan else 'inactive'
-                }
             except UserSubscription.DoesNotExist:
-                user_data = {
-                    'id': user.id,
-                    'name': f"{user.first_name} {user.last_name}".strip() or user.username,
-                    'email': user.email,
-                    'subscription_plan': 'No Plan',
-                    'start_date': user.date_joined.strftime('%Y-%m-%d'),
-                    'requests': Request.objects.filter(user=user).count(),
-                    'total_reports_purchased': 0,
-                    'total_reports_used': 0,
-                    'available_reports': 0,
-                    'status': 'inactive'
-                }
+                subscription = None
+            plan = subscription.plan if subscription else None
             
-            users_data.append(user_data)
+            users_data.append({
+                'id': user.id,
+                'name': f"{user.first_name} {user.last_name}".strip() or user.username,
+                'email': user.email,
+                'subscription_plan': plan.name if plan else 'No Plan',
+                'start_date': user.date_joined.strftime('%Y-%m-%d'),
+                'requests': user.request_count,
+                'total_reports_purchased': subscription.total_reports_purchased if subscription else 0,
+                'total_reports_used': subscription.total_reports_used if subscription else 0,
+                'available_reports': subscription.available_reports if subscription else 0,
+                'status': 'active' if plan else 'inactive'
+            })
         
-        return Response({
-            'count': len(users_data),
-            'results': users_data
-        })
+        return paginator.get_paginated_response(users_data)
 
 
 class AdminUserDetailView(APIView):
@@ -610,8 +631,7 @@ class AdminReportDownloadView(APIView):
         }
     )
     def get(self, request, request_id):
-        from django.http import FileResponse, Http404
-        import os
+        from background_requests.downloads import serve_report_file
         
         try:
             bg_request = Request.objects.get(id=request_id)
@@ -624,9 +644,9 @@ class AdminReportDownloadView(APIView):
             if not report.pdf:
                 return Response({'error': 'PDF file not found'}, status=status.HTTP_404_NOT_FOUND)
             
-            # Open the file
+            # Hand the file to nginx / the storage CDN instead of streaming it through the worker
             try:
-                response = FileResponse(report.pdf.open('rb'), content_type='application/pdf')
+                response = serve_report_file(report)
                 response['Content-Disposition'] = f'attachment; filename="report_{request_id}.pdf"'
                 return response
             except FileNotFoundError:
@@ -636,6 +656,161 @@ class AdminReportDownloadView(APIView):
             return Response({'error': 'Request not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
+class AdminReportUploadView(APIView):
+    """Start a chunked, resumable report upload"""
+    permission_classes = [permissions.IsAdminUser]
+    
+    @swagger_auto_schema(
+        operation_summary="Start Chunked Report Upload",
+        operation_description=(
+            "Start a resumable upload for a large report PDF. Send each part with "
+            "PUT /reports/uploads/{upload_id}/parts/{part_number}/ (raw bytes, part_size each, the last part may be shorter), "
+            "then POST /reports/uploads/{upload_id}/complete/. A background worker checksums the file and stores it."
+        ),
+        operation_id="admin_report_upload_init",
+        tags=['Admin - Report Management'],
+        request_body=ReportUploadInitSerializer,
+        responses={
+            201: openapi.Response(
+                description="Upload started",
+                examples={
+                    "application/json": {
+                        "upload_id": "0b8f6f5e-2f7a-4c59-9a53-0d6f4f1f6d1e",
+                        "request": 1,
+                        "filename": "report_1.pdf",
+                        "file_size": 268435456,
+                        "part_size": 8388608,
+                        "part_count": 32,
+                        "received_parts": [],
+                        "missing_parts": [1, 2, 3],
+                        "status": "uploading"
+                    }
+                }
+            ),
+            400: "Bad Request - Invalid data",
+            404: "Request not found"
+        }
+    )
+    def post(self, request):
+        serializer = ReportUploadInitSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        data = serializer.validated_data
+        try:
+            bg_request = Request.objects.get(id=data['request_id'])
+        except Request.DoesNotExist:
+            return Response({'error': 'Request not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        try:
+            upload = start_upload(
+                bg_request, request.user, data['filename'], data['file_size'],
+                content_type=data['content_type'], notes=data['notes'], checksum=data['checksum']
+            )
+        except UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(ReportUploadSerializer(upload).data, status=status.HTTP_201_CREATED)
+
+
+class AdminReportUploadDetailView(APIView):
+    """Check or abort a chunked report upload"""
+    permission_classes = [permissions.IsAdminUser]
+    
+    @swagger_auto_schema(
+        operation_summary="Get Chunked Upload Status",
+        operation_description="Get the parts received so far (to resume an interrupted upload) and the storage status.",
+        operation_id="admin_report_upload_status",
+        tags=['Admin - Report Management'],
+        responses={200: ReportUploadSerializer, 404: "Upload not found"}
+    )
+    def get(self, request, upload_id):
+        upload = ReportUpload.objects.filter(id=upload_id).first()
+        if upload is None:
+            return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(ReportUploadSerializer(upload).data)
+    
+    @swagger_auto_schema(
+        operation_summary="Abort Chunked Upload",
+        operation_description="Discard an unfinished upload and the parts received so far.",
+        operation_id="admin_report_upload_abort",
+        tags=['Admin - Report Management'],
+        responses={204: "Upload aborted", 400: "Upload is already being stored", 404: "Upload not found"}
+    )
+    def delete(self, request, upload_id):
+        upload = ReportUpload.objects.filter(id=upload_id).first()
+        if upload is None:
+            return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            abort_upload(upload)
+        except UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class AdminReportUploadPartView(APIView):
+    """Receive one part of a chunked report upload"""
+    permission_classes = [permissions.IsAdminUser]
+    
+    @swagger_auto_schema(
+        operation_summary="Upload Report Part",
+        operation_description="Send one part as the raw request body (Content-Type: application/octet-stream). Re-sending a part overwrites it.",
+        operation_id="admin_report_upload_part",
+        tags=['Admin - Report Management'],
+        responses={
+            200: openapi.Response(
+                description="Part stored",
+                examples={
+                    "application/json": {
+                        "part_number": 1,
+                        "size": 8388608,
+                        "etag": "9e107d9d372bb6826bd81d3542a419d6"
+                    }
+                }
+            ),
+            400: "Wrong part size or upload no longer accepting parts",
+            404: "Upload not found"
+        }
+    )
+    def put(self, request, upload_id, part_number):
+        upload = ReportUpload.objects.filter(id=upload_id).first()
+        if upload is None:
+            return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        # Read the body as a stream: parts are never parsed or buffered whole
+        try:
+            part = write_part(upload, part_number, request.stream or io.BytesIO())
+        except UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(part)
+
+
+class AdminReportUploadCompleteView(APIView):
+    """Finish a chunked report upload"""
+    permission_classes = [permissions.IsAdminUser]
+    
+    @swagger_auto_schema(
+        operation_summary="Complete Chunked Upload",
+        operation_description="Mark the upload as complete once every part is received. The file is checksummed and stored by a background worker; poll the upload status until it is 'completed'.",
+        operation_id="admin_report_upload_complete",
+        tags=['Admin - Report Management'],
+        responses={
+            202: ReportUploadSerializer,
+            400: "Parts are missing",
+            404: "Upload not found"
+        }
+    )
+    def post(self, request, upload_id):
+        upload = ReportUpload.objects.filter(id=upload_id).first()
+        if upload is None:
+            return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            upload = complete_upload(upload)
+        except UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(ReportUploadSerializer(upload).data, status=status.HTTP_202_ACCEPTED)
+
+
 class AdminPlanManagementView(APIView):
     """Admin CRUD operations for subscription plans"""
     permission_classes = [permissions.IsAdminUser]
@@ -906,6 +1081,7 @@ class AdminNotificationView(APIView):
         }
     )
     def get(self, request):
+        from notifications.counters import get_unread_count
         from notifications.models import Notification
         from notifications.serializers import NotificationSerializer
         
@@ -916,7 +1092,7 @@ class AdminNotificationView(APIView):
         if unread_only:
             notifications = notifications.filter(is_read=False)
         
-        unread_count = Notification.objects.filter(recipient=request.user, is_read=False).count()
+        unread_count = get_unread_count(request.user)
         
         serializer = NotificationSerializer(notifications, many=True)
         
@@ -970,12 +1146,10 @@ class AdminNotificationMarkAllReadView(APIView):
         }
     )
     def post(self, request):
+        from notifications.counters import mark_read
         from notifications.models import Notification
         
-        updated_count = Notification.objects.filter(
-            recipient=request.user, 
-            is_read=False
-        ).update(is_read=True, read_at=timezone.now())
+        updated_count = mark_read(Notification.objects.filter(recipient=request.user))
         
         return Response({
             'message': f'{updated_count} notifications marked as read',
@@ -987,6 +1161,13 @@ class AdminPaymentHistoryView(APIView):
     """View all payment transactions across all users"""
     permission_classes = [permissions.IsAdminUser]
     
+    def perform_content_negotiation(self, request, force=False):
+        # Exports stream their own body, so ?format=csv|jsonl must not be
+        # treated as a renderer format
+        if request.query_params.get('format') in PAYMENT_EXPORT_FORMATS:
+            force = True
+        return super().perform_content_negotiation(request, force=force)
+    
     @swagger_auto_schema(
         operation_summary="Get All Payment Transactions",
         operation_description="Get list of all payment transactions across all users with filtering options.",
@@ -997,6 +1178,9 @@ class AdminPaymentHistoryView(APIView):
             openapi.Parameter('status', openapi.IN_QUERY, description="Filter by payment status (succeeded, pending, failed, canceled, refunded)", type=openapi.TYPE_STRING),
             openapi.Parameter('start_date', openapi.IN_QUERY, description="Filter payments after this date (YYYY-MM-DD)", type=openapi.TYPE_STRING),
             openapi.Parameter('end_date', openapi.IN_QUERY, description="Filter payments before this date (YYYY-MM-DD)", type=openapi.TYPE_STRING),
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="Cursor from the previous page's 'next' link", type=openapi.TYPE_STRING),
+            openapi.Parameter('page_size', openapi.IN_QUERY, description="Payments per page (default 20, max 100)", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('format', openapi.IN_QUERY, description="Set to 'csv' or 'jsonl' to stream every matching payment as a file", type=openapi.TYPE_STRING),
         ],
         responses={
             200: openapi.Response(
@@ -1005,6 +1189,7 @@ class AdminPaymentHistoryView(APIView):
                     "application/json": {
                         "count": 50,
                         "total_amount": "1250.00",
+                        "next": "/api/admin/payments/?cursor=...",
                         "payments": [
                             {
                                 "id": 1,
@@ -1031,12 +1216,14 @@ class AdminPaymentHistoryView(APIView):
     def get(self, request):
         from subscriptions.models import PaymentHistory
         from decimal import Decimal
+        from django.db.models import Sum
         
         # Get query parameters
         user_id = request.query_params.get('user_id')
         payment_status = request.query_params.get('status')
         start_date = request.query_params.get('start_date')
         end_date = request.query_params.get('end_date')
+        export_format = request.query_params.get('format')
         
         # Base queryset
         payments = PaymentHistory.objects.select_related('user', 'plan').all()
@@ -1052,48 +1239,111 @@ class AdminPaymentHistoryView(APIView):
             payments = payments.filter(created_at__lte=end_date)
         
         # Order by most recent
-        payments = payments.order_by('-created_at')
+        payments = payments.order_by('-created_at', '-id')
         
-        # Calculate totals
-        total_amount = sum(payment.amount for payment in payments)
+        if export_format in PAYMENT_EXPORT_FORMATS:
+            return _stream_payments(payments, export_format)
         
-        # Serialize data
-        payments_data = []
-        for payment in payments:
-            payments_data.append({
-                'id': payment.id,
-                'user': {
-                    'id': payment.user.id,
-                    'username': payment.user.username,
-                    'email': payment.user.email,
-                    'full_name': f"{payment.user.first_name} {payment.user.last_name}".strip() or payment.user.username
-                },
-                'plan': payment.plan.name if payment.plan else None,
-                'amount': str(payment.amount),
-                'currency': payment.currency,
-                'status': payment.status,
-                'reports_purchased': payment.reports_purchased,
-                'description': payment.description,
-                'stripe_payment_intent_id': payment.stripe_payment_intent_id,
-                'stripe_charge_id': payment.stripe_charge_id,
-                'failure_reason': payment.failure_reason,
-                'created_at': payment.created_at,
-                'updated_at': payment.updated_at
-            })
+        # Calculate totals in the database
+        totals = payments.aggregate(count=Count('id'), total_amount=Sum('amount'))
+        
+        paginator = KeysetPagination()
+        paginator.keyset_by_default = True
+        page = paginator.paginate_queryset(payments, request, view=self)
         
         return Response({
-            'count': len(payments_data),
-            'total_amount': str(total_amount),
+            'count': totals['count'],
+            'total_amount': str((totals['total_amount'] or Decimal('0')).quantize(Decimal('0.01'))),
             'filters_applied': {
                 'user_id': user_id,
                 'status': payment_status,
                 'start_date': start_date,
                 'end_date': end_date
             },
-            'payments': payments_data
+            'next': paginator.get_next_link(),
+            'payments': [_payment_row(payment) for payment in page]
         })
 
 
+PAYMENT_EXPORT_FORMATS = ('csv', 'jsonl')
+PAYMENT_EXPORT_CHUNK_SIZE = 2000
+PAYMENT_CSV_COLUMNS = [
+    'id', 'user_id', 'username', 'email', 'full_name', 'plan', 'amount', 'currency', 'status',
+    'reports_purchased', 'description', 'stripe_payment_intent_id', 'stripe_charge_id',
+    'failure_reason', 'created_at', 'updated_at',
+]
+
+
+def _payment_row(payment):
+    return {
+        'id': payment.id,
+        'user': {
+            'id': payment.user.id,
+            'username': payment.user.username,
+            'email': payment.user.email,
+            'full_name': f"{payment.user.first_name} {payment.user.last_name}".strip() or payment.user.username
+        },
+        'plan': payment.plan.name if payment.plan else None,
+        'amount': str(payment.amount),
+        'currency': payment.currency,
+        'status': payment.status,
+        'reports_purchased': payment.reports_purchased,
+        'description': payment.description,
+        'stripe_payment_intent_id': payment.stripe_payment_intent_id,
+        'stripe_charge_id': payment.stripe_charge_id,
+        'failure_reason': payment.failure_reason,
+        'created_at': payment.created_at,
+        'updated_at': payment.updated_at
+    }
+
+
+class _Echo:
+    """File-like object whose write() returns the value, for streaming csv.writer output"""
+    def write(self, value):
+        return value
+
+
+def _stream_payments(payments, export_format):
+    """
+    Stream payments as CSV or JSON Lines in constant memory
+    
+    Rows are read with a chunked iterator (a server-side cursor on PostgreSQL)
+    and written out as they arrive.
+    """
+    import csv
+    import json
+    from django.core.serializers.json import DjangoJSONEncoder
+    from django.http import StreamingHttpResponse
+    
+    rows = (_payment_row(payment) for payment in payments.iterator(chunk_size=PAYMENT_EXPORT_CHUNK_SIZE))
+    
+    if export_format == 'csv':
+        writer = csv.writer(_Echo())
+        
+        def lines():
+            yield writer.writerow(PAYMENT_CSV_COLUMNS)
+            for row in rows:
+                user = row.pop('user')
+                row.update({
+                    'user_id': user['id'],
+                    'username': user['username'],
+                    'email': user['email'],
+                    'full_name': user['full_name'],
+                })
+                yield writer.writerow([row[column] for column in PAYMENT_CSV_COLUMNS])
+        content_type = 'text/csv'
+    else:
+        def lines():
+            for row in rows:
+                yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+        content_type = 'application/x-ndjson'
+    
+    response = StreamingHttpResponse(lines(), content_type=content_type)
+    filename = f"payments-{timezone.now().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 class AdminSubscriptionAnalyticsView(APIView):
     """Get subscription and payment analytics"""
     permission_classes = [permissions.IsAdminUser]
@@ -1121,28 +1371,27 @@ class AdminSubscriptionAnalyticsView(APIView):
     )
     def get(self, request):
         from subscriptions.models import PaymentHistory, UserSubscription, SubscriptionPlan
-        from django.db.models import Sum, Count
-        from django.db.models.functions import TruncMonth
+        from django.db.models import Count
         from decimal import Decimal
+        from .metrics import metrics_totals, revenue_by_month, revenue_by_plan
         
-        # Total revenue
-        total_revenue = PaymentHistory.objects.filter(status='succeeded').aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0.00')
+        # Revenue and transaction totals from the daily rollup
+        totals = metrics_totals()
+        total_revenue = totals['revenue']
         
         # Active subscriptions count (users with plans)
         active_subscriptions = UserSubscription.objects.filter(plan__isnull=False).count()
         
         # Total transactions
-        total_transactions = PaymentHistory.objects.count()
-        successful_transactions = PaymentHistory.objects.filter(status='succeeded').count()
-        failed_transactions = PaymentHistory.objects.filter(status='failed').count()
+        total_transactions = totals['transactions']
+        successful_transactions = totals['successful_transactions']
+        failed_transactions = totals['failed_transactions']
         
         # Popular plans
         popular_plans = SubscriptionPlan.objects.annotate(
-            subscriber_count=Count('usersubscription'),
-            total_revenue=Sum('paymenthistory__amount', filter=Q(paymenthistory__status='succeeded'))
+            subscriber_count=Count('usersubscription')
         ).order_by('-subscriber_count')[:5]
+        plan_revenue = revenue_by_plan()
         
         popular_plans_data = []
         for plan in popular_plans:
@@ -1151,22 +1400,12 @@ class AdminSubscriptionAnalyticsView(APIView):
                 'name': plan.name,
                 'price_per_report': str(plan.price_per_report),
                 'subscribers': plan.subscriber_count,
-                'revenue': str(plan.total_revenue or Decimal('0.00'))
+                'revenue': str(plan_revenue.get(plan.id) or Decimal('0.00'))
             })
         
         # Revenue by month (last 12 months)
-        revenue_by_month = PaymentHistory.objects.filter(
-            status='succeeded',
-            created_at__gte=timezone.now() - timezone.timedelta(days=365)
-        ).annotate(
-            month=TruncMonth('created_at')
-        ).values('month').annotate(
-            revenue=Sum('amount'),
-            transactions=Count('id')
-        ).order_by('month')
-        
         revenue_by_month_data = []
-        for item in revenue_by_month:
+        for item in revenue_by_month(days=365):
             revenue_by_month_data.append({
                 'month': item['month'].strftime('%Y-%m'),
                 'revenue': str(item['revenue']),
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AdminDashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'admin_dashboard'
+    
+    def ready(self):
+        """Import signal handlers when app is ready"""
+        import admin_dashboard.signals
@@ -0,0 +1,34 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from admin_dashboard.metrics import rebuild_daily_metrics
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the DailyMetrics rollup from PaymentHistory and Request rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start',
+            help='First day to rebuild, YYYY-MM-DD (default: earliest data)',
+        )
+        parser.add_argument(
+            '--end',
+            help='Last day to rebuild, YYYY-MM-DD (default: latest data)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else None
+            end = date.fromisoformat(options['end']) if options['end'] else None
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+
+        self.stdout.write("=" * 70)
+        self.stdout.write(self.style.SUCCESS("📊 Rebuilding daily metrics"))
+        self.stdout.write("=" * 70)
+
+        rows = rebuild_daily_metrics(start=start, end=end)
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Wrote {rows} daily metrics rows"))
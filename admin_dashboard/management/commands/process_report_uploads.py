@@ -0,0 +1,68 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from admin_dashboard.uploads import DEFAULT_MAX_ATTEMPTS, expire_abandoned_uploads, process_batch
+
+
+class Command(BaseCommand):
+    help = 'Store completed chunked report uploads (runs until interrupted unless --once is given)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue once and exit',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5,
+            help='Number of uploads claimed per batch (default: 5)',
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=DEFAULT_MAX_ATTEMPTS,
+            help=f'Attempts before an upload is marked as failed (default: {DEFAULT_MAX_ATTEMPTS})',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds to sleep when the queue is empty (default: 2)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS("📤 Report upload worker started"))
+
+        totals = {'stored': 0, 'retried': 0, 'failed': 0}
+        try:
+            while True:
+                stats = process_batch(
+                    batch_size=options['batch_size'],
+                    max_attempts=options['max_attempts'],
+                )
+                for key in totals:
+                    totals[key] += stats[key]
+
+                if stats['claimed']:
+                    self.stdout.write(
+                        f"Processed {stats['claimed']} uploads: {stats['stored']} stored, "
+                        f"{stats['retried']} retried, {stats['failed']} failed"
+                    )
+                    continue
+
+                expired = expire_abandoned_uploads()
+                if expired:
+                    self.stdout.write(f"Discarded {expired} abandoned uploads")
+
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("\nStopping report upload worker")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {totals['stored']} stored, {totals['retried']} retried, {totals['failed']} failed"
+        ))
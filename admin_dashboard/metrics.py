@@ -0,0 +1,225 @@
+"""
+Daily Metrics
+Incremental per-day, per-plan rollups of payments and requests for admin analytics
+"""
+from datetime import timedelta
+from decimal import Decimal
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import DailyMetrics
+
+logger = logging.getLogger(__name__)
+
+METRIC_FIELDS = [
+    'revenue', 'transactions', 'successful_transactions', 'failed_transactions',
+    'reports_purchased', 'requests_created', 'requests_completed',
+]
+
+
+def record(day, plan_id=None, **deltas):
+    """
+    Add deltas to the metrics row for a day and plan, creating it if needed
+
+    Args:
+        day (date): Local date the activity belongs to
+        plan_id (int): SubscriptionPlan ID (None for activity without a plan)
+        **deltas: Increments for METRIC_FIELDS
+    """
+    deltas = {field: value for field, value in deltas.items() if value}
+    if not deltas:
+        return
+    plan_key = plan_id or DailyMetrics.NO_PLAN
+    increments = {field: F(field) + value for field, value in deltas.items()}
+
+    if DailyMetrics.objects.filter(date=day, plan_key=plan_key).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            DailyMetrics.objects.create(date=day, plan_key=plan_key, **deltas)
+    except IntegrityError:
+        # Created concurrently, add to the other writer's row
+        DailyMetrics.objects.filter(date=day, plan_key=plan_key).update(**increments)
+
+
+def _payment_metrics(status, amount, reports_purchased):
+    """Metrics a payment with these values contributes besides its transaction"""
+    succeeded = status == 'succeeded'
+    return {
+        'successful_transactions': 1 if succeeded else 0,
+        'failed_transactions': 1 if status == 'failed' else 0,
+        'revenue': Decimal(str(amount)) if succeeded else Decimal('0'),
+        'reports_purchased': reports_purchased if succeeded else 0,
+    }
+
+
+def record_payment(payment):
+    """Roll a newly created PaymentHistory row into its day and plan"""
+    record(
+        timezone.localdate(payment.created_at),
+        payment.plan_id,
+        transactions=1,
+        **_payment_metrics(payment.status, payment.amount, payment.reports_purchased)
+    )
+
+
+def record_payment_change(payment, old_values):
+    """
+    Move a changed payment's contribution on its day from the old values to the new ones
+
+    Args:
+        payment: PaymentHistory after the change
+        old_values (dict): status, amount, reports_purchased and plan_id before it
+    """
+    day = timezone.localdate(payment.created_at)
+    old = _payment_metrics(old_values['status'], old_values['amount'], old_values['reports_purchased'])
+    new = _payment_metrics(payment.status, payment.amount, payment.reports_purchased)
+    if old_values['plan_id'] == payment.plan_id:
+        record(day, payment.plan_id, **{field: new[field] - old[field] for field in new})
+    else:
+        record(day, old_values['plan_id'], transactions=-1, **{field: -value for field, value in old.items()})
+        record(day, payment.plan_id, transactions=1, **new)
+
+
+def remove_payment(payment):
+    """Take a deleted PaymentHistory row back out of its day and plan"""
+    old = _payment_metrics(payment.status, payment.amount, payment.reports_purchased)
+    record(
+        timezone.localdate(payment.created_at),
+        payment.plan_id,
+        transactions=-1,
+        **{field: -value for field, value in old.items()}
+    )
+
+
+def record_request_created(bg_request):
+    record(timezone.localdate(bg_request.created_at), requests_created=1)
+
+
+def record_request_completed(bg_request):
+    record(timezone.localdate(), requests_completed=1)
+
+
+def rebuild_daily_metrics(start=None, end=None):
+    """
+    Recompute metrics rows from PaymentHistory and Request
+
+    Completed requests are attributed to the day they were last updated, which
+    matches the on-write counter for requests that were not edited afterwards.
+
+    Args:
+        start (date): First day to rebuild (default: earliest data)
+        end (date): Last day to rebuild (default: today)
+
+    Returns:
+        int: Number of metrics rows written
+    """
+    from background_requests.models import Request
+    from subscriptions.models import PaymentHistory
+
+    def in_range(queryset, field):
+        if start:
+            queryset = queryset.filter(**{f'{field}__gte': start})
+        if end:
+            queryset = queryset.filter(**{f'{field}__lte': end})
+        return queryset
+
+    rows = {}
+
+    def row(day, plan_key):
+        key = (day, plan_key or DailyMetrics.NO_PLAN)
+        if key not in rows:
+            rows[key] = DailyMetrics(date=key[0], plan_key=key[1])
+        return rows[key]
+
+    payments = in_range(
+        PaymentHistory.objects.annotate(day=TruncDate('created_at')), 'day'
+    ).values('day', 'plan_id').annotate(
+        transactions=Count('id'),
+        successful_transactions=Count('id', filter=Q(status='succeeded')),
+        failed_transactions=Count('id', filter=Q(status='failed')),
+        revenue=Sum('amount', filter=Q(status='succeeded')),
+        reports_purchased=Sum('reports_purchased', filter=Q(status='succeeded')),
+    ).order_by()
+    for item in payments:
+        metrics = row(item['day'], item['plan_id'])
+        metrics.transactions += item['transactions']
+        metrics.successful_transactions += item['successful_transactions']
+        metrics.failed_transactions += item['failed_transactions']
+        metrics.revenue += item['revenue'] or Decimal('0.00')
+        metrics.reports_purchased += item['reports_purchased'] or 0
+
+    created = in_range(
+        Request.objects.annotate(day=TruncDate('created_at')), 'day'
+    ).values('day').annotate(total=Count('id')).order_by()
+    for item in created:
+        row(item['day'], None).requests_created = item['total']
+
+    completed = in_range(
+        Request.objects.filter(status=Request.COMPLETED).annotate(day=TruncDate('updated_at')), 'day'
+    ).values('day').annotate(total=Count('id')).order_by()
+    for item in completed:
+        row(item['day'], None).requests_completed = item['total']
+
+    with transaction.atomic():
+        in_range(DailyMetrics.objects.all(), 'date').delete()
+        DailyMetrics.objects.bulk_create(rows.values(), batch_size=500)
+
+    logger.info(f"Rebuilt {len(rows)} daily metrics rows")
+    return len(rows)
+
+
+def metrics_totals(since=None):
+    """
+    Sum metrics over all plans
+
+    Args:
+        since (date): Only include days from this date on
+
+    Returns:
+        dict: Totals for every metric field
+    """
+    queryset = DailyMetrics.objects.all()
+    if since:
+        queryset = queryset.filter(date__gte=since)
+    totals = queryset.aggregate(**{field: Sum(field) for field in METRIC_FIELDS})
+    totals = {field: value or 0 for field, value in totals.items()}
+    totals['revenue'] = totals['revenue'] or Decimal('0.00')
+    return totals
+
+
+def revenue_by_plan(plan_ids=None):
+    """
+    Return {plan_id: revenue} over all time
+
+    Args:
+        plan_ids (list): Only these plans (default: every plan)
+    """
+    queryset = DailyMetrics.objects.exclude(plan_key=DailyMetrics.NO_PLAN)
+    if plan_ids is not None:
+        queryset = queryset.filter(plan_key__in=plan_ids)
+    return dict(
+        queryset.values('plan_key').annotate(total=Sum('revenue')).order_by()
+        .values_list('plan_key', 'total')
+    )
+
+
+def revenue_by_month(days=365):
+    """
+    Monthly revenue and successful transactions for the last ``days`` days
+
+    Returns:
+        list: Dicts with month (date), revenue and transactions, oldest first
+    """
+    since = timezone.localdate() - timedelta(days=days)
+    return list(
+        DailyMetrics.objects.filter(date__gte=since, successful_transactions__gt=0)
+        .annotate(month=TruncMonth('date'))
+        .values('month')
+        .annotate(revenue=Sum('revenue'), transactions=Sum('successful_transactions'))
+        .order_by('month')
+    )
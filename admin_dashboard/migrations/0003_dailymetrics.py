@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-16 22:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_dashboard', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('plan_key', models.IntegerField(default=0, help_text='SubscriptionPlan ID, 0 when not tied to a plan')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, help_text='Sum of succeeded payments', max_digits=12)),
+                ('transactions', models.IntegerField(default=0)),
+                ('successful_transactions', models.IntegerField(default=0)),
+                ('failed_transactions', models.IntegerField(default=0)),
+                ('reports_purchased', models.IntegerField(default=0)),
+                ('requests_created', models.IntegerField(default=0)),
+                ('requests_completed', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Daily Metrics',
+                'verbose_name_plural': 'Daily Metrics',
+                'ordering': ['-date', 'plan_key'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'plan_key'), name='unique_daily_metrics_per_plan')],
+            },
+        ),
+    ]
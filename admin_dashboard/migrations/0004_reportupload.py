@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:10
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_dashboard', '0003_dailymetrics'),
+        ('background_requests', '0007_report_file_metadata'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255)),
+                ('content_type', models.CharField(default='application/pdf', max_length=100)),
+                ('notes', models.TextField(blank=True, default='')),
+                ('file_size', models.PositiveBigIntegerField(help_text='Declared total size in bytes')),
+                ('part_size', models.PositiveIntegerField()),
+                ('received_parts', models.JSONField(blank=True, default=list, help_text='Part numbers written so far')),
+                ('expected_checksum', models.CharField(blank=True, help_text='Optional SHA-256 sent by the client', max_length=64)),
+                ('checksum', models.CharField(blank=True, help_text='SHA-256 of the assembled file', max_length=64)),
+                ('status', models.CharField(choices=[('uploading', 'Uploading'), ('queued', 'Queued for storage'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], default='uploading', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='report_uploads', to=settings.AUTH_USER_MODEL)),
+                ('report', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='background_requests.report')),
+                ('request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_uploads', to='background_requests.request')),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='admin_dashb_status_498f71_idx')],
+            },
+        ),
+    ]
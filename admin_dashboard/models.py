@@ -1,5 +1,9 @@
+import math
+import uuid
+
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from background_requests.models import Request
 
 User = get_user_model()
@@ -110,3 +114,111 @@ class RequestAssignment(models.Model):
 
     def __str__(self):
         return f"{self.request.name} assigned to {self.assigned_to.username}"
+
+class DailyMetrics(models.Model):
+    """
+    Per-day, per-plan rollup of payments and request activity
+
+    Maintained on write (see admin_dashboard.metrics) so analytics read a few
+    rows instead of scanning PaymentHistory. plan_key is the SubscriptionPlan
+    ID, or 0 for activity not tied to a plan (request counts are recorded there).
+    """
+    NO_PLAN = 0
+
+    date = models.DateField()
+    plan_key = models.IntegerField(default=NO_PLAN, help_text="SubscriptionPlan ID, 0 when not tied to a plan")
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text="Sum of succeeded payments")
+    transactions = models.IntegerField(default=0)
+    successful_transactions = models.IntegerField(default=0)
+    failed_transactions = models.IntegerField(default=0)
+    reports_purchased = models.IntegerField(default=0)
+    requests_created = models.IntegerField(default=0)
+    requests_completed = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Daily Metrics"
+        verbose_name_plural = "Daily Metrics"
+        ordering = ['-date', 'plan_key']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'plan_key'], name='unique_daily_metrics_per_plan'),
+        ]
+
+    def __str__(self):
+        return f"Metrics for {self.date} (plan {self.plan_key})"
+
+
+class ReportUpload(models.Model):
+    """
+    Chunked, resumable report upload session
+
+    Parts are written into a temp file at their offsets; once the upload is
+    completed the ``process_report_uploads`` worker checksums the assembled
+    file, hands it to storage and attaches it to the request's Report.
+    """
+    # Upload statuses
+    UPLOADING = 'uploading'
+    QUEUED = 'queued'
+    PROCESSING = 'processing'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (UPLOADING, 'Uploading'),
+        (QUEUED, 'Queued for storage'),
+        (PROCESSING, 'Processing'),
+        (COMPLETED, 'Completed'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    request = models.ForeignKey(Request, on_delete=models.CASCADE, related_name='report_uploads')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='report_uploads')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, default='application/pdf')
+    notes = models.TextField(blank=True, default='')
+    file_size = models.PositiveBigIntegerField(help_text='Declared total size in bytes')
+    part_size = models.PositiveIntegerField()
+    received_parts = models.JSONField(default=list, blank=True, help_text='Part numbers written so far')
+    expected_checksum = models.CharField(max_length=64, blank=True, help_text='Optional SHA-256 sent by the client')
+    checksum = models.CharField(max_length=64, blank=True, help_text='SHA-256 of the assembled file')
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=UPLOADING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, null=True)
+    report = models.ForeignKey(
+        'background_requests.Report',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"Upload {self.id} for request {self.request_id} ({self.status})"
+
+    @property
+    def part_count(self):
+        return max(math.ceil(self.file_size / self.part_size), 1)
+
+    def part_length(self, part_number):
+        """Expected byte length of a part (the last part may be shorter)"""
+        if part_number == self.part_count:
+            return self.file_size - self.part_size * (self.part_count - 1)
+        return self.part_size
+
+    @property
+    def missing_parts(self):
+        received = set(self.received_parts)
+        return [n for n in range(1, self.part_count + 1) if n not in received]
@@ -1,7 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from background_requests.models import Request, Report
-from .models import AdminDashboardSettings, RequestActivity, AdminNote, RequestAssignment
+from .models import AdminDashboardSettings, RequestActivity, AdminNote, RequestAssignment, ReportUpload
 
 User = get_user_model()
 
@@ -24,6 +26,31 @@ class AdminUserSerializer(serializers.ModelSerializer):
             return obj.assigned_requests.count()
         return 0
 
+def admin_request_queryset(queryset=None):
+    """
+    Requests with everything AdminRequestSerializer reads, in one query
+    
+    Joins the user, assignment (and assignee) and report, and annotates the
+    activity count and latest activity with correlated subqueries.
+    """
+    if queryset is None:
+        queryset = Request.objects.all()
+    
+    activities = RequestActivity.objects.filter(request=OuterRef('pk'))
+    latest = activities.order_by('-timestamp', '-id')
+    activity_count = activities.order_by().values('request').annotate(total=Count('id')).values('total')
+    
+    return queryset.select_related(
+        'user', 'assignment__assigned_to', 'report'
+    ).annotate(
+        activity_total=Coalesce(Subquery(activity_count, output_field=IntegerField()), Value(0)),
+        latest_activity_type=Subquery(latest.values('activity_type')[:1]),
+        latest_activity_description=Subquery(latest.values('description')[:1]),
+        latest_activity_timestamp=Subquery(latest.values('timestamp')[:1]),
+        latest_activity_admin=Subquery(latest.values('admin_user__username')[:1]),
+    )
+
+
 class AdminRequestSerializer(serializers.ModelSerializer):
     """Enhanced request serializer for admin dashboard with additional fields"""
     user_name = serializers.CharField(source='user.username', read_only=True)
@@ -57,9 +84,21 @@ class AdminRequestSerializer(serializers.ModelSerializer):
         return None
     
     def get_activity_count(self, obj):
+        # Annotated by admin_request_queryset
+        if hasattr(obj, 'activity_total'):
+            return obj.activity_total
         return obj.activities.count() if hasattr(obj, 'activities') else 0
     
     def get_latest_activity(self, obj):
+        if hasattr(obj, 'latest_activity_type'):
+            if obj.latest_activity_type is None:
+                return None
+            return {
+                'type': obj.latest_activity_type,
+                'description': obj.latest_activity_description,
+                'timestamp': obj.latest_activity_timestamp,
+                'admin_user': obj.latest_activity_admin
+            }
         if hasattr(obj, 'activities') and obj.activities.exists():
             latest = obj.activities.first()
             return {
@@ -215,6 +254,36 @@ class BulkStatusUpdateSerializer(serializers.Serializer):
         }
         return status_mapping.get(value, value)
 
+class ReportUploadInitSerializer(serializers.Serializer):
+    """Serializer for starting a chunked report upload"""
+    request_id = serializers.IntegerField(help_text='Background check request the report belongs to')
+    filename = serializers.CharField(max_length=255, help_text='Original file name')
+    file_size = serializers.IntegerField(min_value=1, help_text='Total size in bytes')
+    content_type = serializers.CharField(max_length=100, required=False, default='application/pdf')
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+    checksum = serializers.RegexField(
+        r'^[0-9a-fA-F]{64}$',
+        required=False,
+        allow_blank=True,
+        default='',
+        help_text='Optional SHA-256 (hex) of the whole file, verified after assembly'
+    )
+
+class ReportUploadSerializer(serializers.ModelSerializer):
+    """Serializer for chunked report upload sessions"""
+    upload_id = serializers.UUIDField(source='id', read_only=True)
+    part_count = serializers.IntegerField(read_only=True)
+    missing_parts = serializers.ListField(child=serializers.IntegerField(), read_only=True)
+    
+    class Meta:
+        model = ReportUpload
+        fields = [
+            'upload_id', 'request', 'filename', 'content_type', 'file_size', 'part_size', 'part_count',
+            'received_parts', 'missing_parts', 'status', 'checksum', 'report', 'last_error',
+            'created_at', 'updated_at', 'completed_at'
+        ]
+        read_only_fields = fields
+
 class DashboardStatsSerializer(serializers.Serializer):
     """Serializer for dashboard statistics"""
     total_requests = serializers.IntegerField()
@@ -0,0 +1,50 @@
+"""
+Signals for admin analytics
+Roll payment and request activity into the DailyMetrics rollup
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from background_requests.models import Request, status_changed, statuses_changed
+from subscriptions.models import PaymentHistory, payment_changed
+
+from .metrics import (
+    record, record_payment, record_payment_change, record_request_completed, record_request_created,
+    remove_payment,
+)
+
+
+@receiver(post_save, sender=PaymentHistory)
+def record_created_payment(sender, instance, created, **kwargs):
+    if created:
+        record_payment(instance)
+
+
+@receiver(payment_changed, sender=PaymentHistory)
+def record_changed_payment(sender, instance, old_values, **kwargs):
+    """Status transitions (succeeded, refunded, ...) and admin edits"""
+    record_payment_change(instance, old_values)
+
+
+@receiver(post_delete, sender=PaymentHistory)
+def record_deleted_payment(sender, instance, **kwargs):
+    remove_payment(instance)
+
+
+@receiver(post_save, sender=Request)
+def record_created_request(sender, instance, created, **kwargs):
+    if created:
+        record_request_created(instance)
+
+
+@receiver(status_changed, sender=Request)
+def record_completed_request(sender, instance, old_status, new_status, **kwargs):
+    if new_status == Request.COMPLETED:
+        record_request_completed(instance)
+
+
+@receiver(statuses_changed, sender=Request)
+def record_completed_requests(sender, instances, old_statuses, new_status, **kwargs):
+    if new_status == Request.COMPLETED:
+        record(timezone.localdate(), requests_completed=len(instances))
@@ -1,3 +1,360 @@
-from django.test import TestCase
+from decimal import Decimal
+import hashlib
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.storage import default_storage
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from authentication.models import User
+from background_requests.models import Report, Request
+from notifications.models import NotificationCounter
+from subscriptions.models import PaymentHistory, SubscriptionPlan, UserSubscription
+from subscriptions.webhooks import handle_payment_succeeded
+
+from .metrics import metrics_totals, rebuild_daily_metrics, revenue_by_plan
+from .models import DailyMetrics, ReportUpload, RequestActivity, RequestAssignment
+from .uploads import process_batch
+
+
+class DailyMetricsTests(TestCase):
+    """The rollup maintained on write matches a rebuild from raw rows"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='payer', email='payer@example.com', password='pass')
+        cls.plan = SubscriptionPlan.objects.create(name='Basic', description='Basic plan')
+
+    def test_on_write_matches_backfill(self):
+        for amount, status in [('25.00', 'succeeded'), ('50.00', 'succeeded'), ('25.00', 'failed')]:
+            PaymentHistory.objects.create(user=self.user, plan=self.plan, amount=Decimal(amount), status=status)
+        bg_request = Request.objects.create(
+            user=self.user, name='John Doe', dob='1990-01-01', city='Austin', state='TX',
+            email='john@example.com', phone_number='5550100'
+        )
+        bg_request.status = Request.COMPLETED
+        bg_request.save()
+
+        live = metrics_totals()
+        self.assertEqual(live['revenue'], Decimal('75.00'))
+        self.assertEqual(live['transactions'], 3)
+        self.assertEqual(live['failed_transactions'], 1)
+        self.assertEqual(live['requests_created'], 1)
+        self.assertEqual(live['requests_completed'], 1)
+        self.assertEqual(revenue_by_plan(), {self.plan.id: Decimal('75.00')})
+
+        DailyMetrics.objects.all().delete()
+        rebuild_daily_metrics()
+        self.assertEqual(metrics_totals(), live)
+
+    def test_status_changes_reach_the_rollup(self):
+        other_plan = SubscriptionPlan.objects.create(name='Premium', description='Premium plan')
+        pending = PaymentHistory.objects.create(
+            user=self.user, plan=self.plan, amount=Decimal('25.00'), status='pending', stripe_payment_intent_id='pi_1'
+        )
+        refunded = PaymentHistory.objects.create(user=self.user, plan=self.plan, amount=Decimal('50.00'), status='succeeded')
+        edited = PaymentHistory.objects.create(user=self.user, plan=self.plan, amount=Decimal('30.00'), status='failed')
+        deleted = PaymentHistory.objects.create(user=self.user, plan=self.plan, amount=Decimal('10.00'), status='succeeded')
+
+        handle_payment_succeeded({'id': 'pi_1'})
+        PaymentHistory.change_status(PaymentHistory.objects.filter(pk=refunded.pk), 'succeeded', 'refunded')
+        edited.status = 'succeeded'
+        edited.plan = other_plan
+        edited.save()
+        deleted.delete()
+
+        live = metrics_totals()
+        self.assertEqual(live['revenue'], Decimal('55.00'))
+        self.assertEqual(live['transactions'], 3)
+        self.assertEqual(live['successful_transactions'], 2)
+        self.assertEqual(live['failed_transactions'], 0)
+        self.assertEqual(revenue_by_plan(), {self.plan.id: Decimal('25.00'), other_plan.id: Decimal('30.00')})
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, 'succeeded')
+
+        rebuild_daily_metrics()
+        self.assertEqual(metrics_totals(), live)
+
+
+class AdminAllUsersViewTests(TestCase):
+    """The user list takes the same number of queries for any page size"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', email='admin@example.com', password='pass', is_staff=True)
+        plan = SubscriptionPlan.objects.create(name='Basic', description='Basic plan')
+        for i in range(30):
+            user = User.objects.create(username=f'client{i}', email=f'client{i}@example.com')
+            UserSubscription.objects.create(user=user, plan=plan if i % 2 else None, total_reports_purchased=3)
+            Request.objects.create(
+                user=user, name='John Doe', dob='1990-01-01', city='Austin', state='TX',
+                email='john@example.com', phone_number='5550100'
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_constant_queries(self):
+        # COUNT for the paginator, then one joined and annotated page query
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/admin/dashboard/all-users/?page_size=25')
+
+        self.assertEqual(response.data['count'], 30)
+        self.assertEqual(len(response.data['results']), 25)
+        self.assertTrue(all(row['requests'] == 1 for row in response.data['results']))
+
+    def test_plan_filter(self):
+        response = self.client.get('/api/admin/dashboard/all-users/?subscription_plan=basic')
+        self.assertEqual(response.data['count'], 15)
+
+
+class AdminPaymentHistoryViewTests(TestCase):
+    """Totals come from the database; exports stream every row"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', email='admin@example.com', password='pass', is_staff=True)
+        payer = User.objects.create(username='payer', email='payer@example.com')
+        for i in range(25):
+            PaymentHistory.objects.create(user=payer, amount=Decimal('10.00'), status='succeeded')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_totals_and_keyset_pages(self):
+        response = self.client.get('/api/admin/payments/?page_size=20')
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(response.data['total_amount'], '250.00')
+        self.assertEqual(len(response.data['payments']), 20)
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['payments']), 5)
+        self.assertIsNone(response.data['next'])
+
+    def test_csv_export_streams_all_rows(self):
+        response = self.client.get('/api/admin/payments/?format=csv')
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 26)
+        self.assertTrue(lines[0].startswith('id,user_id,username'))
+
+
+class AdminRequestListingTests(TestCase):
+    """Admin request listings serialize a page without per-row queries"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', email='admin@example.com', password='pass', is_staff=True)
+        client_user = User.objects.create(username='client', email='client@example.com')
+        requests = Request.objects.bulk_create([
+            Request(
+                user=client_user, name=f'Person {i}', dob='1990-01-01', city='Austin', state='TX',
+                email='john@example.com', phone_number='5550100'
+            )
+            for i in range(100)
+        ])
+        RequestActivity.objects.bulk_create([
+            RequestActivity(request=bg_request, admin_user=cls.admin, activity_type=activity_type, description=activity_type)
+            for bg_request in requests
+            for activity_type in ('request_created', 'status_change')
+        ])
+        RequestAssignment.objects.bulk_create([
+            RequestAssignment(request=bg_request, assigned_to=cls.admin, assigned_by=cls.admin, priority='high')
+            for bg_request in requests[::2]
+        ])
+        Report.objects.bulk_create([Report(request=bg_request, pdf='reports/test.pdf') for bg_request in requests[::3]])
+
+    def test_100_row_page_in_one_query(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        with self.assertNumQueries(1):
+            response = client.get('/api/admin/dashboard/requests/?pagination=cursor&page_size=100')
+
+        rows = response.data['results']
+        self.assertEqual(len(rows), 100)
+        self.assertTrue(all(row['activity_count'] == 2 for row in rows))
+        self.assertTrue(all(row['latest_activity']['admin_user'] == 'admin' for row in rows))
+        self.assertEqual(sum(row['has_report'] for row in rows), 34)
+        self.assertEqual(sum(row['priority'] == 'high' for row in rows), 50)
+
+
+class AdminBulkStatusUpdateTests(TestCase):
+    """Bulk status updates run a bounded number of queries for thousands of ids"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', email='admin@example.com', password='pass', is_staff=True)
+        cls.owners = [User.objects.create(username=f'owner{i}', email=f'owner{i}@example.com') for i in range(5)]
+        # Owners have polled their badge before, so their unread counters exist
+        NotificationCounter.objects.bulk_create([NotificationCounter(user=owner, unread_count=0) for owner in cls.owners])
+        cls.requests = Request.objects.bulk_create([
+            Request(
+                user=cls.owners[i % 5], name=f'Person {i}', dob='1990-01-01', city='Austin', state='TX',
+                email='john@example.com', phone_number='5550100'
+            )
+            for i in range(5000)
+        ])
+
+    def test_5000_ids(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from notifications.models import Notification
+
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        request_ids = [bg_request.id for bg_request in self.requests] + [10 ** 9]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.patch(
+                '/api/admin/dashboard/requests/bulk-status/',
+                {'request_ids': request_ids, 'status': 'in_progress'},
+                format='json'
+            )
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['updated_count'], 5000)
+        self.assertEqual(response.data['not_found_count'], 1)
+        # One locking SELECT, then batched writes (SQLite caps rows per INSERT, so allow a few batches)
+        selects = [query for query in queries.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 1)
+        self.assertLess(len(queries), len(request_ids) // 20)
+        self.assertEqual(Request.objects.filter(status=Request.IN_PROGRESS).count(), 5000)
+        self.assertEqual(RequestActivity.objects.filter(new_value=Request.IN_PROGRESS).count(), 5000)
+        self.assertEqual(Notification.objects.filter(recipient__in=self.owners).count(), 5000)
+
+        response = client.patch(
+            '/api/admin/dashboard/requests/bulk-status/',
+            {'request_ids': request_ids[:10], 'status': 'in_progress'},
+            format='json'
+        )
+        self.assertEqual(response.data['updated_count'], 0)
+        self.assertEqual(response.data['unchanged_count'], 10)
+
+
+class ChunkedReportUploadTests(TestCase):
+    """Parts are assembled on disk and stored by the worker, in any order and resumably"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', email='admin@example.com', password='pass', is_staff=True)
+        client_user = User.objects.create(username='client', email='client@example.com')
+        cls.bg_request = Request.objects.create(
+            user=client_user, name='John Doe', dob='1990-01-01', city='Austin', state='TX',
+            email='john@example.com', phone_number='5550100'
+        )
+
+    def setUp(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=f'{temp_dir}/media', REPORT_UPLOAD_TEMP_DIR=f'{temp_dir}/uploads', REPORT_UPLOAD_PART_SIZE=1024
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def put_part(self, upload_id, part_number, data):
+        return self.client.put(
+            f'/api/admin/reports/uploads/{upload_id}/parts/{part_number}/', data,
+            content_type='application/octet-stream'
+        )
+
+    def test_out_of_order_upload_is_stored_by_worker(self):
+        content = bytes(range(256)) * 10  # 2560 bytes: parts of 1024, 1024 and 512
+        response = self.client.post('/api/admin/reports/uploads/', {
+            'request_id': self.bg_request.id,
+            'filename': 'report.pdf',
+            'file_size': len(content),
+            'checksum': hashlib.sha256(content).hexdigest(),
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        upload_id = response.data['upload_id']
+        self.assertEqual(response.data['part_count'], 3)
+
+        self.assertEqual(self.put_part(upload_id, 3, content[2048:]).status_code, 200)
+        self.assertEqual(self.put_part(upload_id, 1, content[:1000]).status_code, 400)
+        self.assertEqual(self.put_part(upload_id, 1, content[:1024]).status_code, 200)
+
+        # Resume: the server reports which parts are still missing
+        self.assertEqual(self.client.get(f'/api/admin/reports/uploads/{upload_id}/').data['missing_parts'], [2])
+        self.assertEqual(self.client.post(f'/api/admin/reports/uploads/{upload_id}/complete/').status_code, 400)
+
+        self.assertEqual(self.put_part(upload_id, 2, content[1024:2048]).status_code, 200)
+        response = self.client.post(f'/api/admin/reports/uploads/{upload_id}/complete/')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], ReportUpload.QUEUED)
+
+        self.assertEqual(process_batch()['stored'], 1)
+
+        upload = ReportUpload.objects.get(id=upload_id)
+        self.assertEqual(upload.status, ReportUpload.COMPLETED)
+        report = Report.objects.get(request=self.bg_request)
+        self.assertEqual(upload.report, report)
+        self.assertEqual(report.file_size, len(content))
+        self.assertEqual(report.checksum, hashlib.sha256(content).hexdigest())
+        with report.pdf.open('rb') as pdf:
+            self.assertEqual(pdf.read(), content)
+        self.bg_request.refresh_from_db()
+        self.assertEqual(self.bg_request.status, Request.COMPLETED)
+
+    def test_checksum_mismatch_fails(self):
+        content = b'x' * 100
+        upload_id = self.client.post('/api/admin/reports/uploads/', {
+            'request_id': self.bg_request.id, 'filename': 'report.pdf', 'file_size': len(content),
+            'checksum': '0' * 64,
+        }, format='json').data['upload_id']
+        self.put_part(upload_id, 1, content)
+        self.client.post(f'/api/admin/reports/uploads/{upload_id}/complete/')
+
+        self.assertEqual(process_batch()['failed'], 1)
+        self.assertEqual(ReportUpload.objects.get(id=upload_id).status, ReportUpload.FAILED)
+        self.assertFalse(Report.objects.filter(request=self.bg_request).exists())
+
+    def test_replacing_a_report_deletes_the_old_file(self):
+        from django.core.files.base import ContentFile
+
+        old_name = default_storage.save('reports/old.pdf', ContentFile(b'%PDF-1.4 old'))
+        Report.objects.create(request=self.bg_request, pdf=old_name)
+        content = b'%PDF-1.4 ' + b'x' * 100
+        upload_id = self.client.post('/api/admin/reports/uploads/', {
+            'request_id': self.bg_request.id, 'filename': 'report.pdf', 'file_size': len(content),
+        }, format='json').data['upload_id']
+        self.put_part(upload_id, 1, content)
+        self.client.post(f'/api/admin/reports/uploads/{upload_id}/complete/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(process_batch()['stored'], 1)
+
+        self.assertFalse(default_storage.exists(old_name))
+        self.assertTrue(default_storage.exists(Report.objects.get(request=self.bg_request).pdf.name))
+        # The queued upload no longer accepts parts
+        self.assertEqual(self.put_part(upload_id, 1, content).status_code, 400)
+
+    def test_failed_db_write_removes_stored_file(self):
+        content = b'%PDF-1.4 ' + b'x' * 100
+        upload_id = self.client.post('/api/admin/reports/uploads/', {
+            'request_id': self.bg_request.id, 'filename': 'report.pdf', 'file_size': len(content),
+        }, format='json').data['upload_id']
+        self.put_part(upload_id, 1, content)
+        self.client.post(f'/api/admin/reports/uploads/{upload_id}/complete/')
+
+        with mock.patch.object(Request, 'save', side_effect=DatabaseError('connection lost')):
+            self.assertEqual(process_batch()['retried'], 1)
+
+        self.assertFalse(Report.objects.filter(request=self.bg_request).exists())
+        self.assertEqual(default_storage.listdir('reports')[1], [])
+
+        # The retry stores the file once
+        ReportUpload.objects.filter(id=upload_id).update(next_attempt_at=timezone.now())
+        self.assertEqual(process_batch()['stored'], 1)
+        self.assertEqual(len(default_storage.listdir('reports')[1]), 1)
@@ -0,0 +1,328 @@
+"""
+Chunked Report Uploads
+Resumable init / part / complete uploads assembled on disk and handed to storage by a worker
+"""
+from datetime import timedelta
+import hashlib
+import logging
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ReportUpload
+
+logger = logging.getLogger(__name__)
+
+# Parts must fit nginx's client_max_body_size (10M)
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+DEFAULT_MAX_FILE_SIZE = 1024 * 1024 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Retry policy for the storage worker
+DEFAULT_MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 60 * 60
+
+# Rows stuck in processing longer than this are assumed to belong to a dead worker
+STALE_LOCK_SECONDS = 30 * 60
+
+# Uploads nobody completed within this many hours are discarded
+ABANDONED_UPLOAD_HOURS = 24
+
+
+class UploadError(Exception):
+    """Client-side problem with an upload (reported as HTTP 400)"""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def temp_path(upload):
+    """Path of the temp file an upload's parts are written into"""
+    return Path(_setting('REPORT_UPLOAD_TEMP_DIR', settings.BASE_DIR / 'tmp' / 'report-uploads')) / f'{upload.id}.upload'
+
+
+def _remove_temp_file(upload):
+    try:
+        os.remove(temp_path(upload))
+    except FileNotFoundError:
+        pass
+
+
+def start_upload(bg_request, user, filename, file_size, content_type='application/pdf', notes='', checksum=''):
+    """
+    Open an upload session and preallocate its temp file
+
+    Args:
+        bg_request: Request the report belongs to
+        user: Admin starting the upload
+        filename (str): Original file name
+        file_size (int): Total size in bytes
+        content_type (str): MIME type of the file
+        notes (str): Report notes saved with the file
+        checksum (str): Optional SHA-256 (hex) verified after assembly
+
+    Returns:
+        ReportUpload: The new session
+    """
+    max_size = _setting('REPORT_UPLOAD_MAX_SIZE', DEFAULT_MAX_FILE_SIZE)
+    if not file_size or file_size < 1:
+        raise UploadError('file_size must be a positive number of bytes')
+    if file_size > max_size:
+        raise UploadError(f'file_size exceeds the {max_size} byte limit')
+
+    upload = ReportUpload.objects.create(
+        request=bg_request,
+        created_by=user,
+        filename=os.path.basename(filename) or f'report_{bg_request.id}.pdf',
+        content_type=content_type or 'application/pdf',
+        notes=notes or '',
+        file_size=file_size,
+        part_size=_setting('REPORT_UPLOAD_PART_SIZE', DEFAULT_PART_SIZE),
+        expected_checksum=(checksum or '').lower(),
+    )
+    path = temp_path(upload)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'wb') as fh:
+        # Sparse file of the final size: parts can arrive in any order
+        fh.truncate(file_size)
+    return upload
+
+
+def write_part(upload, part_number, stream):
+    """
+    Stream one part from the request body into the temp file at its offset
+
+    Re-sending a part overwrites it, so failed parts can simply be retried.
+
+    Args:
+        upload: ReportUpload in the UPLOADING state
+        part_number (int): 1-based part number
+        stream: File-like request body
+
+    Returns:
+        dict: part_number, size and etag (MD5 of the part)
+    """
+    if not 1 <= part_number <= upload.part_count:
+        raise UploadError(f'part_number must be between 1 and {upload.part_count}')
+
+    expected = upload.part_length(part_number)
+    digest = hashlib.md5(usedforsecurity=False)
+    written = 0
+    with transaction.atomic():
+        # Hold the row so complete_upload cannot queue the file while this part is written
+        upload = ReportUpload.objects.select_for_update().get(pk=upload.pk)
+        if upload.status != ReportUpload.UPLOADING:
+            raise UploadError(f'Upload is {upload.status}, parts can no longer be sent')
+
+        with open(temp_path(upload), 'r+b') as fh:
+            fh.seek((part_number - 1) * upload.part_size)
+            while written <= expected:
+                chunk = stream.read(min(STREAM_CHUNK_SIZE, expected + 1 - written))
+                if not chunk:
+                    break
+                if written + len(chunk) > expected:
+                    raise UploadError(f'Part {part_number} must be {expected} bytes')
+                fh.write(chunk)
+                digest.update(chunk)
+                written += len(chunk)
+        if written != expected:
+            raise UploadError(f'Part {part_number} must be {expected} bytes, received {written}')
+
+        if part_number not in upload.received_parts:
+            upload.received_parts = sorted(upload.received_parts + [part_number])
+            upload.save(update_fields=['received_parts', 'updated_at'])
+
+    return {'part_number': part_number, 'size': written, 'etag': digest.hexdigest()}
+
+
+def complete_upload(upload):
+    """
+    Queue a fully received upload for the storage worker
+
+    Completing an already queued or finished upload is a no-op.
+
+    Returns:
+        ReportUpload: The updated session
+    """
+    with transaction.atomic():
+        upload = ReportUpload.objects.select_for_update().get(pk=upload.pk)
+        if upload.status != ReportUpload.UPLOADING:
+            return upload
+        missing = upload.missing_parts
+        if missing:
+            raise UploadError(f'Missing parts: {missing[:20]}')
+        upload.status = ReportUpload.QUEUED
+        upload.next_attempt_at = timezone.now()
+        upload.save(update_fields=['status', 'next_attempt_at', 'updated_at'])
+    return upload
+
+
+def abort_upload(upload):
+    """Discard an unfinished upload and its temp file"""
+    if upload.status in (ReportUpload.PROCESSING, ReportUpload.COMPLETED):
+        raise UploadError(f'Upload is {upload.status} and cannot be aborted')
+    _remove_temp_file(upload)
+    upload.delete()
+
+
+def claim_uploads(batch_size=5):
+    """
+    Lock and return the next queued uploads
+
+    Entries are moved to PROCESSING inside a short transaction so concurrent
+    workers never pick up the same upload.
+    """
+    now = timezone.now()
+
+    with transaction.atomic():
+        # Release uploads abandoned by a crashed worker
+        ReportUpload.objects.filter(
+            status=ReportUpload.PROCESSING,
+            locked_at__lt=now - timedelta(seconds=STALE_LOCK_SECONDS)
+        ).update(status=ReportUpload.QUEUED, locked_at=None)
+
+        uploads = list(
+            ReportUpload.objects.select_for_update(skip_locked=True)
+            .filter(status=ReportUpload.QUEUED, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'created_at')[:batch_size]
+        )
+        if uploads:
+            ReportUpload.objects.filter(
+                id__in=[upload.id for upload in uploads]
+            ).update(status=ReportUpload.PROCESSING, locked_at=now)
+
+    return uploads
+
+
+def store_upload(upload):
+    """
+    Checksum an assembled upload, hand it to storage and attach it to the report
+
+    The file is stored first, then the report, request and upload rows are
+    written in one transaction. If that transaction fails the stored file is
+    deleted again, so a retry never leaves an orphaned copy behind; once it
+    commits, the file of a replaced report is deleted.
+
+    Returns:
+        Report: The created or updated report
+    """
+    from background_requests.files import describe_file
+    from background_requests.models import Report, Request
+
+    with open(temp_path(upload), 'rb') as fh:
+        pdf = File(fh, name=upload.filename)
+        metadata = describe_file(pdf, upload.filename)
+        if metadata['file_size'] != upload.file_size:
+            raise UploadError(f"Assembled file is {metadata['file_size']} bytes, expected {upload.file_size}")
+        if upload.expected_checksum and metadata['checksum'] != upload.expected_checksum:
+            raise UploadError('Checksum mismatch: the assembled file differs from the one sent')
+
+        bg_request = Request.objects.get(pk=upload.request_id)
+        report = Report.objects.filter(request=bg_request).first() or Report(request=bg_request)
+        replaced_name = report.pdf.name
+        # Upload to storage now; metadata is already known so Report.save does not re-read the file
+        report.pdf.save(upload.filename, pdf, save=False)
+
+    try:
+        with transaction.atomic():
+            report.file_size = metadata['file_size']
+            report.content_type = upload.content_type or metadata['content_type']
+            report.checksum = metadata['checksum']
+            if upload.notes:
+                report.notes = upload.notes
+            report.save()
+
+            bg_request.status = Request.COMPLETED
+            bg_request.save()
+
+            ReportUpload.objects.filter(pk=upload.pk).update(
+                status=ReportUpload.COMPLETED,
+                attempts=upload.attempts + 1,
+                checksum=metadata['checksum'],
+                report=report,
+                locked_at=None,
+                last_error=None,
+                completed_at=timezone.now(),
+                updated_at=timezone.now(),
+            )
+            if replaced_name and replaced_name != report.pdf.name:
+                storage = report.pdf.storage
+                transaction.on_commit(lambda: storage.delete(replaced_name))
+    except Exception:
+        report.pdf.storage.delete(report.pdf.name)
+        raise
+
+    _remove_temp_file(upload)
+    return report
+
+
+def _mark_failed(upload, error, max_attempts):
+    attempts = upload.attempts + 1
+    # Bad content never gets better, storage outages might
+    permanent = isinstance(error, (UploadError, FileNotFoundError)) or attempts >= max_attempts
+    delay = min(BACKOFF_BASE_SECONDS * (2 ** (attempts - 1)), BACKOFF_MAX_SECONDS)
+    ReportUpload.objects.filter(pk=upload.pk).update(
+        status=ReportUpload.FAILED if permanent else ReportUpload.QUEUED,
+        attempts=attempts,
+        next_attempt_at=timezone.now() + timedelta(seconds=delay),
+        locked_at=None,
+        last_error=str(error),
+        updated_at=timezone.now(),
+    )
+    if permanent:
+        _remove_temp_file(upload)
+    return permanent
+
+
+def expire_abandoned_uploads(hours=ABANDONED_UPLOAD_HOURS):
+    """
+    Delete uploads that were started but never completed
+
+    Returns:
+        int: Number of uploads removed
+    """
+    cutoff = timezone.now() - timedelta(hours=hours)
+    abandoned = list(ReportUpload.objects.filter(status=ReportUpload.UPLOADING, updated_at__lt=cutoff))
+    for upload in abandoned:
+        _remove_temp_file(upload)
+    ReportUpload.objects.filter(id__in=[upload.id for upload in abandoned]).delete()
+    return len(abandoned)
+
+
+def process_batch(batch_size=5, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Claim and store one batch of completed uploads
+
+    Returns:
+        dict: Counts of claimed, stored, retried and failed uploads
+    """
+    stats = {'claimed': 0, 'stored': 0, 'retried': 0, 'failed': 0}
+    uploads = claim_uploads(batch_size)
+    stats['claimed'] = len(uploads)
+
+    for upload in uploads:
+        try:
+            store_upload(upload)
+            stats['stored'] += 1
+        except Exception as e:
+            if isinstance(e, UploadError):
+                logger.warning(f"Report upload {upload.id} rejected: {e}")
+            else:
+                logger.exception(f"Storing report upload {upload.id} failed")
+            if _mark_failed(upload, e, max_attempts):
+                stats['failed'] += 1
+            else:
+                stats['retried'] += 1
+
+    if uploads:
+        logger.info(
+            f"Report upload batch: {stats['stored']} stored, "
+            f"{stats['retried']} retried, {stats['failed']} failed"
+        )
+    return stats
@@ -6,7 +6,8 @@ from .admin_views import (
     AdminAssignmentView, AdminUsersView, AdminAllUsersView, AdminUserDetailView,
     AdminReportDownloadView, AdminPlanManagementView, AdminPlanDetailView, 
     AdminPlanToggleStatusView, AdminNotificationView, AdminNotificationMarkReadView, 
-    AdminNotificationMarkAllReadView, AdminPaymentHistoryView, AdminSubscriptionAnalyticsView
+    AdminNotificationMarkAllReadView, AdminPaymentHistoryView, AdminSubscriptionAnalyticsView,
+    AdminReportUploadView, AdminReportUploadDetailView, AdminReportUploadPartView, AdminReportUploadCompleteView
 )
 
 urlpatterns = [
@@ -16,6 +17,12 @@ urlpatterns = [
     path('reports/', AdminReportView.as_view(), name='admin_reports'),
     path('reports/upload/', AdminReportView.as_view(), name='admin_upload_report'),
     
+    # Chunked, resumable report uploads (stored by the process_report_uploads worker)
+    path('reports/uploads/', AdminReportUploadView.as_view(), name='admin_report_upload_init'),
+    path('reports/uploads/<uuid:upload_id>/', AdminReportUploadDetailView.as_view(), name='admin_report_upload_detail'),
+    path('reports/uploads/<uuid:upload_id>/parts/<int:part_number>/', AdminReportUploadPartView.as_view(), name='admin_report_upload_part'),
+    path('reports/uploads/<uuid:upload_id>/complete/', AdminReportUploadCompleteView.as_view(), name='admin_report_upload_complete'),
+    
     # Enhanced admin dashboard views
     path('dashboard/stats/', AdminDashboardStatsView.as_view(), name='admin_dashboard_stats'),
     path('dashboard/requests/', AdminRequestManagementView.as_view(), name='admin_request_management'),
@@ -4,7 +4,7 @@ from rest_framework import status, permissions
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from background_requests.models import Request, Report
-from .serializers import AdminRequestSerializer, AdminReportSerializer
+from .serializers import AdminRequestSerializer, AdminReportSerializer, admin_request_queryset
 
 class AdminRequestView(APIView):
     permission_classes = [permissions.IsAdminUser]
@@ -35,7 +35,7 @@ class AdminRequestView(APIView):
     )
     def get(self, request):
         """Get all background check requests for admin dashboard"""
-        requests = Request.objects.all().order_by('-created_at')
+        requests = admin_request_queryset().order_by('-created_at')
         serializer = AdminRequestSerializer(requests, many=True)
         return Response(serializer.data)
 
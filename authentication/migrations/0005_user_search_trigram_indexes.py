@@ -0,0 +1,40 @@
+from django.db import migrations
+
+# Admin user search filters with icontains, which PostgreSQL compiles to
+# UPPER(column::text) LIKE UPPER('%term%'). Trigram GIN indexes on the same
+# expressions serve those lookups (and prefix searches) without a full scan.
+SEARCH_COLUMNS = ['username', 'email', 'first_name', 'last_name']
+
+
+def index_name(column):
+    return f'auth_user_{column}_trgm_idx'
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = schema_editor.quote_name(apps.get_model('authentication', 'User')._meta.db_table)
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {index_name(column)} ON {table} '
+            f'USING gin (UPPER({schema_editor.quote_name(column)}::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {index_name(column)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0004_user_profile_picture'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,135 @@
+"""
+Keyset (cursor) pagination for newest-first listings
+Opt-in alternative to page numbers that seeks on (created_at, id) instead of OFFSET
+"""
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Page-number pagination with an opt-in keyset mode
+
+    Without extra parameters responses are unchanged. Passing
+    ``?pagination=cursor`` (first page) or ``?cursor=<token>`` (following pages)
+    switches to keyset mode: rows are ordered by ``-created_at, -id`` and each
+    page seeks past the last row of the previous one, so deep pages cost the
+    same as the first and the table is never counted.
+
+    Keyset responses look like ``{"next": url, "previous": null, "results": [...]}``.
+    Keyset pages accept ``?page_size=`` up to ``keyset_max_page_size``; page-number
+    mode keeps the project-wide PAGE_SIZE. A cursor only describes a position in
+    the fixed keyset order, so a request that also passes ``?ordering=`` is served
+    in page-number mode instead. Set ``keyset_by_default`` for endpoints that
+    always page by keyset (those do not support ``ordering``).
+    """
+    mode_query_param = 'pagination'
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    keyset_page_size_query_param = 'page_size'
+    keyset_max_page_size = 100
+    ordering = ('-created_at', '-id')
+    keyset_by_default = False
+
+    def is_keyset_requested(self, request):
+        if self.keyset_by_default:
+            return True
+        params = request.query_params
+        if params.get(self.ordering_query_param):
+            return False
+        return params.get(self.mode_query_param) == 'cursor' or self.cursor_query_param in params
+
+    def get_page_size(self, request):
+        if not getattr(self, 'keyset', False):
+            return super().get_page_size(request)
+        try:
+            page_size = int(request.query_params[self.keyset_page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.keyset_max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.is_keyset_requested(request)
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+        if position is not None:
+            created_at, pk = position
+            # The redundant created_at__lte bound lets the index range scan start at the cursor
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk),
+                created_at__lte=created_at
+            )
+
+        # Fetch one extra row to learn whether there is a next page
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.mode_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(last.created_at, last.pk))
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        return None
+
+    @staticmethod
+    def encode_cursor(created_at, pk):
+        """Encode a (created_at, id) position as an opaque URL-safe token"""
+        raw = f'{created_at.isoformat()}|{pk}'.encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(token):
+        """
+        Decode a cursor token
+
+        Returns:
+            tuple: (created_at, id), or None for the first page
+        """
+        if not token:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+            created_at, pk = raw.rsplit('|', 1)
+            created_at = parse_datetime(created_at)
+            pk = int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound('Invalid cursor')
+        if created_at is None:
+            raise NotFound('Invalid cursor')
+        return created_at, pk
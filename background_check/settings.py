@@ -308,6 +308,9 @@ STRIPE_PUBLISHABLE_KEY = os.getenv('STRIPE_PUBLISHABLE_KEY', STRIPE_TEST_PUBLIC_
 STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY', STRIPE_TEST_SECRET_KEY)
 STRIPE_ENDPOINT_SECRET = os.getenv('STRIPE_ENDPOINT_SECRET', STRIPE_TEST_ENDPOINT_SECRET)
 
+# 'fake' swaps Stripe for the in-memory FakeStripeGateway (local load testing only, refused with DEBUG off)
+PAYMENT_GATEWAY = os.getenv('PAYMENT_GATEWAY', 'stripe')
+
 
 
 # Email settings for sending password reset link
@@ -341,6 +344,43 @@ FIREBASE_CONFIG = {
 }
 
 
+# Live notification stream broker: 'postgres' (LISTEN/NOTIFY, works across processes)
+# or 'inprocess'. Defaults to 'postgres' when the database is PostgreSQL.
+NOTIFICATION_STREAM_BROKER = os.getenv('NOTIFICATION_STREAM_BROKER')
+
+# Seconds a stream ticket (used instead of the access token in the stream URL) stays valid
+NOTIFICATION_STREAM_TICKET_TTL = int(os.getenv('NOTIFICATION_STREAM_TICKET_TTL', '60'))
+
+# Seconds request status counts for dashboards are cached (also invalidated on Request save)
+REQUEST_STATS_CACHE_TTL = int(os.getenv('REQUEST_STATS_CACHE_TTL', '30'))
+
+# Days notifications are kept before prune_notifications removes them (None keeps forever).
+# A type rule wins over a category rule, which wins over the default.
+NOTIFICATION_RETENTION = {
+    'default': int(os.getenv('NOTIFICATION_RETENTION_DAYS', '180')),
+    'categories': {
+        'payment': 730,
+        'report': 365,
+    },
+    'types': {},
+}
+
+# Where prune_notifications --export writes its gzip JSONL files. Exports hold notification
+# bodies and recipients, so keep this outside MEDIA_ROOT (which nginx serves publicly).
+NOTIFICATION_EXPORT_DIR = os.getenv('NOTIFICATION_EXPORT_DIR', str(BASE_DIR / 'var' / 'notification-archive'))
+
+# Report downloads: seconds a signed download link stays valid, and the nginx internal
+# location that serves local media via X-Accel-Redirect (empty serves the file from Django)
+REPORT_DOWNLOAD_URL_TTL = int(os.getenv('REPORT_DOWNLOAD_URL_TTL', '300'))
+REPORT_DOWNLOAD_ACCEL_PREFIX = os.getenv('REPORT_DOWNLOAD_ACCEL_PREFIX', '' if DEBUG else '/protected-media/')
+
+# Chunked admin report uploads: parts are assembled here (shared by web and worker) before
+# process_report_uploads hands them to storage. Parts must fit nginx's client_max_body_size.
+REPORT_UPLOAD_TEMP_DIR = os.getenv('REPORT_UPLOAD_TEMP_DIR', str(BASE_DIR / 'tmp' / 'report-uploads'))
+REPORT_UPLOAD_PART_SIZE = int(os.getenv('REPORT_UPLOAD_PART_SIZE', str(8 * 1024 * 1024)))
+REPORT_UPLOAD_MAX_SIZE = int(os.getenv('REPORT_UPLOAD_MAX_SIZE', str(1024 * 1024 * 1024)))
+
+
 # Logging configuration for production debugging
 LOGGING = {
     'version': 1,
@@ -1,6 +1,7 @@
 """
 Custom Cloudinary storage backend for handling PDFs and documents
 """
+import cloudinary.utils
 from cloudinary_storage.storage import RawMediaCloudinaryStorage
 
 
@@ -9,4 +10,20 @@ class PublicMediaCloudinaryStorage(RawMediaCloudinaryStorage):
     Use RawMediaCloudinaryStorage for PDFs and documents.
     This stores files as raw/upload (not image/upload) so PDFs are downloadable.
     """
-    pass
+    
+    def signed_url(self, name, expires_at):
+        """
+        Build an expiring, signed Cloudinary download URL (computed locally, no API call)
+        
+        Args:
+            name (str): Stored file name (public ID)
+            expires_at (int): Unix timestamp after which the URL stops working
+        """
+        return cloudinary.utils.private_download_url(
+            self._prepend_prefix(name),
+            '',
+            resource_type=self._get_resource_type(name),
+            type='upload',
+            expires_at=expires_at,
+            attachment=True
+        )
@@ -0,0 +1,121 @@
+"""
+Report Downloads
+Short-lived HMAC-signed download links, served by nginx (X-Accel-Redirect) or the storage CDN
+"""
+import math
+import time
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+
+SIGNING_SALT = 'background_requests.report_download'
+
+# Expiry times are rounded up to this many seconds so repeated requests for the
+# same report get the same URL, which browsers and proxies can cache
+EXPIRY_GRANULARITY = 60
+
+
+def _ttl():
+    return getattr(settings, 'REPORT_DOWNLOAD_URL_TTL', 300)
+
+
+def _signature(report_id, expires):
+    return signing.Signer(salt=SIGNING_SALT).signature(f'{report_id}:{expires}')
+
+
+def sign_download(report_id, now=None):
+    """
+    Sign a download of a report until a near-future expiry time
+
+    Args:
+        report_id (int): Report ID
+        now (float): Current Unix time (default: time.time())
+
+    Returns:
+        tuple: (expires, signature)
+    """
+    now = time.time() if now is None else now
+    expires = math.ceil((now + _ttl()) / EXPIRY_GRANULARITY) * EXPIRY_GRANULARITY
+    return expires, _signature(report_id, expires)
+
+
+def verify_download(report_id, expires, signature, now=None):
+    """
+    Check a download signature and its expiry
+
+    Returns:
+        bool: True when the signature matches and has not expired
+    """
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+    now = time.time() if now is None else now
+    if expires < now:
+        return False
+    return constant_time_compare(signature or '', _signature(report_id, expires))
+
+
+def report_download_url(request, report):
+    """
+    Build an absolute, signed download link for a report's PDF
+
+    Args:
+        request: Current HTTP request (for the host)
+        report: Report instance
+
+    Returns:
+        str: URL that serves the PDF without further authentication until it expires
+    """
+    expires, signature = sign_download(report.id)
+    path = reverse('requests:report-file', args=[report.id])
+    return request.build_absolute_uri(f'{path}?expires={expires}&signature={signature}')
+
+
+def serve_report_file(report, expires=None):
+    """
+    Respond with a report's PDF without streaming it through the worker
+
+    Local files are handed to nginx with X-Accel-Redirect; storages that can
+    sign their own URLs (Cloudinary) get a redirect to a signed CDN link.
+
+    Args:
+        report: Report instance with a PDF
+        expires (int): Unix time the caller's link expires (bounds the cache lifetime)
+
+    Returns:
+        HttpResponse
+    """
+    storage = report.pdf.storage
+    filename = report.pdf.name.split('/')[-1]
+    expires = expires or sign_download(report.id)[0]
+    max_age = max(int(expires - time.time()), 0)
+
+    if hasattr(storage, 'signed_url'):
+        response = HttpResponseRedirect(storage.signed_url(report.pdf.name, expires))
+    elif isinstance(storage, FileSystemStorage) and getattr(settings, 'REPORT_DOWNLOAD_ACCEL_PREFIX', ''):
+        response = HttpResponse(content_type=report.content_type or 'application/pdf')
+        response['X-Accel-Redirect'] = quote(
+            f"{settings.REPORT_DOWNLOAD_ACCEL_PREFIX.rstrip('/')}/{report.pdf.name}"
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    elif isinstance(storage, FileSystemStorage):
+        # No nginx in front (development): Django streams the file itself
+        response = FileResponse(
+            report.pdf.open('rb'),
+            as_attachment=True,
+            filename=filename,
+            content_type=report.content_type or 'application/pdf'
+        )
+    else:
+        response = HttpResponseRedirect(report.pdf.url)
+
+    response['Cache-Control'] = f'private, max-age={max_age}'
+    if report.checksum:
+        response['ETag'] = f'"{report.checksum}"'
+    return response
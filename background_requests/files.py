@@ -0,0 +1,55 @@
+"""
+Report File Metadata
+Size, content type and checksum captured once at upload so report endpoints never ask storage
+"""
+import hashlib
+import mimetypes
+
+CHECKSUM_ALGORITHM = 'sha256'
+DEFAULT_CONTENT_TYPE = 'application/pdf'
+
+
+def describe_file(file, name=None):
+    """
+    Measure a file stream in one pass
+
+    Args:
+        file: Django File (an upload or a file opened from storage)
+        name (str): File name used to guess the content type (default: file.name)
+
+    Returns:
+        dict: file_size, content_type and checksum (hex digest)
+    """
+    digest = hashlib.new(CHECKSUM_ALGORITHM)
+    size = 0
+    for chunk in file.chunks():
+        digest.update(chunk)
+        size += len(chunk)
+    if hasattr(file, 'seek'):
+        # Leave the stream at the start for the storage backend
+        file.seek(0)
+
+    content_type = getattr(file, 'content_type', None)
+    if not content_type:
+        content_type = mimetypes.guess_type(name or file.name or '')[0] or DEFAULT_CONTENT_TYPE
+    return {'file_size': size, 'content_type': content_type, 'checksum': digest.hexdigest()}
+
+
+def format_file_size(size, precision=1):
+    """
+    Format a byte count for display
+
+    Args:
+        size (int): Size in bytes (None when unknown)
+        precision (int): Decimals shown for megabytes
+
+    Returns:
+        str: e.g. "512 bytes", "12.5 KB", "1.2 MB", or None when unknown
+    """
+    if size is None:
+        return None
+    if size < 1024:
+        return f"{size} bytes"
+    elif size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    return f"{size / (1024 * 1024):.{precision}f} MB"
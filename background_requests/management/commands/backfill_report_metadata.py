@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+
+from background_requests.files import describe_file
+from background_requests.models import Report
+
+
+class Command(BaseCommand):
+    help = 'Record file size, content type and checksum for reports uploaded before they were captured'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Re-measure every report, not only those missing metadata',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Number of reports loaded per query (default: 100)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Measure files without saving',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("=" * 70)
+        self.stdout.write(self.style.SUCCESS("📄 Backfilling report file metadata"))
+        self.stdout.write("=" * 70)
+
+        reports = Report.objects.exclude(pdf='').only('id', 'pdf', 'file_size')
+        if not options['all']:
+            reports = reports.filter(file_size__isnull=True)
+
+        stats = {'updated': 0, 'missing': 0}
+        last_id = 0
+        while True:
+            # Keyset batches by id: rows updated along the way do not shift later pages
+            batch = list(reports.filter(id__gt=last_id).order_by('id')[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            for report in batch:
+                try:
+                    with report.pdf.open('rb') as pdf:
+                        metadata = describe_file(pdf, report.pdf.name)
+                except (FileNotFoundError, OSError) as e:
+                    stats['missing'] += 1
+                    self.stdout.write(self.style.WARNING(f"⚠️  Report {report.id}: {report.pdf.name} not readable ({e})"))
+                    continue
+
+                if not options['dry_run']:
+                    Report.objects.filter(id=report.id).update(**metadata)
+                stats['updated'] += 1
+
+        self.stdout.write(f"Updated: {stats['updated']}{' (dry run)' if options['dry_run'] else ''}")
+        self.stdout.write(f"Missing: {stats['missing']}")
+        self.stdout.write(self.style.SUCCESS("✅ Done"))
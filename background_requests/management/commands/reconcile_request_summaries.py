@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from background_requests.summary import reconcile_request_summaries
+
+
+class Command(BaseCommand):
+    help = 'Recompute per-user request summaries and fix any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user-id',
+            type=int,
+            nargs='+',
+            help='Only reconcile these user IDs',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of users reconciled per transaction (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("=" * 70)
+        self.stdout.write(self.style.SUCCESS("📊 Reconciling request summaries"))
+        self.stdout.write("=" * 70)
+
+        stats = reconcile_request_summaries(
+            user_ids=options['user_id'],
+            batch_size=options['batch_size'],
+        )
+
+        self.stdout.write(f"Checked:   {stats['checked']}")
+        self.stdout.write(f"Created:   {stats['created']}")
+        self.stdout.write(f"Corrected: {stats['corrected']}")
+        self.stdout.write(self.style.SUCCESS("✅ Done"))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-16 22:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('background_requests', '0004_request_payment_amount_request_payment_date_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['-created_at', '-id'], name='background__created_ec715a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='background__user_id_1c8736_idx'),
+        ),
+    ]
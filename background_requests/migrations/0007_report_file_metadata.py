@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('background_requests', '0006_requestsummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='checksum',
+            field=models.CharField(blank=True, help_text='SHA-256 of the PDF', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='content_type',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='file_size',
+            field=models.PositiveBigIntegerField(blank=True, help_text='PDF size in bytes', null=True),
+        ),
+    ]
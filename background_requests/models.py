@@ -1,6 +1,15 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.files.storage import default_storage
+from django.db.models.signals import ModelSignal
+
+# Sent after a saved Request's status differs from the status it was loaded with.
+# Receivers get ``instance``, ``old_status`` and ``new_status``.
+status_changed = ModelSignal(use_caching=True)
+
+# Sent once by Request.bulk_set_status for every request whose status changed.
+# Receivers get ``instances``, ``old_statuses`` ({request_id: status}) and ``new_status``.
+statuses_changed = ModelSignal(use_caching=True)
 
 class Request(models.Model):
     PENDING = 'Pending'
@@ -83,9 +92,82 @@ class Request(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Newest-first listings and keyset pagination on (created_at, id)
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['user', '-created_at', '-id']),
+        ]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Remember the status as loaded (read from __dict__ so a deferred field is not fetched)
+        self._loaded_status = self.__dict__.get('status')
+
     def __str__(self):
         return f"{self.name} - {self.status} - Payment: {self.payment_status}"
     
+    def save(self, *args, **kwargs):
+        """Save and emit status_changed when the status differs from the loaded one"""
+        creating = self._state.adding
+        old_status = self._loaded_status
+        update_fields = kwargs.get('update_fields')
+        
+        super().save(*args, **kwargs)
+        
+        if update_fields is not None and 'status' not in update_fields:
+            return
+        self._loaded_status = self.status
+        if not creating and old_status is not None and old_status != self.status:
+            status_changed.send(
+                sender=self.__class__,
+                instance=self,
+                old_status=old_status,
+                new_status=self.status
+            )
+    
+    @classmethod
+    def bulk_set_status(cls, requests, new_status):
+        """
+        Move many requests to a status with one UPDATE per batch
+        
+        The set-based counterpart of changing status and calling save():
+        ``statuses_changed`` is sent once for the whole set instead of
+        ``status_changed`` once per request.
+        
+        Args:
+            requests (list): Request instances (ideally locked with select_for_update)
+            new_status (str): Status to set
+        
+        Returns:
+            list: Requests whose status actually changed
+        """
+        from django.utils import timezone
+        
+        changed = [r for r in requests if r.status != new_status]
+        if not changed:
+            return []
+        
+        old_statuses = {r.id: r.status for r in changed}
+        now = timezone.now()
+        for bg_request in changed:
+            bg_request.status = new_status
+            bg_request.updated_at = now
+            bg_request._loaded_status = new_status
+        cls.objects.bulk_update(changed, ['status', 'updated_at'], batch_size=500)
+        
+        statuses_changed.send(
+            sender=cls,
+            instances=changed,
+            old_statuses=old_statuses,
+            new_status=new_status
+        )
+        return changed
+    
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._loaded_status = self.__dict__.get('status')
+    
     def get_report_price(self):
         """Get price based on report type"""
         if self.report_type == self.BASIC_REPORT:
@@ -94,12 +176,41 @@ class Request(models.Model):
             return 50.00
         return None
 
+class RequestSummary(models.Model):
+    """
+    Denormalized per-user request counts and last activity
+
+    Maintained on write so the client dashboard reads one row instead of
+    counting the user's requests. Rows are created lazily on first read and
+    can be rebuilt with the ``reconcile_request_summaries`` command.
+    """
+    user = models.OneToOneField(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='request_summary'
+    )
+    total = models.IntegerField(default=0)
+    pending = models.IntegerField(default=0)
+    in_progress = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    last_activity_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.total} requests"
+
 class Report(models.Model):
     request = models.OneToOneField(Request, on_delete=models.CASCADE, related_name='report')
     pdf = models.FileField(upload_to='reports/', storage=default_storage)
     generated_at = models.DateTimeField(auto_now_add=True)
     notes = models.TextField(blank=True, null=True)
     
+    # File metadata captured at upload, so report endpoints never query storage
+    file_size = models.PositiveBigIntegerField(null=True, blank=True, help_text='PDF size in bytes')
+    content_type = models.CharField(max_length=100, blank=True)
+    checksum = models.CharField(max_length=64, blank=True, help_text='SHA-256 of the PDF')
+    
     # Identity Verification Section
     ssn_validation = models.CharField(max_length=100, default='Valid & Matches Records', blank=True)
     address_history = models.CharField(max_length=100, default='Confirmed & Verified', blank=True)
@@ -146,3 +257,20 @@ class Report(models.Model):
 
     def __str__(self):
         return f"Report for {self.request.name}"
+    
+    def save(self, *args, **kwargs):
+        """Save and record the metadata of a newly assigned PDF"""
+        from .files import describe_file
+        
+        if not self.pdf:
+            self.file_size = None
+            self.content_type = ''
+            self.checksum = ''
+        elif not self.pdf._committed:
+            # A fresh upload: measure it before it is handed to storage
+            for field, value in describe_file(self.pdf.file, self.pdf.name).items():
+                setattr(self, field, value)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'pdf' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'file_size', 'content_type', 'checksum'}
+        super().save(*args, **kwargs)
@@ -1,7 +1,9 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import transaction
 from background_requests.models import Request, Report
+from background_requests.downloads import report_download_url
 from subscriptions.models import UserSubscription
 
 @login_required
@@ -22,18 +24,19 @@ def submit_request_page(request):
     
     if request.method == 'POST':
         try:
-            bg_request = Request.objects.create(
-                user=request.user,
-                name=request.POST.get('name'),
-                email=request.POST.get('email'),
-                phone_number=request.POST.get('phone_number'),
-                dob=request.POST.get('dob'),
-                city=request.POST.get('city'),
-                state=request.POST.get('state'),
-                status='Pending'
-            )
-            
-            subscription.increment_usage()
+            with transaction.atomic():
+                # Take the credit first: if another request used it up, nothing is created
+                subscription.increment_usage()
+                bg_request = Request.objects.create(
+                    user=request.user,
+                    name=request.POST.get('name'),
+                    email=request.POST.get('email'),
+                    phone_number=request.POST.get('phone_number'),
+                    dob=request.POST.get('dob'),
+                    city=request.POST.get('city'),
+                    state=request.POST.get('state'),
+                    status='Pending'
+                )
             
             messages.success(request, 'Request submitted successfully!')
             return redirect('requests:request-success', request_id=bg_request.id)
@@ -58,10 +61,14 @@ def view_report_page(request, request_id):
     request_obj = get_object_or_404(Request, id=request_id, user=request.user)
     
     report = None
+    download_url = None
     if hasattr(request_obj, 'report'):
         report = request_obj.report
+        if report.pdf:
+            download_url = report_download_url(request, report)
     
     return render(request, 'requests/view_report.html', {
         'request_obj': request_obj,
-        'report': report
+        'report': report,
+        'download_url': download_url
     })
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Request, Report
+from .files import format_file_size
 from django.contrib.auth import get_user_model
 from datetime import date
 
@@ -131,8 +132,8 @@ class ReportSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Report
-        fields = ['id', 'request', 'request_name', 'request_status', 'pdf', 'generated_at', 'notes', 'file_size']
-        read_only_fields = ['generated_at', 'file_size']
+        fields = ['id', 'request', 'request_name', 'request_status', 'pdf', 'generated_at', 'notes', 'file_size', 'content_type', 'checksum']
+        read_only_fields = ['generated_at', 'file_size', 'content_type', 'checksum']
         extra_kwargs = {
             'request': {
                 'help_text': 'Select the background check request for this report'
@@ -146,14 +147,9 @@ class ReportSerializer(serializers.ModelSerializer):
         }
 
     def get_file_size(self, obj):
-        if obj.pdf and hasattr(obj.pdf, 'size'):
-            size = obj.pdf.size
-            if size < 1024:
-                return f"{size} bytes"
-            elif size < 1024 * 1024:
-                return f"{size / 1024:.1f} KB"
-            else:
-                return f"{size / (1024 * 1024):.1f} MB"
+        # Stored at upload; reading obj.pdf.size would be a storage round trip
+        if obj.pdf:
+            return format_file_size(obj.file_size) or "Unknown"
         return "No file"
 
 class ReportCreateSerializer(serializers.ModelSerializer):
@@ -214,14 +210,9 @@ class DetailedReportSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
     def get_file_size(self, obj):
-        if obj.pdf and hasattr(obj.pdf, 'size'):
-            size = obj.pdf.size
-            if size < 1024:
-                return f"{size} bytes"
-            elif size < 1024 * 1024:
-                return f"{size / 1024:.1f} KB"
-            else:
-                return f"{size / (1024 * 1024):.1f} MB"
+        # Stored at upload; reading obj.pdf.size would be a storage round trip
+        if obj.pdf:
+            return format_file_size(obj.file_size) or "Unknown"
         return "No file"
 
 
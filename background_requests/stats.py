@@ -0,0 +1,70 @@
+"""
+Request Statistics
+Status bucket counts computed with one conditional-aggregate query and cached briefly
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import Request
+
+CACHE_KEY_ALL = 'request_stats:all'
+CACHE_KEY_USER = 'request_stats:user:{user_id}'
+CACHE_KEY_CLIENTS = 'request_stats:clients'
+
+
+def _ttl():
+    return getattr(settings, 'REQUEST_STATS_CACHE_TTL', 30)
+
+
+def request_status_counts(user=None):
+    """
+    Count requests per status in a single query
+
+    Args:
+        user: Limit to this user's requests (default: all requests)
+
+    Returns:
+        dict: total, pending, in_progress and completed counts
+    """
+    user_id = getattr(user, 'pk', user)
+    key = CACHE_KEY_ALL if user_id is None else CACHE_KEY_USER.format(user_id=user_id)
+    counts = cache.get(key)
+    if counts is not None:
+        return counts
+
+    queryset = Request.objects.all() if user_id is None else Request.objects.filter(user_id=user_id)
+    counts = queryset.aggregate(
+        total=Count('id'),
+        pending=Count('id', filter=Q(status=Request.PENDING)),
+        in_progress=Count('id', filter=Q(status=Request.IN_PROGRESS)),
+        completed=Count('id', filter=Q(status=Request.COMPLETED)),
+    )
+    cache.set(key, counts, _ttl())
+    return counts
+
+
+def total_clients():
+    """Return the number of non-staff users (cached with the request stats)"""
+    count = cache.get(CACHE_KEY_CLIENTS)
+    if count is None:
+        count = get_user_model().objects.filter(is_staff=False).count()
+        cache.set(CACHE_KEY_CLIENTS, count, _ttl())
+    return count
+
+
+def completion_rate(counts):
+    """Format the completed share of a status count dict as a percentage"""
+    total = counts['total']
+    return f"{(counts['completed'] / total * 100):.1f}%" if total > 0 else "0%"
+
+
+def invalidate_request_stats(user_ids=()):
+    """
+    Drop cached stats after requests are created, deleted or change status
+
+    Args:
+        user_ids (iterable): Owners of the changed requests
+    """
+    cache.delete_many([CACHE_KEY_ALL] + [CACHE_KEY_USER.format(user_id=user_id) for user_id in user_ids])
@@ -0,0 +1,170 @@
+"""
+Per-user Request Summaries
+Request counts by status and last activity maintained on write for the client dashboard
+"""
+from collections import Counter, defaultdict
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Q
+from django.utils import timezone
+
+from .models import Request, RequestSummary
+
+logger = logging.getLogger(__name__)
+
+STATUS_FIELDS = {
+    Request.PENDING: 'pending',
+    Request.IN_PROGRESS: 'in_progress',
+    Request.COMPLETED: 'completed',
+}
+SUMMARY_FIELDS = ['total', 'pending', 'in_progress', 'completed', 'last_activity_at']
+
+
+def _summary_aggregates():
+    return {
+        'total': Count('id'),
+        'pending': Count('id', filter=Q(status=Request.PENDING)),
+        'in_progress': Count('id', filter=Q(status=Request.IN_PROGRESS)),
+        'completed': Count('id', filter=Q(status=Request.COMPLETED)),
+        'last_activity_at': Max('updated_at'),
+    }
+
+
+def get_request_summary(user):
+    """
+    Return a user's request summary
+
+    Reads the summary row; on first use it is computed once and stored.
+
+    Args:
+        user: User instance or user ID
+
+    Returns:
+        dict: total, pending, in_progress, completed and last_activity_at
+    """
+    user_id = getattr(user, 'pk', user)
+    summary = RequestSummary.objects.filter(user_id=user_id).values(*SUMMARY_FIELDS).first()
+    if summary is not None:
+        return {field: max(value, 0) if field != 'last_activity_at' else value for field, value in summary.items()}
+
+    summary = Request.objects.filter(user_id=user_id).aggregate(**_summary_aggregates())
+    try:
+        with transaction.atomic():
+            RequestSummary.objects.create(user_id=user_id, **summary)
+    except IntegrityError:
+        # Created concurrently, the other writer's row wins
+        pass
+    return summary
+
+
+def status_deltas(old_status=None, new_status=None):
+    """
+    Build the summary field changes for one request
+
+    Args:
+        old_status (str): Status before the change (None when created)
+        new_status (str): Status after the change (None when deleted)
+
+    Returns:
+        Counter: Mapping of summary field to delta
+    """
+    deltas = Counter()
+    if old_status is None:
+        deltas['total'] += 1
+    if new_status is None:
+        deltas['total'] -= 1
+    if old_status in STATUS_FIELDS:
+        deltas[STATUS_FIELDS[old_status]] -= 1
+    if new_status in STATUS_FIELDS:
+        deltas[STATUS_FIELDS[new_status]] += 1
+    return deltas
+
+
+def adjust_request_summaries(deltas, touched_at=None):
+    """
+    Apply summary changes in as few UPDATE statements as possible
+
+    Users without a summary row are skipped; their summary is computed on the
+    next read and therefore already includes the change.
+
+    Args:
+        deltas (dict): Mapping of user ID to a {field: delta} mapping
+        touched_at (datetime): New last activity time (default: now)
+    """
+    touched_at = touched_at or timezone.now()
+    by_delta = defaultdict(list)
+    for user_id, changes in deltas.items():
+        changes = tuple(sorted((field, delta) for field, delta in changes.items() if delta))
+        by_delta[changes].append(user_id)
+
+    for changes, user_ids in by_delta.items():
+        RequestSummary.objects.filter(user_id__in=user_ids).update(
+            last_activity_at=touched_at,
+            updated_at=touched_at,
+            **{field: F(field) + delta for field, delta in changes}
+        )
+
+
+def reconcile_request_summaries(user_ids=None, batch_size=1000):
+    """
+    Recompute summaries from the Request table and fix any drift
+
+    Args:
+        user_ids (list): Limit to these users (default: every user with a
+            summary row or a request)
+        batch_size (int): Users processed per batch
+
+    Returns:
+        dict: Counts of checked, created and corrected summaries
+    """
+    if user_ids is None:
+        summary_ids = set(RequestSummary.objects.values_list('user_id', flat=True))
+        request_ids = set(Request.objects.values_list('user_id', flat=True).distinct())
+        user_ids = summary_ids | request_ids
+    user_ids = sorted(user_ids)
+    empty = {'total': 0, 'pending': 0, 'in_progress': 0, 'completed': 0, 'last_activity_at': None}
+
+    stats = {'checked': 0, 'created': 0, 'corrected': 0}
+    for i in range(0, len(user_ids), batch_size):
+        batch = user_ids[i:i + batch_size]
+        actual = {
+            row.pop('user_id'): row
+            for row in Request.objects.filter(user_id__in=batch)
+            .values('user_id').annotate(**_summary_aggregates()).order_by()
+        }
+
+        with transaction.atomic():
+            summaries = {
+                s.user_id: s for s in RequestSummary.objects.select_for_update().filter(user_id__in=batch)
+            }
+            to_create = []
+            to_update = []
+            for user_id in batch:
+                values = actual.get(user_id, empty)
+                summary = summaries.get(user_id)
+                if summary is None:
+                    to_create.append(RequestSummary(user_id=user_id, **values))
+                else:
+                    # Deletions also count as activity, so never move last_activity_at backwards
+                    if summary.last_activity_at and (
+                        values['last_activity_at'] is None or summary.last_activity_at > values['last_activity_at']
+                    ):
+                        values = {**values, 'last_activity_at': summary.last_activity_at}
+                    if any(getattr(summary, field) != value for field, value in values.items()):
+                        for field, value in values.items():
+                            setattr(summary, field, value)
+                        to_update.append(summary)
+
+            RequestSummary.objects.bulk_create(to_create, ignore_conflicts=True)
+            RequestSummary.objects.bulk_update(to_update, SUMMARY_FIELDS)
+
+        stats['checked'] += len(batch)
+        stats['created'] += len(to_create)
+        stats['corrected'] += len(to_update)
+
+    logger.info(
+        f"Reconciled request summaries: {stats['checked']} checked, "
+        f"{stats['created']} created, {stats['corrected']} corrected"
+    )
+    return stats
@@ -1,3 +1,219 @@
-from django.test import TestCase
+import hashlib
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from authentication.models import User
+
+from .downloads import sign_download, verify_download
+from .models import Report, Request, RequestSummary
+from .stats import request_status_counts
+from .summary import get_request_summary, reconcile_request_summaries
+
+
+class RequestStatsTests(TestCase):
+    """Status counts come from one query and are invalidated on save"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='stats', email='stats@example.com', password='pass')
+        for status in [Request.PENDING, Request.PENDING, Request.IN_PROGRESS, Request.COMPLETED]:
+            Request.objects.create(
+                user=cls.user, name='John Doe', dob='1990-01-01', city='Austin', state='TX',
+                email='john@example.com', phone_number='5550100', status=status
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_counts_in_one_query_then_cached(self):
+        with self.assertNumQueries(1):
+            counts = request_status_counts()
+        self.assertEqual(counts, {'total': 4, 'pending': 2, 'in_progress': 1, 'completed': 1})
+
+        with self.assertNumQueries(0):
+            self.assertEqual(request_status_counts(), counts)
+
+    def test_save_invalidates(self):
+        self.assertEqual(request_status_counts(self.user)['completed'], 1)
+
+        bg_request = Request.objects.filter(status=Request.PENDING).first()
+        bg_request.status = Request.COMPLETED
+        bg_request.save()
+
+        self.assertEqual(request_status_counts(self.user)['completed'], 2)
+        self.assertEqual(request_status_counts()['pending'], 1)
+
+
+class RequestSummaryTests(TestCase):
+    """The dashboard summary is maintained on write and the request list is paged"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='client', email='client@example.com', password='pass')
+
+    def create_request(self, **kwargs):
+        return Request.objects.create(
+            user=self.user, name='John Doe', dob='1990-01-01', city='Austin', state='TX',
+            email='john@example.com', phone_number='5550100', **kwargs
+        )
+
+    def test_maintained_on_write(self):
+        self.assertEqual(get_request_summary(self.user)['total'], 0)
+
+        first = self.create_request()
+        second = self.create_request()
+        first.status = Request.COMPLETED
+        first.save()
+        Request.bulk_set_status([second], Request.IN_PROGRESS)
+        self.create_request().delete()
+
+        summary = RequestSummary.objects.get(user=self.user)
+        self.assertEqual(
+            (summary.total, summary.pending, summary.in_progress, summary.completed), (2, 0, 1, 1)
+        )
+        self.assertEqual(reconcile_request_summaries([self.user.id])['corrected'], 0)
+
+    def test_queryset_delete_keeps_summary(self):
+        self.create_request()
+        get_request_summary(self.user)
+        self.create_request(status=Request.COMPLETED)
+        self.create_request()
+
+        Request.objects.filter(user=self.user, status=Request.PENDING).delete()
+
+        summary = RequestSummary.objects.get(user=self.user)
+        self.assertEqual((summary.total, summary.pending, summary.completed), (1, 0, 1))
+        self.assertEqual(reconcile_request_summaries([self.user.id])['corrected'], 0)
+
+    def test_dashboard_queries_do_not_grow(self):
+        requests = Request.objects.bulk_create([
+            Request(
+                user=self.user, name=f'Person {i}', dob='1990-01-01', city='Austin', state='TX',
+                email='john@example.com', phone_number='5550100'
+            )
+            for i in range(60)
+        ])
+        Report.objects.bulk_create([Report(request=bg_request, pdf='reports/test.pdf') for bg_request in requests[::2]])
+        reconcile_request_summaries([self.user.id])
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        # Subscription, summary row, one joined page
+        with self.assertNumQueries(3):
+            response = client.get('/api/requests/api/my-dashboard/?page_size=50')
+
+        self.assertEqual(response.data['requests_summary']['total'], 60)
+        self.assertEqual(len(response.data['requests']), 50)
+        self.assertEqual(sum(row['has_report'] for row in response.data['requests']), 25)
+
+        response = client.get(response.data['next'])
+        self.assertEqual(len(response.data['requests']), 10)
+        self.assertIsNone(response.data['next'])
+
+
+class ReportMetadataTests(TestCase):
+    """File metadata is captured at upload and report endpoints never query storage"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', email='admin@example.com', password='pass', is_staff=True)
+        cls.user = User.objects.create(username='client', email='client@example.com')
+        cls.bg_request = Request.objects.create(
+            user=cls.user, name='John Doe', dob='1990-01-01', city='Austin', state='TX',
+            email='john@example.com', phone_number='5550100'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_captured_at_upload(self):
+        content = b'%PDF-1.4 test report' * 100
+        self.client.force_authenticate(self.admin)
+
+        response = self.client.post('/api/admin/reports/upload/', {
+            'request_id': self.bg_request.id,
+            'pdf': SimpleUploadedFile('report.pdf', content, content_type='application/pdf'),
+        }, format='multipart')
+
+        self.assertEqual(response.status_code, 200, response.data)
+        report = Report.objects.get(request=self.bg_request)
+        self.assertEqual(report.file_size, len(content))
+        self.assertEqual(report.content_type, 'application/pdf')
+        self.assertEqual(report.checksum, hashlib.sha256(content).hexdigest())
+        with report.pdf.open('rb') as pdf:
+            self.assertEqual(pdf.read(), content)
+
+    def test_endpoints_make_no_storage_calls(self):
+        Request.objects.filter(id=self.bg_request.id).update(status=Request.COMPLETED)
+        report = Report.objects.create(request=self.bg_request, pdf='reports/report.pdf')
+        Report.objects.filter(id=report.id).update(file_size=2048, content_type='application/pdf', checksum='ab' * 32)
+        self.client.force_authenticate(self.user)
+
+        storage_calls = ('size', 'exists', 'open')
+        patches = [
+            mock.patch(f'django.core.files.storage.FileSystemStorage.{name}', side_effect=AssertionError(name))
+            for name in storage_calls
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        response = self.client.get(f'/api/requests/api/{self.bg_request.id}/download-report/')
+        self.assertEqual(response.data['report']['file_size'], 2048)
+        self.assertEqual(response.data['report']['checksum'], 'ab' * 32)
+
+        response = self.client.get(f'/api/requests/api/{self.bg_request.id}/view-report/')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(f'/api/requests/reports/{report.id}/download/')
+        self.assertEqual(response.data['size'], 2048)
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(f'/api/requests/reports/{report.id}/')
+        self.assertEqual(response.data['file_size'], '2.0 KB')
+
+
+@override_settings(REPORT_DOWNLOAD_ACCEL_PREFIX='/protected-media/')
+class ReportDownloadTests(TestCase):
+    """Report links are signed, expire, and hand the file to nginx"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='client', email='client@example.com')
+        bg_request = Request.objects.create(
+            user=cls.user, name='John Doe', dob='1990-01-01', city='Austin', state='TX',
+            email='john@example.com', phone_number='5550100', status=Request.COMPLETED
+        )
+        cls.report = Report.objects.create(request=bg_request, pdf='reports/report.pdf')
+
+    def test_signed_link_uses_x_accel_redirect(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = client.get(f'/api/requests/reports/{self.report.id}/download/').data['download_url']
+
+        response = APIClient().get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/reports/report.pdf')
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(APIClient().get(url.replace('signature=', 'signature=x')).status_code, 403)
+        self.assertEqual(APIClient().post(url).status_code, 405)
+
+    def test_links_expire(self):
+        expires, signature = sign_download(self.report.id, now=1_000_000)
+
+        self.assertTrue(verify_download(self.report.id, expires, signature, now=1_000_000))
+        self.assertFalse(verify_download(self.report.id, expires, signature, now=expires + 1))
+        self.assertFalse(verify_download(self.report.id + 1, expires, signature, now=1_000_000))
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import RequestViewSet, ReportViewSet, submit_request_view, request_success_view, payment_success_view, payment_cancelled_view
+from .views import RequestViewSet, ReportViewSet, submit_request_view, request_success_view, payment_success_view, payment_cancelled_view, report_file_view
 from .page_views import submit_request_page, request_success_page, view_report_page
 
 app_name = 'requests'
@@ -23,6 +23,9 @@ urlpatterns = [
     path('request-success/<int:request_id>/', request_success_page, name='request-success'),
     path('view-report/<int:request_id>/', view_report_page, name='view-report'),
     
+    # Signed report download links (served by nginx or the storage CDN)
+    path('reports/<int:report_id>/file/', report_file_view, name='report-file'),
+    
     # API endpoints
     path('', include(router.urls)),
 ]
@@ -4,14 +4,25 @@ from rest_framework.decorators import action
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
+from django.db import transaction
+from django.db.models import BooleanField, ExpressionWrapper, Q
 from django.utils import timezone
+from background_check.pagination import KeysetPagination
 from .models import Request, Report
+from .downloads import report_download_url, serve_report_file, verify_download
+from .files import format_file_size
+from .stats import completion_rate, request_status_counts
+from .summary import get_request_summary
 from .serializers import (
     RequestSerializer, RequestCreateSerializer, RequestListSerializer, 
     RequestUpdateSerializer, ReportSerializer, ReportCreateSerializer
 )
 from subscriptions.models import UserSubscription
 
+DASHBOARD_REQUEST_FIELDS = [
+    'id', 'user_id', 'name', 'email', 'phone_number', 'dob', 'city', 'state', 'status', 'created_at', 'updated_at',
+]
+
 class RequestViewSet(viewsets.ModelViewSet):
     """
     Background Check Request Management
@@ -20,6 +31,7 @@ class RequestViewSet(viewsets.ModelViewSet):
     Clients can only access their own requests, admins can see all.
     """
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['status', 'state', 'created_at']
     search_fields = ['name', 'email', 'city', 'user__username']
@@ -180,19 +192,11 @@ class RequestViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_404_NOT_FOUND
                 )
             
-            # Check if file physically exists
-            try:
-                file_size = report.pdf.size
-                filename = report.pdf.name.split('/')[-1]
-            except (FileNotFoundError, OSError):
-                return Response({
-                    'error': 'PDF file not found',
-                    'message': 'The PDF file is missing from the server. Please contact support.',
-                    'request_id': bg_request.id,
-                    'report_id': report.id
-                }, status=status.HTTP_404_NOT_FOUND)
+            # Size was recorded at upload, so no storage call is needed here
+            file_size = report.file_size
+            filename = report.pdf.name.split('/')[-1]
             
-            # Calculate file size in MB (handle None for cloud storage)
+            # Calculate file size in MB (None until backfilled for older reports)
             file_size_mb = f"{file_size / (1024 * 1024):.2f} MB" if file_size else "Unknown"
             
             # Return report details with download URL
@@ -200,12 +204,14 @@ class RequestViewSet(viewsets.ModelViewSet):
                 'success': True,
                 'report': {
                     'id': report.id,
-                    'download_url': request.build_absolute_uri(report.pdf.url),
+                    'download_url': report_download_url(request, report),
                     'filename': filename,
                     'generated_at': report.generated_at,
                     'notes': report.notes,
                     'file_size': file_size,
-                    'file_size_mb': file_size_mb
+                    'file_size_mb': file_size_mb,
+                    'content_type': report.content_type or None,
+                    'checksum': report.checksum or None
                 },
                 'request': {
                     'id': bg_request.id,
@@ -322,15 +328,10 @@ class RequestViewSet(viewsets.ModelViewSet):
             try:
                 if report.pdf and report.pdf.name:
                     has_pdf = True
-                    pdf_url = request.build_absolute_uri(report.pdf.url)
+                    pdf_url = report_download_url(request, report)
                     filename = report.pdf.name.split('/')[-1]
-                    if report.pdf.size:
-                        if report.pdf.size < 1024:
-                            file_size = f"{report.pdf.size} bytes"
-                        elif report.pdf.size < 1024 * 1024:
-                            file_size = f"{report.pdf.size / 1024:.1f} KB"
-                        else:
-                            file_size = f"{report.pdf.size / (1024 * 1024):.2f} MB"
+                    if report.file_size:
+                        file_size = format_file_size(report.file_size, precision=2)
             except Exception:
                 pass
             
@@ -606,28 +607,28 @@ class RequestViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
     def dashboard_stats(self, request):
         """Get dashboard statistics (admin only)"""
-        queryset = self.get_queryset()
-        total = queryset.count()
-        pending = queryset.filter(status='Pending').count()
-        in_progress = queryset.filter(status='In Progress').count()
-        completed = queryset.filter(status='Completed').count()
+        counts = request_status_counts()
         
         return Response({
-            'total_requests': total,
-            'pending': pending,
-            'in_progress': in_progress,
-            'completed': completed,
-            'completion_rate': f"{(completed/total*100):.1f}%" if total > 0 else "0%"
+            'total_requests': counts['total'],
+            'pending': counts['pending'],
+            'in_progress': counts['in_progress'],
+            'completed': counts['completed'],
+            'completion_rate': completion_rate(counts)
         })
 
     @swagger_auto_schema(
-        operation_description="Get user's background check requests dashboard with status tracking and subscription details.",
+        operation_description="Get user's background check requests dashboard with status tracking and subscription details. Requests are returned newest first, one page at a time; follow 'next' for older requests.",
         operation_summary="Get My Background Check Dashboard",
         operation_id="request_user_dashboard",
         tags=['Background Check Requests'],
+        manual_parameters=[
+            openapi.Parameter('page_size', openapi.IN_QUERY, description="Requests per page (default 20, max 100)", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="Cursor from the previous response's 'next' link", type=openapi.TYPE_STRING),
+        ],
         responses={
             200: openapi.Response(
-                description="User dashboard with all requests",
+                description="User dashboard with a page of requests",
                 examples={
                     "application/json": {
                         "user": {
@@ -646,7 +647,8 @@ class RequestViewSet(viewsets.ModelViewSet):
                             "total": 5,
                             "pending": 1,
                             "in_progress": 2,
-                            "completed": 2
+                            "completed": 2,
+                            "last_activity_at": "2024-01-22T14:20:00Z"
                         },
                         "requests": [
                             {
@@ -657,9 +659,11 @@ class RequestViewSet(viewsets.ModelViewSet):
                                 "created_at": "2024-01-20T10:30:00Z",
                                 "updated_at": "2024-01-22T14:20:00Z",
                                 "has_report": True,
-                                "report_download_url": "/api/requests/1/download-report/"
+                                "report_download_url": "/api/requests/1/download-report/",
+                                "report_generated_at": "2024-01-22T14:20:00Z"
                             }
-                        ]
+                        ],
+                        "next": "http://localhost:8000/api/requests/api/my-dashboard/?cursor=MjAyNC0wMS0yMFQxMDozMDowMCswMDowMHwx"
                     }
                 }
             ),
@@ -671,13 +675,22 @@ class RequestViewSet(viewsets.ModelViewSet):
         """Get user's dashboard with all their requests and subscription info"""
         user = request.user
         
-        # Get user's requests
-        user_requests = Request.objects.filter(user=user).order_by('-created_at')
+        # One page of the user's requests, newest first; the report join only carries what the row needs
+        user_requests = Request.objects.filter(user=user).select_related('report').only(
+            *DASHBOARD_REQUEST_FIELDS, 'report__id', 'report__pdf', 'report__generated_at'
+        ).annotate(
+            has_report=ExpressionWrapper(
+                Q(report__isnull=False) & ~Q(report__pdf=''), output_field=BooleanField()
+            )
+        )
+        paginator = KeysetPagination()
+        paginator.keyset_by_default = True
+        page = paginator.paginate_queryset(user_requests, request, view=self)
         
         # Get subscription info
         subscription_data = None
         try:
-            subscription = UserSubscription.objects.get(user=user)
+            subscription = UserSubscription.objects.select_related('plan').get(user=user)
             subscription_data = {
                 'plan_name': subscription.plan.name if subscription.plan else None,
                 'plan_price_per_report': str(subscription.plan.price_per_report) if subscription.plan else None,
@@ -696,25 +709,13 @@ class RequestViewSet(viewsets.ModelViewSet):
                 'plans_url': '/api/subscriptions/plans/'
             }
         
-        # Summary statistics
-        requests_summary = {
-            'total': user_requests.count(),
-            'pending': user_requests.filter(status='Pending').count(),
-            'in_progress': user_requests.filter(status='In Progress').count(),
-            'completed': user_requests.filter(status='Completed').count()
-        }
+        # Summary statistics (maintained on write, one row)
+        requests_summary = get_request_summary(user)
         
         # Serialize requests with report info
         requests_data = []
-        for req in user_requests:
-            # Check if report exists and has a PDF file (without reading the file content)
-            has_report = False
-            try:
-                if hasattr(req, 'report') and req.report.pdf and req.report.pdf.name:
-                    has_report = True
-            except Exception:
-                has_report = False
-            
+        for req in page:
+            has_report = req.has_report
             request_data = {
                 'id': req.id,
                 'name': req.name,
@@ -728,6 +729,7 @@ class RequestViewSet(viewsets.ModelViewSet):
                 'updated_at': req.updated_at,
                 'has_report': has_report,
                 'report_download_url': f"/api/requests/{req.id}/download-report/" if has_report else None,
+                'report_generated_at': req.report.generated_at if has_report else None,
             }
             requests_data.append(request_data)
         
@@ -742,6 +744,7 @@ class RequestViewSet(viewsets.ModelViewSet):
             'subscription': subscription_data,
             'requests_summary': requests_summary,
             'requests': requests_data,
+            'next': paginator.get_next_link(),
             'message': 'Dashboard data retrieved successfully'
         })
 
@@ -784,6 +787,7 @@ class RequestViewSet(viewsets.ModelViewSet):
         """Select report pricing and create Stripe checkout session"""
         import stripe
         from django.conf import settings
+        from subscriptions.gateway import get_gateway
         
         # Debug logging
         print(f"[DEBUG] Received data: {request.data}")
@@ -847,7 +851,7 @@ class RequestViewSet(viewsets.ModelViewSet):
             frontend_url = request.build_absolute_uri('/api/requests')
             
             # Create Stripe Checkout Session
-            checkout_session = stripe.checkout.Session.create(
+            checkout_session = get_gateway().create_checkout_session(
                 payment_method_types=['card'],
                 line_items=[{
                     'price_data': {
@@ -936,6 +940,7 @@ class RequestViewSet(viewsets.ModelViewSet):
         """Confirm payment after Stripe checkout"""
         import stripe
         from django.conf import settings
+        from subscriptions.gateway import get_gateway
         from django.utils import timezone
         import traceback
         
@@ -959,7 +964,7 @@ class RequestViewSet(viewsets.ModelViewSet):
             
             # Retrieve checkout session from Stripe
             print(f"[DEBUG CONFIRM] Retrieving Stripe session...")
-            checkout_session = stripe.checkout.Session.retrieve(session_id)
+            checkout_session = get_gateway().retrieve_checkout_session(session_id)
             print(f"[DEBUG CONFIRM] Payment status from Stripe: {checkout_session.payment_status}")
             
             # Check if payment was successful
@@ -1367,27 +1372,21 @@ class ReportViewSet(viewsets.ModelViewSet):
                     'message': 'The report has been created but the PDF file is not available yet.'
                 }, status=status.HTTP_404_NOT_FOUND)
             
-            # Check if file physically exists
-            try:
-                file_size = report.pdf.size
-                filename = report.pdf.name.split('/')[-1]
-            except (FileNotFoundError, OSError):
-                return Response({
-                    'error': 'PDF file not found',
-                    'message': 'The PDF file is missing from the server. Please contact support.',
-                    'report_id': report.id,
-                    'request_id': report.request.id
-                }, status=status.HTTP_404_NOT_FOUND)
+            # Size was recorded at upload, so no storage call is needed here
+            file_size = report.file_size
+            filename = report.pdf.name.split('/')[-1]
             
-            # Calculate file size in MB (handle None for cloud storage)
+            # Calculate file size in MB (None until backfilled for older reports)
             size_mb = f"{file_size / (1024 * 1024):.2f} MB" if file_size else "Unknown"
             
             return Response({
                 'success': True,
-                'download_url': request.build_absolute_uri(report.pdf.url),
+                'download_url': report_download_url(request, report),
                 'filename': filename,
                 'size': file_size,
                 'size_mb': size_mb,
+                'content_type': report.content_type or None,
+                'checksum': report.checksum or None,
                 'report_id': report.id,
                 'request_id': report.request.id,
                 'generated_at': report.generated_at
@@ -1404,6 +1403,7 @@ class ReportViewSet(viewsets.ModelViewSet):
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.views.decorators.http import require_safe
 
 @login_required
 def submit_request_view(request):
@@ -1426,20 +1426,21 @@ def submit_request_view(request):
     
     if request.method == 'POST':
         try:
-            # Create the background check request
-            bg_request = Request.objects.create(
-                user=request.user,
-                name=request.POST.get('name'),
-                dob=request.POST.get('dob'),
-                email=request.POST.get('email'),
-                phone_number=request.POST.get('phone_number'),
-                city=request.POST.get('city'),
-                state=request.POST.get('state'),
-                status='Pending'
-            )
-            
-            # Increment usage
-            subscription.increment_usage()
+            with transaction.atomic():
+                # Take the credit first: if another request used it up, nothing is created
+                subscription.increment_usage()
+                
+                # Create the background check request
+                bg_request = Request.objects.create(
+                    user=request.user,
+                    name=request.POST.get('name'),
+                    dob=request.POST.get('dob'),
+                    email=request.POST.get('email'),
+                    phone_number=request.POST.get('phone_number'),
+                    city=request.POST.get('city'),
+                    state=request.POST.get('state'),
+                    status='Pending'
+                )
             
             messages.success(request, f'Background check request submitted successfully! Request ID: {bg_request.id}')
             return redirect('requests:request_success', request_id=bg_request.id)
@@ -1516,3 +1517,24 @@ def payment_cancelled_view(request):
     return render(request, 'payment_cancelled.html', {
         'request_id': request_id
     })
+
+
+@require_safe
+def report_file_view(request, report_id):
+    """Serve a report PDF to anyone holding a valid signed download link"""
+    from django.http import Http404, HttpResponseForbidden
+    
+    expires = request.GET.get('expires')
+    if not verify_download(report_id, expires, request.GET.get('signature')):
+        return HttpResponseForbidden('Download link is invalid or has expired')
+    
+    report = Report.objects.filter(id=report_id).only(
+        'id', 'pdf', 'file_size', 'content_type', 'checksum'
+    ).first()
+    if report is None or not report.pdf:
+        raise Http404('Report not found')
+    
+    try:
+        return serve_report_file(report, expires=int(expires))
+    except FileNotFoundError:
+        raise Http404('PDF file not found')
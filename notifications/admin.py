@@ -1,6 +1,8 @@
 from django.contrib import admin
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import Notification
+from .counters import delete_notifications, mark_read, mark_unread
+from .models import Notification, NotificationArchive, PushOutbox
 
 
 @admin.register(Notification)
@@ -134,20 +136,55 @@ class NotificationAdmin(admin.ModelAdmin):
     
     def mark_as_read(self, request, queryset):
         """Bulk action to mark notifications as read"""
-        count = 0
-        for notification in queryset:
-            if not notification.is_read:
-                notification.mark_as_read()
-                count += 1
+        count = mark_read(queryset)
         self.message_user(request, f'{count} notification(s) marked as read.')
     mark_as_read.short_description = 'Mark selected as read'
     
     def mark_as_unread(self, request, queryset):
         """Bulk action to mark notifications as unread"""
-        count = 0
-        for notification in queryset:
-            if notification.is_read:
-                notification.mark_as_unread()
-                count += 1
+        count = mark_unread(queryset)
         self.message_user(request, f'{count} notification(s) marked as unread.')
     mark_as_unread.short_description = 'Mark selected as unread'
+    
+    def delete_queryset(self, request, queryset):
+        """Delete selected notifications and keep unread counters in step"""
+        delete_notifications(queryset)
+
+
+@admin.register(PushOutbox)
+class PushOutboxAdmin(admin.ModelAdmin):
+    """Admin interface for the push notification outbox"""
+    
+    list_display = ['id', 'title', 'target', 'user', 'status', 'attempts', 'next_attempt_at', 'created_at']
+    list_filter = ['status', 'target', 'created_at']
+    search_fields = ['title', 'body', 'user__username', 'user__email']
+    readonly_fields = ['created_at', 'sent_at', 'locked_at', 'last_error']
+    ordering = ['-created_at']
+    
+    actions = ['retry_now']
+    
+    def retry_now(self, request, queryset):
+        """Requeue failed or pending entries for immediate delivery"""
+        count = queryset.exclude(status=PushOutbox.SENT).update(
+            status=PushOutbox.PENDING,
+            next_attempt_at=timezone.now(),
+            locked_at=None
+        )
+        self.message_user(request, f'{count} push notification(s) requeued.')
+    retry_now.short_description = 'Retry selected now'
+
+
+@admin.register(NotificationArchive)
+class NotificationArchiveAdmin(admin.ModelAdmin):
+    """Read-only view of notifications moved out by prune_notifications"""
+    
+    list_display = ['original_id', 'title', 'recipient_id', 'category', 'type', 'created_at', 'archived_at']
+    list_filter = ['category', 'type', 'created_at']
+    search_fields = ['title', 'message']
+    ordering = ['-created_at']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
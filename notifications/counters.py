@@ -0,0 +1,241 @@
+"""
+Unread Notification Counters
+Per-recipient unread counts maintained on write, and set-based read/unread updates
+
+Every write that changes unread rows must go through this module (or
+Notification.save()/delete()): bulk deletes use delete_notifications(). A
+raw queryset .update(is_read=...) or .delete() leaves the counters behind
+until ``reconcile_unread_counts`` runs.
+"""
+from collections import defaultdict
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Value
+from django.utils import timezone
+from django.db.models.functions import Greatest
+
+from .models import Notification, NotificationCounter
+
+logger = logging.getLogger(__name__)
+
+
+def get_unread_count(user):
+    """
+    Return the unread notification count for a user
+
+    Reads the counter row; on first use the count is computed once and stored.
+
+    Args:
+        user: User instance or user ID
+
+    Returns:
+        int: Number of unread notifications
+    """
+    user_id = getattr(user, 'pk', user)
+    counter = NotificationCounter.objects.filter(user_id=user_id).values_list('unread_count', flat=True).first()
+    if counter is not None:
+        return max(counter, 0)
+
+    count = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+    try:
+        with transaction.atomic():
+            NotificationCounter.objects.create(user_id=user_id, unread_count=count)
+    except IntegrityError:
+        # Created concurrently, the other writer's row wins
+        pass
+    return count
+
+
+def adjust_unread_counts(deltas):
+    """
+    Apply unread count changes in as few UPDATE statements as possible
+
+    Call in the transaction that changed the notifications. A user without
+    a counter row gets one, counted from the table: that count already
+    sees this transaction's changes. If a reader creates the row at the
+    same time, whichever insert comes second fails and that side falls
+    back to the increment, so no change is lost or counted twice.
+
+    Args:
+        deltas (dict): Mapping of user ID to the change in unread count
+    """
+    by_delta = defaultdict(list)
+    for user_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(user_id)
+
+    for delta, user_ids in by_delta.items():
+        increment = {'unread_count': Greatest(F('unread_count') + delta, Value(0))}
+        updated = NotificationCounter.objects.filter(user_id__in=user_ids).update(**increment)
+        if updated == len(user_ids):
+            continue
+        existing = set(NotificationCounter.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+        missing = [user_id for user_id in user_ids if user_id not in existing]
+        counts = dict(
+            Notification.objects.filter(recipient_id__in=missing, is_read=False)
+            .values('recipient_id').annotate(total=Count('id')).order_by()
+            .values_list('recipient_id', 'total')
+        )
+        counters = [NotificationCounter(user_id=user_id, unread_count=counts.get(user_id, 0)) for user_id in missing]
+        try:
+            with transaction.atomic():
+                NotificationCounter.objects.bulk_create(counters)
+        except IntegrityError:
+            # A reader created some of them meanwhile, retry one by one
+            for counter in counters:
+                try:
+                    with transaction.atomic():
+                        counter.save(force_insert=True)
+                except IntegrityError:
+                    # The reader's count did not see this change
+                    NotificationCounter.objects.filter(user_id=counter.user_id).update(**increment)
+
+
+def delete_notifications(queryset):
+    """
+    Delete notifications and take their unread rows off the counters
+
+    Returns:
+        int: Number of notifications deleted
+    """
+    with transaction.atomic():
+        deltas = unread_deltas_for(queryset)
+        deleted, _ = queryset.delete()
+        adjust_unread_counts(deltas)
+    return deleted
+
+
+def unread_deltas_for(queryset, sign=-1):
+    """
+    Build per-recipient deltas for the unread rows of a queryset
+
+    Use before deleting or marking rows as read (sign=-1).
+
+    Returns:
+        dict: Mapping of user ID to delta
+    """
+    rows = queryset.filter(is_read=False).values('recipient_id').annotate(total=Count('id')).order_by()
+    return {row['recipient_id']: sign * row['total'] for row in rows}
+
+
+def apply_watermark(queryset, before_id=None, before_timestamp=None):
+    """
+    Limit a notification queryset to rows at or before a watermark
+
+    Lets clients clear everything they have seen without racing new arrivals.
+
+    Args:
+        queryset: Notification queryset
+        before_id (int): Newest notification ID to include
+        before_timestamp (datetime): Newest created_at to include
+    """
+    if before_id is not None:
+        queryset = queryset.filter(id__lte=before_id)
+    if before_timestamp is not None:
+        queryset = queryset.filter(created_at__lte=before_timestamp)
+    return queryset
+
+
+def _set_read_state(queryset, is_read):
+    queryset = queryset.filter(is_read=not is_read).order_by()
+    sign = -1 if is_read else 1
+    now = timezone.now()
+
+    with transaction.atomic():
+        # One grouped SELECT for the counter deltas, one UPDATE for the rows
+        deltas = {
+            row['recipient_id']: sign * row['total']
+            for row in queryset.values('recipient_id').annotate(total=Count('id'))
+        }
+        count = queryset.update(is_read=is_read, read_at=now if is_read else None, updated_at=now)
+
+        if count == sum(abs(delta) for delta in deltas.values()):
+            adjust_unread_counts(deltas)
+        else:
+            # Rows changed between the SELECT and the UPDATE, recount the affected users
+            reconcile_unread_counts(user_ids=list(deltas))
+    return count
+
+
+def mark_read(queryset, before_id=None, before_timestamp=None):
+    """
+    Mark every unread notification in a queryset as read with one UPDATE
+
+    Args:
+        queryset: Notification queryset
+        before_id (int): Only rows with this ID or lower
+        before_timestamp (datetime): Only rows created at or before this time
+
+    Returns:
+        int: Number of notifications updated
+    """
+    return _set_read_state(apply_watermark(queryset, before_id, before_timestamp), True)
+
+
+def mark_unread(queryset, before_id=None, before_timestamp=None):
+    """
+    Mark every read notification in a queryset as unread with one UPDATE
+
+    Returns:
+        int: Number of notifications updated
+    """
+    return _set_read_state(apply_watermark(queryset, before_id, before_timestamp), False)
+
+
+def reconcile_unread_counts(user_ids=None, batch_size=1000):
+    """
+    Recompute counters from the Notification table and fix any drift
+
+    Args:
+        user_ids (list): Limit to these users (default: every user with a
+            counter row or an unread notification)
+        batch_size (int): Users processed per batch
+
+    Returns:
+        dict: Counts of checked, created and corrected counters
+    """
+    if user_ids is None:
+        counter_ids = set(NotificationCounter.objects.values_list('user_id', flat=True))
+        unread_ids = set(
+            Notification.objects.filter(is_read=False).values_list('recipient_id', flat=True).distinct()
+        )
+        user_ids = counter_ids | unread_ids
+    user_ids = sorted(user_ids)
+
+    stats = {'checked': 0, 'created': 0, 'corrected': 0}
+    for i in range(0, len(user_ids), batch_size):
+        batch = user_ids[i:i + batch_size]
+        actual = dict(
+            Notification.objects.filter(recipient_id__in=batch, is_read=False)
+            .values('recipient_id').annotate(total=Count('id')).order_by()
+            .values_list('recipient_id', 'total')
+        )
+
+        with transaction.atomic():
+            counters = {
+                c.user_id: c for c in NotificationCounter.objects.select_for_update().filter(user_id__in=batch)
+            }
+            to_create = []
+            to_update = []
+            for user_id in batch:
+                count = actual.get(user_id, 0)
+                counter = counters.get(user_id)
+                if counter is None:
+                    to_create.append(NotificationCounter(user_id=user_id, unread_count=count))
+                elif counter.unread_count != count:
+                    counter.unread_count = count
+                    to_update.append(counter)
+
+            NotificationCounter.objects.bulk_create(to_create, ignore_conflicts=True)
+            NotificationCounter.objects.bulk_update(to_update, ['unread_count'])
+
+        stats['checked'] += len(batch)
+        stats['created'] += len(to_create)
+        stats['corrected'] += len(to_update)
+
+    logger.info(
+        f"Reconciled unread counters: {stats['checked']} checked, "
+        f"{stats['created']} created, {stats['corrected']} corrected"
+    )
+    return stats
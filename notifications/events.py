@@ -0,0 +1,200 @@
+"""
+Notification Events
+Single registry mapping domain events to the notifications and pushes they produce
+"""
+from django.db import transaction
+
+from .counters import adjust_unread_counts
+from .fanout import BULK_CREATE_BATCH_SIZE, admin_recipient_ids
+from .models import Notification, PushOutbox
+from .stream import publish_notifications
+
+# Event types
+REQUEST_CREATED = 'request_created'
+STATUS_CHANGED = 'status_changed'
+REPORT_READY = 'report_ready'
+
+# Audiences
+AUDIENCE_USER = 'user'
+AUDIENCE_ADMINS = 'admins'
+
+STATUS_MESSAGES = {
+    'Pending': 'Your background check request is pending review.',
+    'In Progress': 'Your background check is now in progress.',
+    'Completed': 'Your background check has been completed!',
+}
+
+# Every template string is formatted with the event context
+# (request, report, old_status, new_status, status_message).
+EVENT_TEMPLATES = {
+    REQUEST_CREATED: [
+        {
+            'audience': AUDIENCE_USER,
+            'type': Notification.SYSTEM,
+            'category': Notification.BACKGROUND_CHECK,
+            'title': 'Background Check Request Submitted',
+            'message': 'Your background check request for {request.name} has been successfully submitted. '
+                       'We will notify you once the verification is complete.',
+            'push_title': 'Request Submitted Successfully',
+            'push_body': 'Your background check request for {request.name} has been received and is being processed.',
+            'notification_type': 'background_check',
+            'related_object_type': 'Request',
+            'related_object_id': '{request.id}',
+            'data': {'request_id': '{request.id}', 'type': 'request_created'},
+        },
+        {
+            'audience': AUDIENCE_ADMINS,
+            'type': Notification.USER_TO_ADMIN,
+            'category': Notification.BACKGROUND_CHECK,
+            'title': 'New Background Check Request',
+            'message': '{request.user.username} has submitted a new background check request for {request.name}.',
+            'push_title': 'New Request Received',
+            'push_body': 'New background check request from {request.user.username} for {request.name}',
+            'notification_type': 'background_check',
+            'related_object_type': 'Request',
+            'related_object_id': '{request.id}',
+            'action_url': '/admin/background_requests/request/{request.id}/change/',
+            'data': {'request_id': '{request.id}', 'user_id': '{request.user_id}', 'type': 'new_request'},
+        },
+    ],
+    STATUS_CHANGED: [
+        {
+            'audience': AUDIENCE_USER,
+            'type': Notification.ADMIN_TO_USER,
+            'category': Notification.BACKGROUND_CHECK,
+            'title': 'Background Check Status: {new_status}',
+            'message': '{status_message}',
+            'push_title': 'Background Check Status: {new_status}',
+            'push_body': '{status_message}',
+            'notification_type': 'background_check',
+            'related_object_type': 'Request',
+            'related_object_id': '{request.id}',
+            'data': {'request_id': '{request.id}', 'status': '{new_status}', 'type': 'status_update'},
+        },
+    ],
+    REPORT_READY: [
+        {
+            'audience': AUDIENCE_USER,
+            'type': Notification.ADMIN_TO_USER,
+            'category': Notification.REPORT,
+            'title': 'Background Check Report Ready',
+            'message': 'Your background check report for {request.name} is now available for download.',
+            'push_title': 'Report Ready',
+            'push_body': 'Your background check report for {request.name} is ready!',
+            'notification_type': 'report_ready',
+            'related_object_type': 'Report',
+            'related_object_id': '{report.id}',
+            'action_url': '/api/requests/api/{request.id}/download-report/',
+            'data': {'request_id': '{request.id}', 'report_id': '{report.id}', 'type': 'report_ready'},
+        },
+    ],
+}
+
+
+def _build_context(request=None, report=None, old_status=None, new_status=None):
+    if report is not None and request is None:
+        request = report.request
+    if new_status is None and request is not None:
+        new_status = request.status
+    return {
+        'request': request,
+        'report': report,
+        'old_status': old_status,
+        'new_status': new_status,
+        'status_message': STATUS_MESSAGES.get(
+            new_status, f'Your background check status has been updated to: {new_status}'
+        ),
+    }
+
+
+def emit(event, request=None, report=None, old_status=None, new_status=None):
+    """
+    Create the notifications and queue the pushes registered for an event
+
+    All notification rows are written with one bulk INSERT and all pushes are
+    queued with one outbox INSERT, in the same transaction.
+
+    Args:
+        event (str): One of REQUEST_CREATED, STATUS_CHANGED, REPORT_READY
+        request: Related background check Request
+        report: Related Report (for REPORT_READY)
+        old_status (str): Previous status (for STATUS_CHANGED)
+        new_status (str): New status (for STATUS_CHANGED)
+
+    Returns:
+        list: Created Notification instances
+    """
+    return emit_many(event, [
+        {'request': request, 'report': report, 'old_status': old_status, 'new_status': new_status}
+    ])
+
+
+@transaction.atomic
+def emit_many(event, contexts):
+    """
+    Emit the same event for many objects with one INSERT per table
+
+    Args:
+        event (str): One of REQUEST_CREATED, STATUS_CHANGED, REPORT_READY
+        contexts (list): Keyword dicts as accepted by emit()
+
+    Returns:
+        list: Created Notification instances
+    """
+    templates = EVENT_TEMPLATES[event]
+
+    admin_ids = None
+    groups = []
+    for context in contexts:
+        context = _build_context(**context)
+        for template in templates:
+            if template['audience'] == AUDIENCE_ADMINS:
+                if admin_ids is None:
+                    admin_ids = admin_recipient_ids()
+                recipient_ids = admin_ids
+            else:
+                recipient_ids = [context['request'].user_id]
+
+            fields = {
+                'type': template['type'],
+                'category': template['category'],
+                'title': template['title'].format(**context),
+                'message': template['message'].format(**context),
+                'related_object_type': template['related_object_type'],
+                'related_object_id': int(template['related_object_id'].format(**context)),
+                'action_url': template['action_url'].format(**context) if template.get('action_url') else None,
+                # Admin notifications come from the requesting user, the rest are system notifications
+                'sender_id': context['request'].user_id if template['audience'] == AUDIENCE_ADMINS else None,
+            }
+            groups.append((template, context, [Notification(recipient_id=rid, **fields) for rid in recipient_ids]))
+
+    notifications = Notification.objects.bulk_create(
+        [n for _, _, group in groups for n in group],
+        batch_size=BULK_CREATE_BATCH_SIZE
+    )
+    deltas = {}
+    for notification in notifications:
+        deltas[notification.recipient_id] = deltas.get(notification.recipient_id, 0) + 1
+    adjust_unread_counts(deltas)
+    publish_notifications([n.id for n in notifications])
+
+    outbox = []
+    for template, context, group in groups:
+        if not group:
+            continue
+        data = {key: value.format(**context) for key, value in template['data'].items()}
+        if template['audience'] == AUDIENCE_USER:
+            data['notification_id'] = str(group[0].id)
+        outbox.append(PushOutbox(
+            target=PushOutbox.TARGET_ADMINS if template['audience'] == AUDIENCE_ADMINS else PushOutbox.TARGET_USER,
+            user_id=None if template['audience'] == AUDIENCE_ADMINS else context['request'].user_id,
+            title=template['push_title'].format(**context),
+            body=template['push_body'].format(**context),
+            notification_type=template['notification_type'],
+            data=data,
+            notification_ids=[n.id for n in group],
+        ))
+    if outbox:
+        PushOutbox.objects.bulk_create(outbox, batch_size=BULK_CREATE_BATCH_SIZE)
+
+    return notifications
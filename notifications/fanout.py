@@ -0,0 +1,111 @@
+"""
+Notification Fan-out
+Creates notification rows for many recipients with a constant number of queries
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from .counters import adjust_unread_counts
+from .models import Notification
+from .outbox import enqueue_admin_push, enqueue_user_push
+from .stream import publish_notifications
+
+User = get_user_model()
+
+BULK_CREATE_BATCH_SIZE = 500
+
+
+def admin_recipient_ids():
+    """Return IDs of all active staff users"""
+    return list(User.objects.filter(is_staff=True, is_active=True).values_list('id', flat=True))
+
+
+def bulk_notify(recipient_ids, title, message, **fields):
+    """
+    Create the same notification for many recipients in one INSERT per batch
+
+    Args:
+        recipient_ids (list): IDs of users who receive the notification
+        title (str): Notification title
+        message (str): Notification message
+        **fields: Any other Notification field (sender, type, category, ...)
+
+    Returns:
+        list: Created Notification instances (with primary keys)
+    """
+    notifications = [
+        Notification(recipient_id=recipient_id, title=title, message=message, **fields)
+        for recipient_id in dict.fromkeys(recipient_ids)
+    ]
+    notifications = Notification.objects.bulk_create(notifications, batch_size=BULK_CREATE_BATCH_SIZE)
+    if not fields.get('is_read'):
+        adjust_unread_counts({n.recipient_id: 1 for n in notifications})
+    publish_notifications([n.id for n in notifications])
+    return notifications
+
+
+@transaction.atomic
+def notify_admins(title, message, push_title=None, push_body=None, notification_type='general',
+                  data=None, send_push=True, **fields):
+    """
+    Notify all active admins and queue a single push for their devices
+
+    Args:
+        title (str): Notification title
+        message (str): Notification message
+        push_title (str): Push title (defaults to title)
+        push_body (str): Push body (defaults to message)
+        notification_type (str): Type of push notification
+        data (dict): Push data payload
+        send_push (bool): Whether to queue a push notification
+        **fields: Any other Notification field (sender, category, ...)
+
+    Returns:
+        list: Created Notification instances
+    """
+    fields.setdefault('type', Notification.USER_TO_ADMIN)
+    notifications = bulk_notify(admin_recipient_ids(), title, message, **fields)
+
+    if send_push and notifications:
+        enqueue_admin_push(
+            push_title or title,
+            push_body or message,
+            notification_type=notification_type,
+            data=data,
+            notifications=notifications
+        )
+    return notifications
+
+
+@transaction.atomic
+def notify_user(user, title, message, push_title=None, push_body=None, notification_type='general',
+                data=None, send_push=True, **fields):
+    """
+    Notify a single user and queue a push for their devices
+
+    Args:
+        user: User who receives the notification
+        title (str): Notification title
+        message (str): Notification message
+        push_title (str): Push title (defaults to title)
+        push_body (str): Push body (defaults to message)
+        notification_type (str): Type of push notification
+        data (dict): Push data payload (notification_id is added automatically)
+        send_push (bool): Whether to queue a push notification
+        **fields: Any other Notification field (sender, type, category, ...)
+
+    Returns:
+        Notification: Created notification instance
+    """
+    notification = Notification.objects.create(recipient=user, title=title, message=message, **fields)
+
+    if send_push:
+        enqueue_user_push(
+            user,
+            push_title or title,
+            push_body or message,
+            notification_type=notification_type,
+            data={'notification_id': str(notification.id), **(data or {})},
+            notifications=[notification]
+        )
+    return notification
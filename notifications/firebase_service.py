@@ -3,11 +3,12 @@ Firebase Cloud Messaging (FCM) Service
 Handles push notification sending via Firebase Admin SDK
 """
 import firebase_admin
-from firebase_admin import credentials, messaging
+from firebase_admin import credentials, exceptions as firebase_exceptions, messaging
 from django.conf import settings
 from django.utils import timezone
 import logging
 import os
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -32,35 +33,207 @@ def initialize_firebase():
     return firebase_admin._apps
 
 
-def send_push_notification(device_tokens, title, body, data=None, image_url=None):
+# FCM accepts at most 500 tokens per multicast request
+FCM_BATCH_SIZE = 500
+
+# Per-token errors meaning the token will never work again; only these deactivate a device
+INVALID_TOKEN_ERRORS = (messaging.UnregisteredError, firebase_exceptions.InvalidArgumentError)
+
+
+class PushTransportError(Exception):
+    """
+    A multicast request failed as a whole (timeout, 5xx, auth)
+
+    Raised by send_push_notification(raise_on_error=True) after every chunk
+    was attempted. ``result`` holds the outcome of the chunks that did go
+    through, so invalid tokens among them can still be handled.
+    """
+
+    def __init__(self, error, result):
+        super().__init__(str(error))
+        self.error = error
+        self.result = result
+
+
+class FirebaseTransport:
+    """
+    Default transport that talks to FCM through the Firebase Admin SDK
+    """
+
+    def send(self, message):
+        """Send a single message, returns the message ID"""
+        return messaging.send(message)
+
+    def send_each_for_multicast(self, multicast_message):
+        """Send a multicast message, returns a messaging.BatchResponse"""
+        return messaging.send_each_for_multicast(multicast_message)
+
+
+class FakeFCMTransport:
+    """
+    In-memory FCM transport for tests and offline benchmarks
+
+    Simulates the network round trip with a fixed latency per HTTP call,
+    reports any token listed in ``failing_tokens`` as unregistered and fails
+    whole requests with ``transport_error`` while it is set.
+    """
+
+    def __init__(self, latency=0.0, failing_tokens=None, transport_error=None):
+        self.latency = latency
+        self.failing_tokens = set(failing_tokens or [])
+        self.transport_error = transport_error
+        self.calls = 0
+        self.messages_sent = 0
+
+    def _round_trip(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.transport_error is not None:
+            raise self.transport_error
+
+    def send(self, message):
+        self._round_trip()
+        if message.token in self.failing_tokens:
+            raise messaging.UnregisteredError('Requested entity was not found.')
+        self.messages_sent += 1
+        return f'projects/fake/messages/{self.messages_sent}'
+
+    def send_each_for_multicast(self, multicast_message):
+        self._round_trip()
+        responses = []
+        for token in multicast_message.tokens:
+            if token in self.failing_tokens:
+                responses.append(messaging.SendResponse(
+                    None, messaging.UnregisteredError('Requested entity was not found.')
+                ))
+            else:
+                self.messages_sent += 1
+                responses.append(messaging.SendResponse(
+                    {'name': f'projects/fake/messages/{self.messages_sent}'}, None
+                ))
+        return messaging.BatchResponse(responses)
+
+
+_transport = FirebaseTransport()
+
+
+def get_transport():
+    """Return the transport used for sending push notifications"""
+    return _transport
+
+
+def set_transport(transport):
+    """
+    Replace the push transport (e.g. with FakeFCMTransport)
+    
+    Returns:
+        The previously configured transport
+    """
+    global _transport
+    previous = _transport
+    _transport = transport
+    return previous
+
+
+def _chunked(items, size):
+    """Yield successive chunks of at most ``size`` items"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def build_push_message_kwargs(title, body, data, image_url=None):
+    """
+    Build the platform configuration shared by single and multicast messages
+    
+    Args:
+        title (str): Notification title
+        body (str): Notification body
+        data (dict): Data payload (values must already be strings)
+        image_url (str): Optional image URL for rich notification
+    
+    Returns:
+        dict: Keyword arguments for messaging.Message / messaging.MulticastMessage
+    """
+    return {
+        'notification': messaging.Notification(
+            title=title,
+            body=body,
+            image=image_url if image_url else None
+        ),
+        'data': data,
+        'android': messaging.AndroidConfig(
+            priority='high',
+            notification=messaging.AndroidNotification(
+                sound='default',
+                color='#4CAF50',
+                channel_id='background_check_notifications'
+            )
+        ),
+        'apns': messaging.APNSConfig(
+            payload=messaging.APNSPayload(
+                aps=messaging.Aps(
+                    sound='default',
+                    badge=1,
+                    content_available=True
+                )
+            )
+        ),
+        'webpush': messaging.WebpushConfig(
+            notification=messaging.WebpushNotification(
+                icon='/static/icons/notification-icon.png',
+                badge='/static/icons/badge-icon.png'
+            )
+        ),
+    }
+
+
+def send_push_notification(device_tokens, title, body, data=None, image_url=None, transport=None,
+                           raise_on_error=False):
     """
     Send push notification to one or more devices
     
+    Tokens are grouped into chunks of FCM_BATCH_SIZE and each chunk is sent
+    with a single multicast request.
+    
     Args:
         device_tokens (str or list): Single token or list of FCM device tokens
         title (str): Notification title
         body (str): Notification body
         data (dict): Additional data payload
         image_url (str): Optional image URL for rich notification
+        transport: Optional transport override (defaults to get_transport())
+        raise_on_error (bool): Raise PushTransportError if any batch request
+            failed outright (e.g. FCM unreachable) so the caller can retry
     
     Returns:
-        dict: Response with success count, failure count, and failed tokens
+        dict: Response with success count, failure count, failed tokens,
+            invalid_tokens (FCM says they will never work again) and
+            transport_failure_count (tokens whose batch request failed)
+    
+    Raises:
+        PushTransportError: A batch request failed and raise_on_error is set
     """
-    initialize_firebase()
+    if transport is None:
+        transport = get_transport()
+    if isinstance(transport, FirebaseTransport):
+        initialize_firebase()
     
     # Convert single token to list
     if isinstance(device_tokens, str):
         device_tokens = [device_tokens]
     
-    # Filter out empty tokens
-    device_tokens = [token for token in device_tokens if token]
+    # Filter out empty and duplicate tokens
+    device_tokens = list(dict.fromkeys(token for token in device_tokens if token))
     
     if not device_tokens:
         logger.warning("No valid device tokens provided")
         return {
             'success_count': 0,
             'failure_count': 0,
-            'failed_tokens': []
+            'failed_tokens': [],
+            'invalid_tokens': [],
+            'transport_failure_count': 0
         }
     
     # Prepare data payload
@@ -73,74 +246,85 @@ def send_push_notification(device_tokens, title, body, data=None, image_url=None
     # Convert all data values to strings (FCM requirement)
     data = {k: str(v) for k, v in data.items()}
     
+    message_kwargs = build_push_message_kwargs(title, body, data, image_url)
+    
     success_count = 0
     failure_count = 0
     failed_tokens = []
+    invalid_tokens = []
+    batch_error = None
+    batch_failure_count = 0
     
-    # Send notification to each token individually using v1 API
-    for token in device_tokens:
+    for chunk in _chunked(device_tokens, FCM_BATCH_SIZE):
+        multicast_message = messaging.MulticastMessage(tokens=chunk, **message_kwargs)
+        
         try:
-            # Prepare notification
-            notification = messaging.Notification(
-                title=title,
-                body=body,
-                image=image_url if image_url else None
-            )
-            
-            # Create message for single device (v1 API)
-            message = messaging.Message(
-                notification=notification,
-                data=data,
-                token=token,
-                android=messaging.AndroidConfig(
-                    priority='high',
-                    notification=messaging.AndroidNotification(
-                        sound='default',
-                        color='#4CAF50',
-                        channel_id='background_check_notifications'
-                    )
-                ),
-                apns=messaging.APNSConfig(
-                    payload=messaging.APNSPayload(
-                        aps=messaging.Aps(
-                            sound='default',
-                            badge=1,
-                            content_available=True
-                        )
-                    )
-                ),
-                webpush=messaging.WebpushConfig(
-                    notification=messaging.WebpushNotification(
-                        icon='/static/icons/notification-icon.png',
-                        badge='/static/icons/badge-icon.png'
-                    )
-                )
-            )
-            
-            # Send the message (v1 API)
-            response = messaging.send(message)
-            logger.info(f"Successfully sent notification: {response}")
-            success_count += 1
-            
+            batch_response = transport.send_each_for_multicast(multicast_message)
         except Exception as e:
-            logger.error(f"Failed to send notification to token {token[:50]}...: {str(e)}")
-            failure_count += 1
-            failed_tokens.append({
-                'token': token,
-                'error': str(e)
-            })
+            # The whole batch request failed; says nothing about the tokens themselves
+            logger.error(f"Failed to send notification batch of {len(chunk)} tokens: {str(e)}")
+            batch_error = e
+            batch_failure_count += len(chunk)
+            failure_count += len(chunk)
+            failed_tokens.extend({'token': token, 'error': str(e)} for token in chunk)
+            continue
+        
+        # Responses are returned in the same order as the tokens
+        for token, response in zip(chunk, batch_response.responses):
+            if response.success:
+                success_count += 1
+            else:
+                logger.error(f"Failed to send notification to token {token[:50]}...: {str(response.exception)}")
+                failure_count += 1
+                failed_tokens.append({
+                    'token': token,
+                    'error': str(response.exception)
+                })
+                if isinstance(response.exception, INVALID_TOKEN_ERRORS):
+                    invalid_tokens.append(token)
     
     # Log results
     logger.info(f"Push notification summary: {success_count} succeeded, {failure_count} failed")
     
-    return {
+    result = {
         'success_count': success_count,
         'failure_count': failure_count,
-        'failed_tokens': failed_tokens
+        'failed_tokens': failed_tokens,
+        'invalid_tokens': invalid_tokens,
+        'transport_failure_count': batch_failure_count
     }
+    
+    # A batch request failed at the transport level, let the caller retry
+    if raise_on_error and batch_error is not None:
+        raise PushTransportError(batch_error, result)
+    
+    return result
 
 
-def send_notification_to_user(user, title, body, notification_type='general', data=None, image_url=None):
+def _deactivate_invalid_tokens(result):
+    """Deactivate devices whose token FCM reported as unregistered or invalid"""
+    from .models import FCMDevice
+    
+    if result['invalid_tokens']:
+        FCMDevice.objects.filter(
+            registration_token__in=result['invalid_tokens']
+        ).update(active=False)
+        logger.info(f"Deactivated {len(result['invalid_tokens'])} invalid tokens")
+
+
+def _send_and_deactivate(device_tokens, title, body, data, image_url, raise_on_error):
+    try:
+        result = send_push_notification(device_tokens, title, body, data, image_url,
+                                        raise_on_error=raise_on_error)
+    except PushTransportError as e:
+        _deactivate_invalid_tokens(e.result)
+        raise
+    _deactivate_invalid_tokens(result)
+    return result
+
+
+def send_notification_to_user(user, title, body, notification_type='general', data=None, image_url=None,
+                              raise_on_error=False):
     """
     Send push notification to all active devices of a user
     
@@ -151,6 +335,7 @@ def send_notification_to_user(user, title, body, notification_type='general', da
         notification_type (str): Type of notification (for categorization)
         data (dict): Additional data payload
         image_url (str): Optional image URL
+        raise_on_error (bool): Raise PushTransportError when a batch request fails
     
     Returns:
         dict: Response with success/failure counts
@@ -177,21 +362,12 @@ def send_notification_to_user(user, title, body, notification_type='general', da
     data['notification_type'] = notification_type
     data['user_id'] = str(user.id)
     
-    # Send push notification
-    result = send_push_notification(device_tokens, title, body, data, image_url)
-    
-    # Deactivate failed tokens
-    if result['failed_tokens']:
-        failed_token_strings = [ft['token'] for ft in result['failed_tokens']]
-        FCMDevice.objects.filter(
-            registration_token__in=failed_token_strings
-        ).update(active=False)
-        logger.info(f"Deactivated {len(failed_token_strings)} invalid tokens")
-    
-    return result
+    # Send push notification; only tokens FCM rejects as invalid are deactivated
+    return _send_and_deactivate(device_tokens, title, body, data, image_url, raise_on_error)
 
 
-def send_notification_to_admins(title, body, notification_type='general', data=None, image_url=None):
+def send_notification_to_admins(title, body, notification_type='general', data=None, image_url=None,
+                                raise_on_error=False):
     """
     Send push notification to all admin users
     
@@ -201,6 +377,7 @@ def send_notification_to_admins(title, body, notification_type='general', data=N
         notification_type (str): Type of notification
         data (dict): Additional data payload
         image_url (str): Optional image URL
+        raise_on_error (bool): Raise PushTransportError when a batch request fails
     
     Returns:
         dict: Response with success/failure counts
@@ -240,17 +417,8 @@ def send_notification_to_admins(title, body, notification_type='general', data=N
     data['notification_type'] = notification_type
     data['recipient'] = 'admins'
     
-    # Send push notification
-    result = send_push_notification(device_tokens, title, body, data, image_url)
-    
-    # Deactivate failed tokens
-    if result['failed_tokens']:
-        failed_token_strings = [ft['token'] for ft in result['failed_tokens']]
-        FCMDevice.objects.filter(
-            registration_token__in=failed_token_strings
-        ).update(active=False)
-    
-    return result
+    # Send push notification; only tokens FCM rejects as invalid are deactivated
+    return _send_and_deactivate(device_tokens, title, body, data, image_url, raise_on_error)
 
 
 def send_topic_notification(topic, title, body, data=None, image_url=None):
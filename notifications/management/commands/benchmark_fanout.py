@@ -0,0 +1,94 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from notifications.fanout import notify_admins
+from notifications.models import Notification
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compare query counts of the per-admin notification loop against bulk fan-out (changes are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[10, 100, 1000],
+            help='Admin counts to benchmark (default: 10 100 1000)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("=" * 70)
+        self.stdout.write(self.style.SUCCESS("📣 Admin Notification Fan-out Benchmark"))
+        self.stdout.write("=" * 70)
+        self.stdout.write(f"{'Admins':>8} | {'Loop queries':>12} | {'Loop ms':>9} | {'Bulk queries':>12} | {'Bulk ms':>9}")
+        self.stdout.write("-" * 70)
+
+        for size in options['sizes']:
+            with transaction.atomic():
+                self._create_admins(size)
+                loop_queries, loop_ms = self._measure(self._per_admin_loop)
+                bulk_queries, bulk_ms = self._measure(self._bulk_fan_out)
+                transaction.set_rollback(True)
+
+            self.stdout.write(
+                f"{size:>8} | {loop_queries:>12} | {loop_ms:>9.1f} | {bulk_queries:>12} | {bulk_ms:>9.1f}"
+            )
+
+        self.stdout.write("=" * 70)
+
+    def _create_admins(self, size):
+        # Only benchmark users exist inside the rolled-back transaction
+        User.objects.filter(is_staff=True).update(is_staff=False)
+        stamp = timezone.now().strftime('%H%M%S%f')
+        User.objects.bulk_create([
+            User(
+                username=f'bench_admin_{stamp}_{i}',
+                email=f'bench_admin_{stamp}_{i}@example.com',
+                is_staff=True,
+                is_active=True,
+            )
+            for i in range(size)
+        ])
+
+    def _measure(self, func):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            func()
+            elapsed = (time.perf_counter() - start) * 1000
+        return len(ctx.captured_queries), elapsed
+
+    def _per_admin_loop(self):
+        """Previous implementation: INSERT per admin, then save() per row to set push status"""
+        notifications = []
+        for admin in User.objects.filter(is_staff=True, is_active=True):
+            notifications.append(Notification.objects.create(
+                recipient=admin,
+                type=Notification.USER_TO_ADMIN,
+                category=Notification.BACKGROUND_CHECK,
+                title='Benchmark',
+                message='Benchmark notification',
+                push_sent=False
+            ))
+        for notification in notifications:
+            notification.push_sent = True
+            notification.push_sent_at = timezone.now()
+            notification.save()
+
+    def _bulk_fan_out(self):
+        notifications = notify_admins(
+            'Benchmark',
+            'Benchmark notification',
+            category=Notification.BACKGROUND_CHECK,
+        )
+        # Push status update as performed by the outbox worker
+        Notification.objects.filter(id__in=[n.id for n in notifications]).update(
+            push_sent=True, push_sent_at=timezone.now()
+        )
@@ -0,0 +1,106 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.request import Request as APIRequest
+from rest_framework.test import APIRequestFactory
+
+from background_check.pagination import KeysetPagination
+from notifications.models import Notification
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compare OFFSET page-number pagination against keyset pagination on a large notification table (rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=1_000_000,
+            help='Notifications to create for the benchmark user (default: 1000000)',
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=20,
+            help='Rows per page (default: 20)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows per INSERT while seeding (default: 5000)',
+        )
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        page_size = options['page_size']
+
+        self.stdout.write("=" * 70)
+        self.stdout.write(self.style.SUCCESS("📄 Notification Pagination Benchmark"))
+        self.stdout.write("=" * 70)
+
+        with transaction.atomic():
+            user = self._seed(rows, options['batch_size'])
+            queryset = Notification.objects.filter(recipient=user)
+
+            self.stdout.write(f"{'Page':>8} | {'Offset queries':>14} | {'Offset ms':>10} | {'Keyset queries':>14} | {'Keyset ms':>10}")
+            self.stdout.write("-" * 70)
+
+            last_page = max((rows + page_size - 1) // page_size, 1)
+            for page in sorted({1, 10, 100, 1000, last_page // 2, last_page}):
+                if page > last_page:
+                    continue
+                offset_queries, offset_ms = self._measure(queryset, {'page': page}, page_size)
+                keyset_queries, keyset_ms = self._measure(
+                    queryset, self._keyset_params(queryset, (page - 1) * page_size), page_size
+                )
+                self.stdout.write(
+                    f"{page:>8} | {offset_queries:>14} | {offset_ms:>10.1f} | {keyset_queries:>14} | {keyset_ms:>10.1f}"
+                )
+
+            transaction.set_rollback(True)
+
+        self.stdout.write("=" * 70)
+
+    def _seed(self, rows, batch_size):
+        stamp = timezone.now().strftime('%H%M%S%f')
+        user = User.objects.create(username=f'bench_reader_{stamp}', email=f'bench_reader_{stamp}@example.com')
+
+        start = time.perf_counter()
+        for i in range(0, rows, batch_size):
+            Notification.objects.bulk_create([
+                Notification(recipient=user, title=f'Benchmark {n}', message='Benchmark notification')
+                for n in range(i, min(i + batch_size, rows))
+            ])
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {Notification._meta.db_table}')
+
+        self.stdout.write(f"Seeded {rows} notifications in {time.perf_counter() - start:.1f}s\n")
+        return user
+
+    def _keyset_params(self, queryset, offset):
+        params = {'pagination': 'cursor'}
+        if offset:
+            # Position of the last row on the previous page, as carried by its 'next' link
+            created_at, pk = queryset.order_by(*KeysetPagination.ordering).values_list('created_at', 'id')[offset - 1]
+            params['cursor'] = KeysetPagination.encode_cursor(created_at, pk)
+        return params
+
+    def _measure(self, queryset, params, page_size):
+        request = APIRequest(APIRequestFactory().get('/api/notifications/notifications/', params))
+        paginator = KeysetPagination()
+        # Set on the paginator so both modes use the same size (offset mode ignores ?page_size=)
+        paginator.page_size = page_size
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            page = paginator.paginate_queryset(queryset.order_by('-created_at'), request)
+            list(page)
+            elapsed = (time.perf_counter() - start) * 1000
+        return len(ctx.captured_queries), elapsed
@@ -0,0 +1,88 @@
+import time
+
+from django.core.management.base import BaseCommand
+from firebase_admin import messaging
+
+from notifications.firebase_service import (
+    FakeFCMTransport,
+    build_push_message_kwargs,
+    send_push_notification,
+)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark batched multicast push sending against the per-token loop using a fake FCM transport'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tokens',
+            type=int,
+            default=1000,
+            help='Number of device tokens to send to (default: 1000)',
+        )
+        parser.add_argument(
+            '--latency-ms',
+            type=float,
+            default=5.0,
+            help='Simulated FCM round trip latency in milliseconds (default: 5)',
+        )
+        parser.add_argument(
+            '--failure-rate',
+            type=float,
+            default=0.01,
+            help='Fraction of tokens the fake transport rejects (default: 0.01)',
+        )
+
+    def handle(self, *args, **options):
+        token_count = options['tokens']
+        latency = options['latency_ms'] / 1000.0
+        tokens = [f'fake-token-{i}' for i in range(token_count)]
+        failure_every = int(1 / options['failure_rate']) if options['failure_rate'] > 0 else 0
+        failing = tokens[::failure_every] if failure_every else []
+
+        self.stdout.write("=" * 70)
+        self.stdout.write(self.style.SUCCESS("📱 Push Notification Throughput Benchmark"))
+        self.stdout.write("=" * 70)
+        self.stdout.write(f"Tokens: {token_count}  |  Latency: {options['latency_ms']}ms  |  Failing: {len(failing)}")
+
+        # Per-token loop (previous implementation)
+        transport = FakeFCMTransport(latency=latency, failing_tokens=failing)
+        start = time.perf_counter()
+        loop_result = self._send_per_token(transport, tokens)
+        loop_elapsed = time.perf_counter() - start
+        self._report("Per-token loop", loop_result, transport.calls, loop_elapsed, token_count)
+
+        # Batched multicast
+        transport = FakeFCMTransport(latency=latency, failing_tokens=failing)
+        start = time.perf_counter()
+        batch_result = send_push_notification(
+            tokens, 'Benchmark', 'Benchmark notification', transport=transport
+        )
+        batch_elapsed = time.perf_counter() - start
+        self._report("Batched multicast", batch_result, transport.calls, batch_elapsed, token_count)
+
+        if batch_elapsed > 0:
+            self.stdout.write("-" * 70)
+            self.stdout.write(self.style.SUCCESS(f"Speedup: {loop_elapsed / batch_elapsed:.1f}x"))
+        self.stdout.write("=" * 70)
+
+    def _send_per_token(self, transport, tokens):
+        data = {'timestamp': str(time.time())}
+        message_kwargs = build_push_message_kwargs('Benchmark', 'Benchmark notification', data)
+        result = {'success_count': 0, 'failure_count': 0, 'failed_tokens': []}
+        for token in tokens:
+            try:
+                transport.send(messaging.Message(token=token, **message_kwargs))
+                result['success_count'] += 1
+            except Exception as e:
+                result['failure_count'] += 1
+                result['failed_tokens'].append({'token': token, 'error': str(e)})
+        return result
+
+    def _report(self, label, result, calls, elapsed, token_count):
+        rate = token_count / elapsed if elapsed > 0 else float('inf')
+        self.stdout.write("-" * 70)
+        self.stdout.write(label)
+        self.stdout.write(f"   HTTP calls: {calls}")
+        self.stdout.write(f"   Succeeded: {result['success_count']}  Failed: {result['failure_count']}")
+        self.stdout.write(f"   Elapsed: {elapsed * 1000:.1f}ms  ({rate:.0f} tokens/s)")
@@ -0,0 +1,72 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications.outbox import DEFAULT_MAX_ATTEMPTS, process_batch
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued push notifications from the outbox (runs until interrupted unless --once is given)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the outbox once and exit',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Number of outbox entries claimed per batch (default: 50)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=4,
+            help='Number of pushes delivered in parallel (default: 4)',
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=DEFAULT_MAX_ATTEMPTS,
+            help=f'Attempts before an entry is marked as failed (default: {DEFAULT_MAX_ATTEMPTS})',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to sleep when the outbox is empty (default: 1)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS("📱 Push outbox worker started"))
+
+        totals = {'sent': 0, 'retried': 0, 'failed': 0, 'lost': 0}
+        try:
+            while True:
+                stats = process_batch(
+                    batch_size=options['batch_size'],
+                    concurrency=options['concurrency'],
+                    max_attempts=options['max_attempts'],
+                )
+                for key in totals:
+                    totals[key] += stats[key]
+
+                if stats['claimed']:
+                    self.stdout.write(
+                        f"Processed {stats['claimed']} entries: {stats['sent']} sent, "
+                        f"{stats['retried']} retried, {stats['failed']} failed, {stats['lost']} lost"
+                    )
+                    continue
+
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("\nStopping push outbox worker")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {totals['sent']} sent, {totals['retried']} retried, {totals['failed']} failed, "
+            f"{totals['lost']} lost"
+        ))
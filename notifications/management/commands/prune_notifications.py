@@ -0,0 +1,113 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from notifications.retention import get_retention_policy, prune_notifications
+
+
+def _parse_rules(values, option):
+    rules = {}
+    for value in values or []:
+        key, sep, days = value.partition('=')
+        if not sep:
+            raise CommandError(f"{option} expects NAME=DAYS, got '{value}'")
+        try:
+            rules[key] = None if days.lower() in ('none', 'forever') else int(days)
+        except ValueError:
+            raise CommandError(f"{option} expects NAME=DAYS, got '{value}'")
+    return rules
+
+
+class Command(BaseCommand):
+    help = 'Delete or archive notifications older than their retention period (NOTIFICATION_RETENTION)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Override the default retention in days',
+        )
+        parser.add_argument(
+            '--category',
+            action='append',
+            metavar='CATEGORY=DAYS',
+            help="Retention for a category, e.g. --category report=365 (use 'none' to keep forever)",
+        )
+        parser.add_argument(
+            '--type',
+            action='append',
+            metavar='TYPE=DAYS',
+            help='Retention for a notification type, e.g. --type system=30',
+        )
+        parser.add_argument(
+            '--archive',
+            action='store_true',
+            help='Copy rows to the notification archive table before deleting them',
+        )
+        parser.add_argument(
+            '--export',
+            action='store_true',
+            help='Write removed rows to a gzip JSONL file under NOTIFICATION_EXPORT_DIR',
+        )
+        parser.add_argument(
+            '--export-dir',
+            help='Directory for --export (default: NOTIFICATION_EXPORT_DIR, never a public media path)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows removed per transaction (default: 1000)',
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0,
+            help='Seconds to sleep between batches (default: 0)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count expired notifications',
+        )
+
+    def handle(self, *args, **options):
+        overrides = {
+            'categories': _parse_rules(options['category'], '--category'),
+            'types': _parse_rules(options['type'], '--type'),
+        }
+        if options['days'] is not None:
+            overrides['default'] = options['days']
+        policy = get_retention_policy(overrides)
+
+        export_dir = None
+        if options['export'] or options['export_dir']:
+            export_dir = options['export_dir'] or settings.NOTIFICATION_EXPORT_DIR
+
+        self.stdout.write("=" * 70)
+        self.stdout.write(self.style.SUCCESS("🧹 Pruning notifications"))
+        self.stdout.write("=" * 70)
+        describe = lambda days: 'kept forever' if days is None else f'{days} days'
+        self.stdout.write(f"Default retention: {describe(policy['default'])}")
+        for category, days in policy['categories'].items():
+            self.stdout.write(f"  category {category}: {describe(days)}")
+        for notification_type, days in policy['types'].items():
+            self.stdout.write(f"  type {notification_type}: {describe(days)}")
+
+        stats = prune_notifications(
+            policy=policy,
+            batch_size=options['batch_size'],
+            archive=options['archive'],
+            export_dir=export_dir,
+            dry_run=options['dry_run'],
+            pause=options['pause'],
+        )
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"Dry run: {stats['matched']} notifications would be removed"))
+            return
+
+        self.stdout.write(f"Deleted:  {stats['deleted']}")
+        self.stdout.write(f"Archived: {stats['archived']}")
+        if stats['export_path']:
+            self.stdout.write(f"Exported: {stats['export_path']}")
+        self.stdout.write(self.style.SUCCESS("✅ Done"))
@@ -126,13 +126,52 @@ class Notification(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['recipient', 'is_read', '-created_at']),
+            # Keyset pagination of a recipient's full list on (created_at, id)
+            models.Index(fields=['recipient', '-created_at', '-id']),
             models.Index(fields=['type', '-created_at']),
             models.Index(fields=['category', '-created_at']),
         ]
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Remember the read state as loaded so the unread counter can be kept in sync
+        self._loaded_is_read = self.__dict__.get('is_read')
+    
     def __str__(self):
         return f"{self.get_type_display()}: {self.title} - {self.recipient.username}"
     
+    def save(self, *args, **kwargs):
+        """Save and keep the recipient's unread counter in sync"""
+        from .counters import adjust_unread_counts
+        
+        creating = self._state.adding
+        was_read = self._loaded_is_read
+        update_fields = kwargs.get('update_fields')
+        
+        super().save(*args, **kwargs)
+        
+        if update_fields is not None and 'is_read' not in update_fields:
+            return
+        if creating:
+            delta = 0 if self.is_read else 1
+        elif was_read is None or was_read == self.is_read:
+            delta = 0
+        else:
+            delta = -1 if self.is_read else 1
+        self._loaded_is_read = self.is_read
+        
+        if delta:
+            adjust_unread_counts({self.recipient_id: delta})
+    
+    def delete(self, *args, **kwargs):
+        from .counters import adjust_unread_counts
+        
+        was_unread = not self.is_read
+        result = super().delete(*args, **kwargs)
+        if was_unread:
+            adjust_unread_counts({self.recipient_id: -1})
+        return result
+    
     def mark_as_read(self):
         """Mark this notification as read"""
         if not self.is_read:
@@ -146,3 +185,118 @@ class Notification(models.Model):
             self.is_read = False
             self.read_at = None
             self.save(update_fields=['is_read', 'read_at', 'updated_at'])
+
+
+class NotificationCounter(models.Model):
+    """
+    Denormalized unread notification count per recipient
+
+    Maintained on write so badge polls read one row instead of counting.
+    Rows are created lazily on the first read or write and can be rebuilt
+    with the ``reconcile_unread_counts`` command.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='notification_counter'
+    )
+    unread_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user_id}: {self.unread_count} unread"
+
+
+class NotificationArchive(models.Model):
+    """
+    Cold copy of notifications moved out by ``prune_notifications --archive``
+
+    Kept out of the Notification table so its hot indexes stay small.
+    """
+    original_id = models.BigIntegerField(unique=True)
+    recipient_id = models.BigIntegerField(db_index=True)
+    sender_id = models.BigIntegerField(null=True, blank=True)
+    type = models.CharField(max_length=20)
+    category = models.CharField(max_length=20)
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    is_read = models.BooleanField(default=False)
+    read_at = models.DateTimeField(null=True, blank=True)
+    related_object_type = models.CharField(max_length=50, blank=True, null=True)
+    related_object_id = models.IntegerField(blank=True, null=True)
+    action_url = models.CharField(max_length=500, blank=True, null=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Archived {self.original_id}: {self.title}"
+
+
+class PushOutbox(models.Model):
+    """
+    Durable queue of pending push notifications
+
+    Rows are written in the same transaction as the Notification rows they
+    belong to and are delivered by the ``process_push_outbox`` worker.
+    """
+    # Delivery targets
+    TARGET_USER = 'user'
+    TARGET_ADMINS = 'admins'
+
+    TARGET_CHOICES = [
+        (TARGET_USER, 'User'),
+        (TARGET_ADMINS, 'Admins'),
+    ]
+
+    # Delivery statuses
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (PROCESSING, 'Processing'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    target = models.CharField(max_length=10, choices=TARGET_CHOICES, default=TARGET_USER)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='push_outbox',
+        help_text='Recipient for user pushes (null for admin broadcasts)'
+    )
+    title = models.CharField(max_length=255)
+    body = models.TextField()
+    notification_type = models.CharField(max_length=50, default='general')
+    data = models.JSONField(default=dict, blank=True)
+    notification_ids = models.JSONField(
+        default=list,
+        blank=True,
+        help_text='Notification rows whose push status is updated on delivery'
+    )
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, null=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_target_display()} push: {self.title} ({self.status})"
@@ -0,0 +1,270 @@
+"""
+Push Notification Outbox
+Queues push notifications in the database and delivers them outside the request cycle
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import logging
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import Notification, PushOutbox
+
+logger = logging.getLogger(__name__)
+
+# Retry policy
+DEFAULT_MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 60 * 60
+
+# Rows stuck in processing longer than this are assumed to belong to a dead worker
+STALE_LOCK_SECONDS = 5 * 60
+
+
+class LostClaim(Exception):
+    """The entry was reclaimed by another worker before this one finished"""
+
+
+def enqueue_user_push(user, title, body, notification_type='general', data=None, notifications=None):
+    """
+    Queue a push notification for all active devices of a user
+
+    Call inside the transaction that creates the related Notification rows so
+    both are committed (or rolled back) together.
+
+    Args:
+        user: User instance
+        title (str): Notification title
+        body (str): Notification body
+        notification_type (str): Type of notification (for categorization)
+        data (dict): Additional data payload
+        notifications (list): Notification instances to mark as pushed on delivery
+
+    Returns:
+        PushOutbox: The queued entry
+    """
+    return PushOutbox.objects.create(
+        target=PushOutbox.TARGET_USER,
+        user=user,
+        title=title,
+        body=body,
+        notification_type=notification_type,
+        data=_clean_data(data),
+        notification_ids=[n.id for n in notifications or []],
+    )
+
+
+def enqueue_admin_push(title, body, notification_type='general', data=None, notifications=None):
+    """
+    Queue a push notification for all admin devices
+
+    Args:
+        title (str): Notification title
+        body (str): Notification body
+        notification_type (str): Type of notification
+        data (dict): Additional data payload
+        notifications (list): Notification instances to mark as pushed on delivery
+
+    Returns:
+        PushOutbox: The queued entry
+    """
+    return PushOutbox.objects.create(
+        target=PushOutbox.TARGET_ADMINS,
+        title=title,
+        body=body,
+        notification_type=notification_type,
+        data=_clean_data(data),
+        notification_ids=[n.id for n in notifications or []],
+    )
+
+
+def _clean_data(data):
+    """Drop empty values and stringify the rest (FCM requirement)"""
+    return {k: str(v) for k, v in (data or {}).items() if v is not None}
+
+
+def claim_batch(batch_size=50):
+    """
+    Lock and return the next batch of due outbox entries
+
+    Entries are moved to PROCESSING inside a short transaction so concurrent
+    workers never pick up the same row. The returned entries carry the
+    ``locked_at`` value written by this claim, which identifies the claim
+    when the outcome is recorded.
+    """
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=STALE_LOCK_SECONDS)
+
+    with transaction.atomic():
+        # Release entries abandoned by a crashed worker
+        PushOutbox.objects.filter(
+            status=PushOutbox.PROCESSING,
+            locked_at__lt=stale_before
+        ).update(status=PushOutbox.PENDING, locked_at=None)
+
+        entries = list(
+            PushOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status=PushOutbox.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if entries:
+            PushOutbox.objects.filter(
+                id__in=[entry.id for entry in entries]
+            ).update(status=PushOutbox.PROCESSING, locked_at=now)
+            for entry in entries:
+                entry.status = PushOutbox.PROCESSING
+                entry.locked_at = now
+
+    return entries
+
+
+def _update_claimed(entry, **fields):
+    """
+    Update an entry only while this worker's claim still holds
+
+    A worker slower than STALE_LOCK_SECONDS has its rows released and
+    claimed again; its late outcome must not overwrite the new claim.
+
+    Raises:
+        LostClaim: If the entry is no longer locked by this claim
+    """
+    updated = PushOutbox.objects.filter(
+        pk=entry.pk, status=PushOutbox.PROCESSING, locked_at=entry.locked_at
+    ).update(**fields)
+    if not updated:
+        raise LostClaim(f"Push outbox entry {entry.pk} was reclaimed by another worker")
+
+
+def deliver(entry):
+    """
+    Send a single outbox entry through FCM
+
+    Returns:
+        dict: Result from the firebase service
+    """
+    from .firebase_service import send_notification_to_user, send_notification_to_admins
+
+    data = dict(entry.data)
+    if entry.target == PushOutbox.TARGET_ADMINS:
+        return send_notification_to_admins(
+            entry.title, entry.body,
+            notification_type=entry.notification_type,
+            data=data,
+            raise_on_error=True
+        )
+    return send_notification_to_user(
+        entry.user, entry.title, entry.body,
+        notification_type=entry.notification_type,
+        data=data,
+        raise_on_error=True
+    )
+
+
+def _deliver_safely(entry):
+    """Run deliver() and return a (result, error) pair"""
+    try:
+        return deliver(entry), None
+    except Exception as e:
+        return None, e
+
+
+def _deliver_in_thread(entry):
+    """Run deliver() in a worker thread, closing its DB connection afterwards"""
+    try:
+        return _deliver_safely(entry)
+    finally:
+        connections.close_all()
+
+
+def _mark_sent(entry, result):
+    now = timezone.now()
+    _update_claimed(
+        entry,
+        status=PushOutbox.SENT,
+        attempts=entry.attempts + 1,
+        sent_at=now,
+        locked_at=None,
+        last_error=None,
+    )
+    if not entry.notification_ids:
+        return
+
+    if result.get('success_count', 0) > 0:
+        Notification.objects.filter(id__in=entry.notification_ids).update(
+            push_sent=True, push_sent_at=now, push_error=None
+        )
+    elif result.get('failed_tokens'):
+        Notification.objects.filter(id__in=entry.notification_ids).update(
+            push_error=result['failed_tokens'][0]['error']
+        )
+
+
+def _mark_failed(entry, error, max_attempts):
+    attempts = entry.attempts + 1
+    if attempts >= max_attempts:
+        status = PushOutbox.FAILED
+        next_attempt_at = entry.next_attempt_at
+    else:
+        status = PushOutbox.PENDING
+        delay = min(BACKOFF_BASE_SECONDS * (2 ** (attempts - 1)), BACKOFF_MAX_SECONDS)
+        next_attempt_at = timezone.now() + timedelta(seconds=delay)
+
+    _update_claimed(
+        entry,
+        status=status,
+        attempts=attempts,
+        next_attempt_at=next_attempt_at,
+        locked_at=None,
+        last_error=str(error),
+    )
+    if status == PushOutbox.FAILED and entry.notification_ids:
+        Notification.objects.filter(id__in=entry.notification_ids).update(push_error=str(error))
+
+
+def process_batch(batch_size=50, concurrency=4, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Claim and deliver one batch of outbox entries
+
+    Args:
+        batch_size (int): Maximum number of entries to claim
+        concurrency (int): Number of deliveries sent in parallel
+        max_attempts (int): Attempts before an entry is marked as failed
+
+    Returns:
+        dict: Counts of sent, retried and failed entries, and of entries
+        whose claim was lost to another worker before the outcome was saved
+    """
+    entries = claim_batch(batch_size)
+    stats = {'claimed': len(entries), 'sent': 0, 'retried': 0, 'failed': 0, 'lost': 0}
+    if not entries:
+        return stats
+
+    if concurrency > 1 and len(entries) > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(_deliver_in_thread, entries))
+    else:
+        outcomes = [_deliver_safely(entry) for entry in entries]
+
+    for entry, (result, error) in zip(entries, outcomes):
+        try:
+            if error is None:
+                _mark_sent(entry, result)
+                stats['sent'] += 1
+            else:
+                logger.error(f"Push outbox entry {entry.id} failed (attempt {entry.attempts + 1}): {str(error)}")
+                _mark_failed(entry, error, max_attempts)
+                if entry.attempts + 1 >= max_attempts:
+                    stats['failed'] += 1
+                else:
+                    stats['retried'] += 1
+        except LostClaim as e:
+            # The current owner records the outcome of its own attempt
+            logger.warning(str(e))
+            stats['lost'] += 1
+
+    logger.info(
+        f"Push outbox batch: {stats['sent']} sent, {stats['retried']} retried, "
+        f"{stats['failed']} failed, {stats['lost']} lost"
+    )
+    return stats
@@ -0,0 +1,184 @@
+"""
+Notification Retention
+Deletes or archives old notifications in small keyset batches
+"""
+from datetime import timedelta
+import gzip
+import json
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .counters import delete_notifications
+from .models import Notification, NotificationArchive
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETENTION = {
+    'default': 180,
+    'categories': {},
+    'types': {},
+}
+
+ARCHIVE_FIELDS = [
+    'id', 'recipient_id', 'sender_id', 'type', 'category', 'title', 'message', 'is_read',
+    'read_at', 'related_object_type', 'related_object_id', 'action_url', 'created_at',
+]
+
+
+def get_retention_policy(overrides=None):
+    """
+    Merge the NOTIFICATION_RETENTION setting with command-line overrides
+
+    Days of ``None`` keep notifications forever. A type rule wins over a
+    category rule, which wins over the default.
+
+    Args:
+        overrides (dict): Same shape as the setting; values replace the configured ones
+
+    Returns:
+        dict: {'default': days, 'categories': {...}, 'types': {...}}
+    """
+    configured = getattr(settings, 'NOTIFICATION_RETENTION', {})
+    policy = {
+        'default': configured.get('default', DEFAULT_RETENTION['default']),
+        'categories': dict(configured.get('categories', {})),
+        'types': dict(configured.get('types', {})),
+    }
+    for key, value in (overrides or {}).items():
+        if key == 'default':
+            policy['default'] = value
+        else:
+            policy[key].update(value)
+    return policy
+
+
+def expired_filter(policy, now=None):
+    """
+    Build one Q matching every notification past its retention period
+
+    Returns:
+        Q: Filter for expired notifications, or None if nothing expires
+    """
+    now = now or timezone.now()
+    categories = [value for value, _ in Notification.CATEGORY_CHOICES]
+    types = [value for value, _ in Notification.TYPE_CHOICES]
+
+    def days_for(category, notification_type):
+        if notification_type in policy['types']:
+            return policy['types'][notification_type]
+        if category in policy['categories']:
+            return policy['categories'][category]
+        return policy['default']
+
+    conditions = []
+    for category in categories:
+        for notification_type in types:
+            days = days_for(category, notification_type)
+            if days is not None:
+                conditions.append(Q(
+                    category=category,
+                    type=notification_type,
+                    created_at__lt=now - timedelta(days=days)
+                ))
+
+    # Rows with values outside the choices fall back to the default
+    if policy['default'] is not None:
+        conditions.append(
+            ~(Q(category__in=categories) & Q(type__in=types)) &
+            Q(created_at__lt=now - timedelta(days=policy['default']))
+        )
+
+    if not conditions:
+        return None
+    expired = conditions[0]
+    for condition in conditions[1:]:
+        expired |= condition
+    return expired
+
+
+def _export(rows, path):
+    with gzip.open(path, 'at', encoding='utf-8') as fh:
+        for row in rows:
+            fh.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+
+
+def prune_notifications(policy=None, batch_size=1000, archive=False, export_dir=None,
+                        dry_run=False, pause=0):
+    """
+    Remove expired notifications in batches walked by primary key
+
+    Each batch is its own short transaction: select up to ``batch_size`` IDs
+    above the last one seen, optionally copy the rows out, delete them by ID and
+    fix the unread counters of their recipients.
+
+    Args:
+        policy (dict): Retention policy (see get_retention_policy)
+        batch_size (int): Rows per batch
+        archive (bool): Copy rows to NotificationArchive before deleting
+        export_dir (str): Directory for a gzip JSONL export of removed rows
+        dry_run (bool): Only count what would be removed
+        pause (float): Seconds to sleep between batches
+
+    Returns:
+        dict: Counts of matched, deleted and archived rows, and the export path
+    """
+    policy = policy or get_retention_policy()
+    expired = expired_filter(policy)
+    stats = {'matched': 0, 'deleted': 0, 'archived': 0, 'export_path': None}
+    if expired is None:
+        return stats
+
+    queryset = Notification.objects.filter(expired).order_by('id')
+    if dry_run:
+        stats['matched'] = queryset.count()
+        return stats
+
+    export_path = None
+    if export_dir:
+        os.makedirs(export_dir, exist_ok=True)
+        export_path = os.path.join(
+            export_dir, f"notifications-{timezone.now().strftime('%Y%m%d-%H%M%S')}.jsonl.gz"
+        )
+        stats['export_path'] = export_path
+
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.filter(id__gt=last_id).values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            last_id = ids[-1]
+            batch = Notification.objects.filter(id__in=ids)
+
+            if archive or export_path:
+                rows = list(batch.values(*ARCHIVE_FIELDS))
+                if archive:
+                    NotificationArchive.objects.bulk_create(
+                        [NotificationArchive(original_id=row['id'], **{
+                            field: row[field] for field in ARCHIVE_FIELDS if field != 'id'
+                        }) for row in rows],
+                        ignore_conflicts=True
+                    )
+                    stats['archived'] += len(rows)
+                if export_path:
+                    _export(rows, export_path)
+
+            deleted = delete_notifications(batch)
+
+        stats['matched'] += len(ids)
+        stats['deleted'] += deleted
+        if pause:
+            time.sleep(pause)
+
+    logger.info(
+        f"Pruned notifications: {stats['deleted']} deleted, {stats['archived']} archived"
+        + (f", exported to {export_path}" if export_path else "")
+    )
+    return stats
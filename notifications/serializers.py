@@ -163,7 +163,19 @@ class BulkNotificationCreateSerializer(serializers.Serializer):
         return attrs
 
 
-class NotificationMarkReadSerializer(serializers.Serializer):
+class NotificationWatermarkSerializer(serializers.Serializer):
+    """Optional watermark limiting bulk read/unread updates to notifications already seen"""
+    before_id = serializers.IntegerField(
+        required=False,
+        help_text='Only update notifications with this ID or lower'
+    )
+    before_timestamp = serializers.DateTimeField(
+        required=False,
+        help_text='Only update notifications created at or before this time'
+    )
+
+
+class NotificationMarkReadSerializer(NotificationWatermarkSerializer):
     """Serializer for marking notifications as read/unread"""
     notification_ids = serializers.ListField(
         child=serializers.IntegerField(),
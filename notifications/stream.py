@@ -0,0 +1,233 @@
+"""
+Notification Stream Broker
+Fans newly created notifications out to Server-Sent Events subscribers
+"""
+import json
+import logging
+import select
+import threading
+
+from django.conf import settings
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# Postgres channel used to announce new notification IDs across processes
+PG_CHANNEL = 'notification_stream'
+
+# Keep pg_notify payloads well below the 8000 byte limit
+PG_IDS_PER_NOTIFY = 500
+
+TICKET_SALT = 'notifications.stream_ticket'
+
+
+def _ticket_ttl():
+    return getattr(settings, 'NOTIFICATION_STREAM_TICKET_TTL', 60)
+
+
+def issue_stream_ticket(user):
+    """
+    Sign a short-lived ticket that opens the user's notification stream
+
+    EventSource cannot send an Authorization header, so the stream URL
+    carries this ticket instead of the access token: it only opens the
+    stream and expires quickly, so a copy in an access log is harmless.
+
+    Returns:
+        tuple: (ticket, seconds it stays valid)
+    """
+    return signing.TimestampSigner(salt=TICKET_SALT).sign(str(user.pk)), _ticket_ttl()
+
+
+def read_stream_ticket(ticket):
+    """
+    Check a stream ticket
+
+    Returns:
+        int: User ID, or None when the ticket is invalid or expired
+    """
+    try:
+        return int(signing.TimestampSigner(salt=TICKET_SALT).unsign(ticket, max_age=_ticket_ttl()))
+    except (signing.BadSignature, ValueError):
+        return None
+
+
+class NotificationHub:
+    """
+    Registry of stream subscribers in this process
+
+    Each subscriber is an asyncio queue bound to its event loop, keyed by the
+    recipient's user ID. Delivery loads the new rows once per batch, only for
+    recipients that are connected, no matter how many devices they have open.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, user_id, loop, queue):
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add((loop, queue))
+
+    def unsubscribe(self, user_id, loop, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers:
+                subscribers.discard((loop, queue))
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def subscribed_user_ids(self):
+        with self._lock:
+            return set(self._subscribers)
+
+    def deliver(self, notification_ids):
+        """Load the given notifications for connected recipients and queue them"""
+        from .models import Notification
+        from .serializers import NotificationSerializer
+
+        user_ids = self.subscribed_user_ids()
+        if not user_ids or not notification_ids:
+            return
+
+        notifications = Notification.objects.filter(
+            id__in=notification_ids,
+            recipient_id__in=user_ids
+        ).select_related('sender', 'recipient')
+
+        for notification in notifications:
+            self.send(notification.recipient_id, 'notification', {
+                'notification': NotificationSerializer(notification).data,
+                'unread_delta': 0 if notification.is_read else 1,
+            })
+
+    def send(self, user_id, event, data):
+        """Queue an event for every open stream of a user"""
+        payload = json.dumps(data, cls=DjangoJSONEncoder)
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, (event, payload))
+            except RuntimeError:
+                # Event loop already closed, the stream is going away
+                pass
+
+
+class InProcessBroker:
+    """Deliver notifications to subscribers in the publishing process after commit"""
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def publish(self, notification_ids):
+        if not self.hub.subscribed_user_ids():
+            return
+        ids = list(notification_ids)
+        transaction.on_commit(lambda: self.hub.deliver(ids))
+
+    def start(self):
+        pass
+
+
+class PostgresBroker:
+    """
+    Announce new notifications with pg_notify and listen in a background thread
+
+    NOTIFY is sent after the creating transaction commits, so subscribers
+    only hear about committed rows, the writer's transaction never waits on
+    it, and every web/ASGI process receives events published by any other
+    process.
+    """
+
+    def __init__(self, hub):
+        self.hub = hub
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def publish(self, notification_ids):
+        ids = list(notification_ids)
+        transaction.on_commit(lambda: self._notify(ids))
+
+    def _notify(self, ids):
+        try:
+            with connection.cursor() as cursor:
+                for i in range(0, len(ids), PG_IDS_PER_NOTIFY):
+                    cursor.execute(
+                        'SELECT pg_notify(%s, %s)',
+                        [PG_CHANNEL, json.dumps({'ids': ids[i:i + PG_IDS_PER_NOTIFY]})]
+                    )
+        except Exception as e:
+            # Runs after commit: the notifications exist, only the live update is lost
+            logger.error(f"Failed to publish notifications to stream: {str(e)}")
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._listen, name='notification-stream-listener', daemon=True)
+                self._thread.start()
+
+    def _listen(self):
+        pg_connection = connection.get_new_connection(connection.get_connection_params())
+        pg_connection.autocommit = True
+        try:
+            with pg_connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {PG_CHANNEL}')
+            logger.info("Notification stream listening on Postgres channel '%s'", PG_CHANNEL)
+
+            while True:
+                if select.select([pg_connection], [], [], 30) == ([], [], []):
+                    continue
+                pg_connection.poll()
+                ids = []
+                while pg_connection.notifies:
+                    notify = pg_connection.notifies.pop(0)
+                    try:
+                        ids.extend(json.loads(notify.payload)['ids'])
+                    except (ValueError, KeyError):
+                        logger.warning(f"Ignoring malformed notification stream payload: {notify.payload[:100]}")
+                if ids:
+                    close_old_connections()
+                    self.hub.deliver(ids)
+        except Exception as e:
+            logger.error(f"Notification stream listener stopped: {str(e)}")
+        finally:
+            pg_connection.close()
+
+
+hub = NotificationHub()
+_broker = None
+
+
+def get_broker():
+    """
+    Return the configured broker
+
+    ``NOTIFICATION_STREAM_BROKER`` may be 'postgres' or 'inprocess'; by default
+    Postgres LISTEN/NOTIFY is used whenever the database is PostgreSQL.
+    """
+    global _broker
+    if _broker is None:
+        name = getattr(settings, 'NOTIFICATION_STREAM_BROKER', None)
+        if not name:
+            name = 'postgres' if connection.vendor == 'postgresql' else 'inprocess'
+        _broker = PostgresBroker(hub) if name == 'postgres' else InProcessBroker(hub)
+    return _broker
+
+
+def publish_notifications(notification_ids):
+    """
+    Announce newly created notifications to stream subscribers
+
+    Call inside the transaction that created the rows; delivery happens
+    once it commits.
+    """
+    if not notification_ids:
+        return
+    try:
+        get_broker().publish(notification_ids)
+    except Exception as e:
+        # Streaming is best effort and must never break notification creation
+        logger.error(f"Failed to publish notifications to stream: {str(e)}")
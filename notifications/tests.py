@@ -1,3 +1,469 @@
-from django.test import TestCase
+import asyncio
+from datetime import timedelta
+import gzip
+import json
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, IntegrityError
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from authentication.models import User
+from background_requests.models import Request, Report
+
+from . import firebase_service, outbox
+from .counters import delete_notifications, get_unread_count, mark_read, reconcile_unread_counts
+from .events import emit, REQUEST_CREATED, STATUS_CHANGED, REPORT_READY
+from .fanout import bulk_notify
+from .models import Notification, NotificationArchive, NotificationCounter, PushOutbox, FCMDevice
+from .outbox import process_batch
+from .retention import get_retention_policy, prune_notifications
+from .stream import InProcessBroker, NotificationHub, hub, issue_stream_ticket, read_stream_ticket
+
+
+class NotificationEventTests(TestCase):
+    """One DB write batch and one push batch per notification event"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='client', email='client@example.com', password='pass')
+        cls.admins = [
+            User.objects.create_user(
+                username=f'admin{i}', email=f'admin{i}@example.com', password='pass', is_staff=True
+            )
+            for i in range(3)
+        ]
+        FCMDevice.objects.create(user=cls.user, registration_token='client-token')
+        for admin in cls.admins:
+            FCMDevice.objects.create(user=admin, registration_token=f'{admin.username}-token')
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.transport = firebase_service.FakeFCMTransport()
+        previous = firebase_service.set_transport(self.transport)
+        self.addCleanup(firebase_service.set_transport, previous)
+
+    def create_request(self):
+        return Request.objects.create(
+            user=self.user, name='John Doe', dob='1990-01-01',
+            city='Austin', state='TX', email='john@example.com', phone_number='5550100'
+        )
+
+    def drain_outbox(self):
+        process_batch(concurrency=1)
+
+    def assertInserts(self, queries, model, count):
+        """Assert how many INSERT statements hit a model's table"""
+        prefix = f'INSERT INTO {connection.ops.quote_name(model._meta.db_table)}'
+        inserts = [query for query in queries.captured_queries if query['sql'].startswith(prefix)]
+        self.assertEqual(len(inserts), count, [query['sql'][:200] for query in inserts])
+
+    def test_request_created_queries(self):
+        bg_request = self.create_request()
+        Notification.objects.all().delete()
+        PushOutbox.objects.all().delete()
+
+        # One INSERT per table however many admins are notified
+        with CaptureQueriesContext(connection) as queries:
+            emit(REQUEST_CREATED, request=bg_request)
+
+        self.assertInserts(queries, Notification, 1)
+        self.assertInserts(queries, PushOutbox, 1)
+        self.assertEqual(Notification.objects.count(), 1 + len(self.admins))
+        self.assertEqual(PushOutbox.objects.count(), 2)
+
+    def test_status_changed_queries(self):
+        bg_request = self.create_request()
+
+        with CaptureQueriesContext(connection) as queries:
+            emit(STATUS_CHANGED, request=bg_request, old_status=Request.PENDING, new_status=Request.IN_PROGRESS)
+
+        self.assertInserts(queries, Notification, 1)
+        self.assertInserts(queries, PushOutbox, 1)
+
+    def test_request_created_pushes_once(self):
+        bg_request = self.create_request()
+
+        self.assertEqual(Notification.objects.filter(recipient=self.user).count(), 1)
+        self.assertEqual(Notification.objects.filter(recipient__is_staff=True).count(), len(self.admins))
+        self.assertEqual(PushOutbox.objects.count(), 2)
+
+        self.drain_outbox()
+
+        # One multicast for the user, one for all admin devices
+        self.assertEqual(self.transport.calls, 2)
+        self.assertEqual(self.transport.messages_sent, 1 + len(self.admins))
+        self.assertFalse(
+            Notification.objects.filter(related_object_id=bg_request.id, push_sent=False).exists()
+        )
+
+    def test_status_change_pushes_once(self):
+        bg_request = self.create_request()
+        self.drain_outbox()
+        Notification.objects.all().delete()
+        calls = self.transport.calls
+
+        bg_request.status = Request.IN_PROGRESS
+        bg_request.save()
+        # Saving again without a status change does not notify
+        bg_request.save()
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.recipient, self.user)
+        self.assertEqual(notification.title, 'Background Check Status: In Progress')
+
+        self.drain_outbox()
+        self.assertEqual(self.transport.calls - calls, 1)
+
+    def test_report_ready_pushes_once(self):
+        bg_request = self.create_request()
+        self.drain_outbox()
+        Notification.objects.all().delete()
+        calls = self.transport.calls
+
+        with override_settings(MEDIA_ROOT=self.media_root):
+            report = Report.objects.create(
+                request=bg_request,
+                pdf=SimpleUploadedFile('report.pdf', b'%PDF-1.4 test', content_type='application/pdf')
+            )
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.category, Notification.REPORT)
+        self.assertEqual(notification.related_object_id, report.id)
+
+        self.drain_outbox()
+        self.assertEqual(self.transport.calls - calls, 1)
+
+
+    def test_slow_worker_loses_reclaimed_entries(self):
+        self.create_request()
+        reclaimed = []
+
+        def stall_then_deliver(entry):
+            # Another worker treats this worker's locks as stale and claims the rows again
+            if not reclaimed:
+                stale = timezone.now() - timedelta(seconds=outbox.STALE_LOCK_SECONDS + 1)
+                PushOutbox.objects.update(locked_at=stale)
+                reclaimed.extend(outbox.claim_batch())
+            raise RuntimeError('timed out')
+
+        with mock.patch.object(outbox, 'deliver', side_effect=stall_then_deliver):
+            stats = process_batch(concurrency=1)
+
+        self.assertEqual(stats['lost'], 2)
+        self.assertEqual(stats['retried'], 0)
+        # The new owner's claim is untouched
+        for entry in reclaimed:
+            row = PushOutbox.objects.get(pk=entry.pk)
+            self.assertEqual(row.status, PushOutbox.PROCESSING)
+            self.assertEqual(row.locked_at, entry.locked_at)
+            self.assertEqual(row.attempts, 0)
+
+
+class PushDeliveryTests(TestCase):
+    """Only tokens FCM rejects are deactivated; failed requests are retried instead"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='client', email='client@example.com', password='pass')
+        cls.good = FCMDevice.objects.create(user=cls.user, registration_token='good-token')
+        cls.gone = FCMDevice.objects.create(user=cls.user, registration_token='gone-token')
+
+    def use_transport(self, transport):
+        self.addCleanup(firebase_service.set_transport, firebase_service.set_transport(transport))
+        return transport
+
+    def assertActive(self, *expected):
+        self.assertEqual(
+            set(FCMDevice.objects.filter(active=True).values_list('registration_token', flat=True)), set(expected)
+        )
+
+    def test_unregistered_token_deactivated(self):
+        self.use_transport(firebase_service.FakeFCMTransport(failing_tokens=['gone-token']))
+        result = firebase_service.send_notification_to_user(self.user, 'Title', 'Body')
+        self.assertEqual(result['invalid_tokens'], ['gone-token'])
+        self.assertActive('good-token')
+
+    def test_transport_failure_keeps_tokens(self):
+        self.use_transport(firebase_service.FakeFCMTransport(transport_error=ConnectionError('timed out')))
+        result = firebase_service.send_notification_to_user(self.user, 'Title', 'Body')
+        self.assertEqual(result['transport_failure_count'], 2)
+        self.assertActive('good-token', 'gone-token')
+
+        with self.assertRaises(firebase_service.PushTransportError):
+            firebase_service.send_notification_to_user(self.user, 'Title', 'Body', raise_on_error=True)
+        self.assertActive('good-token', 'gone-token')
+
+    def test_any_failed_chunk_raises(self):
+        transport = self.use_transport(firebase_service.FakeFCMTransport(failing_tokens=['gone-token']))
+        send = transport.send_each_for_multicast
+
+        def fail_second_chunk(message):
+            if transport.calls == 1:
+                transport.calls += 1
+                raise ConnectionError('reset')
+            return send(message)
+
+        transport.send_each_for_multicast = fail_second_chunk
+        with mock.patch.object(firebase_service, 'FCM_BATCH_SIZE', 1), \
+                self.assertRaises(firebase_service.PushTransportError) as raised:
+            firebase_service.send_notification_to_user(self.user, 'Title', 'Body', raise_on_error=True)
+        self.assertEqual(raised.exception.result['transport_failure_count'], 1)
+
+
+class UnreadCounterTests(TestCase):
+    """Cached unread counts follow every write path"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', email='reader@example.com', password='pass')
+
+    def test_counter_follows_writes(self):
+        self.assertEqual(get_unread_count(self.user), 0)
+
+        first = Notification.objects.create(recipient=self.user, title='One', message='One')
+        bulk_notify([self.user.id], 'Two', 'Two')
+        self.assertEqual(get_unread_count(self.user), 2)
+
+        first.mark_as_read()
+        self.assertEqual(get_unread_count(self.user), 1)
+        first.mark_as_unread()
+        self.assertEqual(get_unread_count(self.user), 2)
+
+        first.delete()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_unread_count(self.user), 1)
+
+    def test_first_write_creates_counter(self):
+        Notification.objects.bulk_create([
+            Notification(recipient=self.user, title=f'Old {i}', message='Old') for i in range(3)
+        ])
+        bulk_notify([self.user.id], 'New', 'New')
+        self.assertEqual(NotificationCounter.objects.get(user=self.user).unread_count, 4)
+
+    def test_counter_created_by_reader_meanwhile(self):
+        bulk_create = NotificationCounter.objects.bulk_create
+
+        def reader_wins(counters):
+            # A reader counted before this write and inserted the row first
+            bulk_create([NotificationCounter(user_id=c.user_id, unread_count=c.unread_count - 1) for c in counters])
+            raise IntegrityError('duplicate key')
+
+        with mock.patch.object(NotificationCounter.objects, 'bulk_create', side_effect=reader_wins):
+            bulk_notify([self.user.id], 'New', 'New')
+        self.assertEqual(get_unread_count(self.user), 1)
+
+    def test_bulk_delete_helper_keeps_counter(self):
+        bulk_notify([self.user.id], 'One', 'One')
+        bulk_notify([self.user.id], 'Two', 'Two')
+        self.assertEqual(delete_notifications(Notification.objects.filter(title='One')), 1)
+        self.assertEqual(get_unread_count(self.user), 1)
+        self.assertEqual(reconcile_unread_counts([self.user.id])['corrected'], 0)
+
+    def test_reconcile_fixes_drift(self):
+        Notification.objects.create(recipient=self.user, title='One', message='One')
+        get_unread_count(self.user)
+        NotificationCounter.objects.filter(user=self.user).update(unread_count=7)
+
+        stats = reconcile_unread_counts()
+
+        self.assertEqual(stats['corrected'], 1)
+        self.assertEqual(get_unread_count(self.user), 1)
+
+
+class MarkReadTests(TestCase):
+    """Read/unread endpoints update all matching rows in one statement"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='bulkreader', email='bulkreader@example.com', password='pass')
+        cls.notifications = []
+        for i in range(20):
+            cls.notifications += bulk_notify([cls.user.id], f'Title {i}', 'Message')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_mark_all_read_with_watermark(self):
+        watermark = self.notifications[9].id
+
+        response = self.client.post(
+            '/api/notifications/notifications/mark-all-read/', {'before_id': watermark}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 10)
+        self.assertEqual(Notification.objects.filter(recipient=self.user, is_read=False).count(), 10)
+        self.assertEqual(get_unread_count(self.user), 10)
+
+    def test_mark_read_is_set_based(self):
+        get_unread_count(self.user)
+        queryset = Notification.objects.filter(recipient=self.user)
+
+        # savepoint, grouped SELECT, UPDATE, counter UPDATE, release
+        with self.assertNumQueries(5):
+            self.assertEqual(mark_read(queryset), 20)
+        self.assertEqual(get_unread_count(self.user), 0)
+
+        response = self.client.post(
+            '/api/notifications/notifications/mark-read/',
+            {'notification_ids': [n.id for n in self.notifications[:5]], 'is_read': False},
+            format='json'
+        )
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(get_unread_count(self.user), 5)
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor mode walks every notification exactly once, newest first"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='scroller', email='scroller@example.com', password='pass')
+        bulk_notify([cls.user.id], 'First', 'First')
+        # Share one timestamp so the id tiebreak is exercised
+        notifications = [Notification(recipient=cls.user, title=f'Title {i}', message='Message') for i in range(24)]
+        Notification.objects.bulk_create(notifications)
+        Notification.objects.filter(recipient=cls.user).exclude(title='First').update(created_at=timezone.now())
+
+    def test_walks_all_pages(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        seen = []
+        url = '/api/notifications/notifications/?pagination=cursor&page_size=10'
+        while url:
+            with self.assertNumQueries(1):
+                response = client.get(url)
+            self.assertNotIn('count', response.data)
+            seen += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+
+        expected = list(
+            Notification.objects.filter(recipient=self.user).order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_page_number_mode_unchanged(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.get('/api/notifications/notifications/')
+        self.assertEqual(response.data['count'], 25)
+
+        # page_size is only honoured in cursor mode
+        response = client.get('/api/notifications/notifications/?page_size=5')
+        self.assertEqual(len(response.data['results']), 20)
+
+    def test_ordering_falls_back_to_page_numbers(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.get('/api/notifications/notifications/?pagination=cursor&ordering=created_at')
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(response.data['results'][0]['title'], 'First')
+
+
+class NotificationStreamTests(TestCase):
+    """Live notifications reach subscribed streams after commit, framed as SSE"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='listener', email='listener@example.com', password='pass')
+        cls.other = User.objects.create_user(username='other', email='other@example.com', password='pass')
+
+    def test_broker_delivers_after_commit_to_subscribers_only(self):
+        stream_hub = NotificationHub()
+        broker = InProcessBroker(stream_hub)
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        queue = asyncio.Queue()
+        stream_hub.subscribe(self.user.id, loop, queue)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            notifications = bulk_notify([self.user.id, self.other.id], 'Title', 'Body')
+            broker.publish([n.id for n in notifications])
+        self.assertTrue(queue.empty())
+        for callback in callbacks:
+            callback()
+
+        event, payload = loop.run_until_complete(asyncio.wait_for(queue.get(), 1))
+        self.assertEqual(event, 'notification')
+        self.assertEqual(json.loads(payload)['notification']['recipient'], self.user.id)
+        loop.run_until_complete(asyncio.sleep(0))
+        self.assertTrue(queue.empty())
+
+    def test_ticket_round_trip_and_expiry(self):
+        ticket, ttl = issue_stream_ticket(self.user)
+        self.assertEqual(read_stream_ticket(ticket), self.user.id)
+        self.assertIsNone(read_stream_ticket(ticket + 'x'))
+        with override_settings(NOTIFICATION_STREAM_TICKET_TTL=-1):
+            self.assertIsNone(read_stream_ticket(ticket))
+
+    def test_ticket_endpoint_requires_auth(self):
+        client = APIClient()
+        self.assertEqual(client.post('/api/notifications/stream/ticket/').status_code, 401)
+        client.force_authenticate(self.user)
+        response = client.post('/api/notifications/stream/ticket/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(read_stream_ticket(response.data['ticket']), self.user.id)
+        self.assertIn(f"ticket={response.data['ticket']}", response.data['stream_url'])
+
+    async def test_stream_rejects_missing_or_bad_credentials(self):
+        response = await self.async_client.get('/api/notifications/stream/')
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get('/api/notifications/stream/', {'ticket': 'forged'})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_stream_frames_events_and_keep_alives(self):
+        ticket, _ = issue_stream_ticket(self.user)
+        with mock.patch('notifications.views.STREAM_KEEPALIVE_SECONDS', 0.05):
+            response = await self.async_client.get('/api/notifications/stream/', {'ticket': ticket})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            chunks = aiter(response.streaming_content)
+
+            self.assertEqual(await anext(chunks), b'event: unread_count\ndata: {"unread_count": 0}\n\n')
+            hub.send(self.user.id, 'notification', {'id': 1})
+            self.assertEqual(await anext(chunks), b'event: notification\ndata: {"id": 1}\n\n')
+            self.assertEqual(await anext(chunks), b': keep-alive\n\n')
+            await chunks.aclose()
+
+
+class RetentionTests(TestCase):
+    """Expired notifications are removed in batches, per-category rules apply"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='keeper', email='keeper@example.com', password='pass')
+        bulk_notify([cls.user.id], 'Fresh', 'Fresh')
+        old = bulk_notify([cls.user.id], 'Old general', 'Old')
+        old += bulk_notify([cls.user.id], 'Old report', 'Old', category=Notification.REPORT)
+        old += bulk_notify([cls.user.id], 'Old payment', 'Old', category=Notification.PAYMENT)
+        Notification.objects.filter(id__in=[n.id for n in old]).update(
+            created_at=timezone.now() - timedelta(days=200)
+        )
+
+    def test_prune_archives_and_exports(self):
+        get_unread_count(self.user)
+        export_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, export_dir, ignore_errors=True)
+
+        policy = get_retention_policy({'default': 90, 'categories': {'report': 365, 'payment': 30}})
+        stats = prune_notifications(policy=policy, batch_size=1, archive=True, export_dir=export_dir)
+
+        self.assertEqual(stats['deleted'], 2)
+        self.assertEqual(
+            set(Notification.objects.values_list('title', flat=True)), {'Fresh', 'Old report'}
+        )
+        self.assertEqual(NotificationArchive.objects.count(), 2)
+        self.assertEqual(get_unread_count(self.user), 2)
+        with gzip.open(stats['export_path'], 'rt') as fh:
+            self.assertEqual(len(fh.readlines()), 2)
@@ -8,7 +8,9 @@ from .views import (
     test_register_device,
     test_send_notification,
     test_view_notifications,
-    test_mark_read
+    test_mark_read,
+    notification_stream,
+    NotificationStreamTicketView
 )
 
 # Import admin notification views
@@ -30,6 +32,10 @@ urlpatterns = [
     path('admin/<int:notification_id>/mark-read/', AdminNotificationMarkReadView.as_view(), name='admin_notification_mark_read'),
     path('admin/mark-all-read/', AdminNotificationMarkAllReadView.as_view(), name='admin_notification_mark_all_read'),
     
+    # Live notification stream (Server-Sent Events, served by ASGI)
+    path('stream/', notification_stream, name='notification_stream'),
+    path('stream/ticket/', NotificationStreamTicketView.as_view(), name='notification_stream_ticket'),
+    
     # Simple view pages (MTV pattern) - Put these BEFORE router urls to avoid conflicts
     path('all/', all_notifications_view, name='all_notifications'),
     path('test/', test_notifications_view, name='test_notifications'),
@@ -8,12 +8,17 @@ from django.utils import timezone
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
+from background_check.pagination import KeysetPagination
+
 from .models import Notification, FCMDevice
+from .counters import get_unread_count, mark_read, mark_unread
+from .fanout import bulk_notify
 from .serializers import (
     NotificationSerializer,
     NotificationCreateSerializer,
     BulkNotificationCreateSerializer,
     NotificationMarkReadSerializer,
+    NotificationWatermarkSerializer,
     FCMDeviceSerializer
 )
 
@@ -34,6 +39,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
     """
     permission_classes = [IsAuthenticated]
     serializer_class = NotificationSerializer
+    pagination_class = KeysetPagination
     filterset_fields = ['type', 'category', 'is_read']
     search_fields = ['title', 'message']
     ordering_fields = ['created_at', 'is_read']
@@ -84,6 +90,8 @@ class NotificationViewSet(viewsets.ModelViewSet):
             return BulkNotificationCreateSerializer
         elif self.action == 'mark_as_read':
             return NotificationMarkReadSerializer
+        elif self.action == 'mark_all_read':
+            return NotificationWatermarkSerializer
         return NotificationSerializer
     
     @swagger_auto_schema(
@@ -162,15 +170,12 @@ class NotificationViewSet(viewsets.ModelViewSet):
         
         recipient_ids = serializer.validated_data.pop('recipient_ids')
         
-        # Create notifications for all recipients
-        notifications = []
-        for recipient_id in recipient_ids:
-            notification = Notification.objects.create(
-                recipient_id=recipient_id,
-                sender=request.user,
-                **serializer.validated_data
-            )
-            notifications.append(notification)
+        # Create notifications for all recipients in bulk
+        notifications = bulk_notify(
+            recipient_ids,
+            sender=request.user,
+            **serializer.validated_data
+        )
         
         return Response({
             'message': f'Successfully created {len(notifications)} notifications',
@@ -264,6 +269,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
         Mark one or more notifications as read/unread
         
         If notification_ids is not provided, marks all user's notifications.
+        before_id/before_timestamp limit the update to notifications already seen.
         """
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -278,17 +284,13 @@ class NotificationViewSet(viewsets.ModelViewSet):
         if notification_ids:
             queryset = queryset.filter(id__in=notification_ids)
         
-        # Update notifications
-        if is_read:
-            count = 0
-            for notification in queryset.filter(is_read=False):
-                notification.mark_as_read()
-                count += 1
-        else:
-            count = 0
-            for notification in queryset.filter(is_read=True):
-                notification.mark_as_unread()
-                count += 1
+        # Update notifications with a single UPDATE
+        set_state = mark_read if is_read else mark_unread
+        count = set_state(
+            queryset,
+            before_id=serializer.validated_data.get('before_id'),
+            before_timestamp=serializer.validated_data.get('before_timestamp')
+        )
         
         action_text = 'read' if is_read else 'unread'
         return Response({
@@ -313,11 +315,12 @@ class NotificationViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], url_path='unread-count')
     def unread_count(self, request):
         """Get count of unread notifications for the current user"""
-        count = self.get_queryset().filter(is_read=False).count()
+        count = get_unread_count(request.user)
         return Response({'unread_count': count}, status=status.HTTP_200_OK)
     
     @swagger_auto_schema(
-        operation_description="Mark all notifications as read",
+        operation_description="Mark all notifications as read, optionally only up to a before_id/before_timestamp watermark",
+        request_body=NotificationWatermarkSerializer,
         responses={
             200: openapi.Response(
                 description="All notifications marked as read",
@@ -334,10 +337,14 @@ class NotificationViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'], url_path='mark-all-read')
     def mark_all_read(self, request):
         """Mark all notifications as read for the current user"""
-        count = 0
-        for notification in self.get_queryset().filter(is_read=False):
-            notification.mark_as_read()
-            count += 1
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        count = mark_read(
+            self.get_queryset(),
+            before_id=serializer.validated_data.get('before_id'),
+            before_timestamp=serializer.validated_data.get('before_timestamp')
+        )
         
         return Response({
             'message': f'Successfully marked {count} notifications as read',
@@ -362,6 +369,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['delete'], url_path='clear-read')
     def clear_read(self, request):
         """Delete all read notifications for the current user"""
+        # Only read rows are removed, so the cached unread count is unaffected
         queryset = self.get_queryset().filter(is_read=True)
         count = queryset.count()
         queryset.delete()
@@ -458,6 +466,121 @@ class FCMDeviceViewSet(viewsets.ModelViewSet):
         }, status=status.HTTP_200_OK)
 
 
+# ==================== Live Stream (Server-Sent Events) ====================
+import asyncio
+import json
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from .stream import get_broker, hub, issue_stream_ticket, read_stream_ticket
+
+# Seconds between keep-alive comments so proxies don't close idle streams
+STREAM_KEEPALIVE_SECONDS = 15
+
+
+class NotificationStreamTicketView(APIView):
+    """
+    Issue a short-lived ticket for opening the notification stream
+
+    Browsers' EventSource cannot send the Authorization header; open
+    ``stream_url`` (which carries the ticket) instead of putting the access
+    token in the query string, where it would end up in access logs.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Get a ticket for /api/notifications/stream/ (valid for expires_in seconds)",
+        responses={200: 'ticket, expires_in and stream_url'}
+    )
+    def post(self, request):
+        ticket, ttl = issue_stream_ticket(request.user)
+        return Response({
+            'ticket': ticket,
+            'expires_in': ttl,
+            'stream_url': f"{reverse('notifications:notification_stream')}?ticket={ticket}",
+        })
+
+
+async def _authenticate_stream(request):
+    """
+    Resolve the stream user from the session, the Authorization header or a
+    ``?ticket=`` from NotificationStreamTicketView (EventSource cannot send
+    custom headers)
+    """
+    user = await request.auser()
+    if user.is_authenticated:
+        return user
+
+    if request.META.get('HTTP_AUTHORIZATION'):
+        jwt_auth = JWTAuthentication()
+        try:
+            result = await sync_to_async(jwt_auth.authenticate)(request)
+        except (InvalidToken, TokenError, AuthenticationFailed):
+            return None
+        return result[0] if result else None
+
+    user_id = read_stream_ticket(request.GET.get('ticket', ''))
+    if user_id is None:
+        return None
+    return await User.objects.filter(pk=user_id, is_active=True).afirst()
+
+
+def _format_sse(event, payload):
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+async def notification_stream(request):
+    """
+    Stream new notifications and unread-count deltas to the current user
+
+    Emits an ``unread_count`` event on connect, then a ``notification`` event
+    for every notification created for the user. Must be served by the ASGI
+    application (background_check.asgi).
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    if not hasattr(request, 'scope'):
+        return JsonResponse(
+            {'error': 'Notification stream requires the ASGI server (background_check.asgi:application)'},
+            status=501
+        )
+
+    user = await _authenticate_stream(request)
+    if user is None:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    unread_count = await sync_to_async(get_unread_count)(user)
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    hub.subscribe(user.id, loop, queue)
+    await sync_to_async(get_broker().start)()
+
+    async def event_stream():
+        try:
+            yield _format_sse('unread_count', json.dumps({'unread_count': unread_count}))
+            while True:
+                try:
+                    event, payload = await asyncio.wait_for(queue.get(), timeout=STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield _format_sse(event, payload)
+        finally:
+            hub.unsubscribe(user.id, loop, queue)
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 # ==================== Test Views (MTV Pattern) ====================
 from django.shortcuts import render, redirect
 from django.contrib import messages
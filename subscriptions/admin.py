@@ -3,13 +3,17 @@ from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.db import models
+from django.utils import timezone
 from .models import (
     SubscriptionPlan, 
     UserSubscription, 
     PaymentHistory, 
     SubscriptionFeature, 
-    PlanFeature
+    PlanFeature,
+    StripeEvent,
+    CreditLedgerEntry
 )
+from . import credits
 
 
 class PlanFeatureInline(admin.TabularInline):
@@ -71,11 +75,10 @@ class SubscriptionPlanAdmin(admin.ModelAdmin):
     subscriber_count.short_description = "Subscribers"
     
     def revenue_generated(self, obj):
-        """Calculate total revenue from this plan"""
-        total_revenue = PaymentHistory.objects.filter(
-            plan=obj,
-            status='succeeded'
-        ).aggregate(total=models.Sum('amount'))['total'] or 0
+        """Total revenue from this plan (DailyMetrics rollup, as on the analytics screens)"""
+        from admin_dashboard.metrics import revenue_by_plan
+        
+        total_revenue = revenue_by_plan([obj.id]).get(obj.id) or 0
         return format_html("$<span>{}</span>", f"{total_revenue:.2f}")
     revenue_generated.short_description = "Total Revenue"
     
@@ -130,9 +133,11 @@ class UserSubscriptionAdmin(admin.ModelAdmin):
         'user__username', 'user__email', 'user__first_name', 'user__last_name',
         'plan__name', 'stripe_customer_id'
     ]
+    # Credit counters only change through the actions, which record them in the ledger
     readonly_fields = [
         'created_at', 'updated_at', 'can_make_request_display',
-        'total_payments'
+        'total_payments', 'free_trial_used', 'free_trial_date',
+        'total_reports_purchased', 'total_reports_used'
     ]
     date_hierarchy = 'created_at'
     ordering = ['-created_at']
@@ -219,27 +224,23 @@ class UserSubscriptionAdmin(admin.ModelAdmin):
     
     def reset_usage(self, request, queryset):
         """Reset usage counter for selected subscriptions"""
-        count = 0
-        for subscription in queryset:
-            subscription.total_reports_used = 0
-            subscription.save()
-            count += 1
+        count = credits.reset_usage(queryset, created_by=request.user)
         self.message_user(request, f"Reset usage for {count} subscriptions.")
     reset_usage.short_description = "Reset usage counter"
     
     def reset_free_trial(self, request, queryset):
         """Reset free trial for selected subscriptions"""
-        count = queryset.update(free_trial_used=False, free_trial_date=None)
+        count = credits.reset_free_trial(queryset, created_by=request.user)
         self.message_user(request, f"Reset free trial for {count} subscriptions.")
     reset_free_trial.short_description = "Reset free trial"
     
     def add_report_credits(self, request, queryset):
         """Add 1 report credit to selected subscriptions"""
         count = 0
-        for subscription in queryset:
-            subscription.total_reports_purchased += 1
-            subscription.save()
-            count += 1
+        for user_id in queryset.values_list('user_id', flat=True):
+            count += credits.add_report_credits(
+                user_id, 1, entry_type=CreditLedgerEntry.ADMIN_GRANT, created_by=request.user, note='Admin action'
+            )
         self.message_user(request, f"Added 1 report credit to {count} subscriptions.")
     add_report_credits.short_description = "Add 1 report credit"
 
@@ -341,6 +342,47 @@ class PlanFeatureAdmin(admin.ModelAdmin):
     feature_active.short_description = "Feature Status"
 
 
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    """Admin interface for the Stripe webhook inbox"""
+    list_display = ['event_id', 'type', 'customer_id', 'status', 'attempts', 'stripe_created_at', 'processed_at']
+    list_filter = ['status', 'type', 'received_at']
+    search_fields = ['event_id', 'customer_id']
+    readonly_fields = ['received_at', 'processed_at', 'locked_at', 'last_error']
+    ordering = ['-stripe_created_at']
+    
+    actions = ['retry_now']
+    
+    def retry_now(self, request, queryset):
+        """Requeue failed or pending events for immediate processing"""
+        count = queryset.exclude(status=StripeEvent.PROCESSED).update(
+            status=StripeEvent.PENDING,
+            next_attempt_at=timezone.now(),
+            locked_at=None
+        )
+        self.message_user(request, f'{count} Stripe event(s) requeued.')
+    retry_now.short_description = 'Retry selected now'
+
+
+@admin.register(CreditLedgerEntry)
+class CreditLedgerEntryAdmin(admin.ModelAdmin):
+    """Read-only view of the report credit ledger"""
+    list_display = ['id', 'user', 'entry_type', 'purchased_delta', 'used_delta', 'trial_delta', 'payment', 'created_by', 'created_at']
+    list_filter = ['entry_type', 'created_at']
+    search_fields = ['user__username', 'user__email', 'note']
+    raw_id_fields = ['user', 'payment', 'created_by']
+    ordering = ['-id']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 # Add custom admin site title and header
 admin.site.site_header = "Background Check - Subscription Management"
 admin.site.site_title = "Subscription Admin"
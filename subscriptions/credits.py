@@ -0,0 +1,265 @@
+"""
+Report Credits
+Lock-free credit accounting: every change is one conditional UPDATE with F() expressions,
+recorded in the append-only credit ledger in the same transaction
+"""
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import CreditLedgerEntry, UserSubscription
+
+# consume_report_credit() results
+FREE_TRIAL = 'free_trial'
+PURCHASED = 'purchased'
+
+# Subscription columns compared against the ledger totals
+SNAPSHOT_FIELDS = ['id', 'user_id', 'total_reports_purchased', 'total_reports_used', 'free_trial_used']
+
+
+def _user_id(user):
+    return getattr(user, 'pk', user)
+
+
+def _apply(user, condition, changes, **entry):
+    """
+    Run one conditional UPDATE and record it in the ledger if it matched
+
+    Returns:
+        bool: True if the subscription was updated
+    """
+    user_id = _user_id(user)
+    # No savepoint: callers never catch errors in here, the outer transaction rolls back as a whole
+    with transaction.atomic(savepoint=False):
+        updated = UserSubscription.objects.filter(user_id=user_id, **condition).update(
+            updated_at=timezone.now(), **changes
+        )
+        if updated:
+            CreditLedgerEntry.objects.create(user_id=user_id, **entry)
+    return bool(updated)
+
+
+def use_free_trial(user):
+    """
+    Claim the user's one free trial search
+
+    Returns:
+        bool: True if this call claimed it, False if it was already used
+    """
+    return _apply(
+        user,
+        {'free_trial_used': False},
+        {'free_trial_used': True, 'free_trial_date': timezone.now()},
+        entry_type=CreditLedgerEntry.FREE_TRIAL,
+        trial_delta=1,
+    )
+
+
+def use_purchased_credit(user):
+    """
+    Consume one purchased report
+
+    The UPDATE only matches while total_reports_purchased - total_reports_used > 0,
+    so concurrent consumers can never overdraw the balance.
+
+    Returns:
+        bool: True if a report was consumed
+    """
+    return _apply(
+        user,
+        {'total_reports_purchased__gt': F('total_reports_used')},
+        {'total_reports_used': F('total_reports_used') + 1},
+        entry_type=CreditLedgerEntry.CONSUMPTION,
+        used_delta=1,
+    )
+
+
+def consume_report_credit(user):
+    """
+    Pay for one report: the free trial first, then a purchased report
+
+    Args:
+        user: User instance or user ID
+
+    Returns:
+        str: FREE_TRIAL or PURCHASED, or None when the user has nothing left
+    """
+    with transaction.atomic(savepoint=False):
+        if use_free_trial(user):
+            return FREE_TRIAL
+        if use_purchased_credit(user):
+            return PURCHASED
+    return None
+
+
+def add_report_credits(user, quantity, entry_type=CreditLedgerEntry.PURCHASE, payment=None, created_by=None, note=''):
+    """
+    Add reports to a user's balance
+
+    Args:
+        user: User instance or user ID
+        quantity (int): Reports to add
+        entry_type (str): Ledger entry type (PURCHASE or ADMIN_GRANT)
+        payment: PaymentHistory the reports were bought with
+        created_by: Admin granting the reports
+        note (str): Ledger note
+
+    Returns:
+        bool: True if the user has a subscription to add them to
+    """
+    return _apply(
+        user,
+        {},
+        {'total_reports_purchased': F('total_reports_purchased') + quantity},
+        entry_type=entry_type,
+        purchased_delta=quantity,
+        payment=payment,
+        created_by=created_by,
+        note=note,
+    )
+
+
+def refund_report_credits(user, quantity, payment=None, note=''):
+    """
+    Take refunded reports back out of the balance
+
+    Only unused reports can be taken back, so the balance never goes negative.
+
+    Returns:
+        int: Number of reports removed
+    """
+    with transaction.atomic():
+        subscription = UserSubscription.objects.select_for_update().filter(user_id=_user_id(user)).first()
+        if subscription is None:
+            return 0
+        removed = min(quantity, subscription.available_reports)
+        if removed > 0:
+            _apply(
+                user,
+                {},
+                {'total_reports_purchased': F('total_reports_purchased') - removed},
+                entry_type=CreditLedgerEntry.REFUND,
+                purchased_delta=-removed,
+                payment=payment,
+                note=note,
+            )
+    return removed
+
+
+def reset_usage(subscriptions, created_by=None):
+    """
+    Set total_reports_used back to zero (admin action)
+
+    Returns:
+        int: Number of subscriptions changed
+    """
+    changed = 0
+    with transaction.atomic():
+        for subscription in subscriptions.select_for_update().filter(total_reports_used__gt=0):
+            _apply(
+                subscription.user_id,
+                {},
+                {'total_reports_used': 0},
+                entry_type=CreditLedgerEntry.ADMIN_ADJUSTMENT,
+                used_delta=-subscription.total_reports_used,
+                created_by=created_by,
+                note='Usage reset',
+            )
+            changed += 1
+    return changed
+
+
+def reset_free_trial(subscriptions, created_by=None):
+    """
+    Give users their free trial back (admin action)
+
+    Returns:
+        int: Number of subscriptions changed
+    """
+    changed = 0
+    with transaction.atomic():
+        for user_id in subscriptions.filter(free_trial_used=True).values_list('user_id', flat=True):
+            changed += _apply(
+                user_id,
+                {'free_trial_used': True},
+                {'free_trial_used': False, 'free_trial_date': None},
+                entry_type=CreditLedgerEntry.ADMIN_ADJUSTMENT,
+                trial_delta=-1,
+                created_by=created_by,
+                note='Free trial reset',
+            )
+    return changed
+
+
+def _ledger_differences(snapshots):
+    """Map user ID to the deltas that would bring the ledger to the snapshot (mismatches only)"""
+    ledger = {
+        row.pop('user_id'): row
+        for row in CreditLedgerEntry.objects.filter(user_id__in=[s['user_id'] for s in snapshots])
+        .values('user_id').annotate(
+            purchased=Sum('purchased_delta'), used=Sum('used_delta'), trial=Sum('trial_delta')
+        ).order_by()
+    }
+    differences = {}
+    for snapshot in snapshots:
+        totals = ledger.get(snapshot['user_id'], {})
+        diff = {
+            'purchased_delta': snapshot['total_reports_purchased'] - (totals.get('purchased') or 0),
+            'used_delta': snapshot['total_reports_used'] - (totals.get('used') or 0),
+            'trial_delta': int(snapshot['free_trial_used']) - (totals.get('trial') or 0),
+        }
+        if any(diff.values()):
+            differences[snapshot['user_id']] = diff
+    return differences
+
+
+def verify_credit_ledger(repair=False, batch_size=1000, max_samples=20):
+    """
+    Check that the ledger adds up to the balance snapshot on every subscription
+
+    Args:
+        repair (bool): Append RECONCILIATION entries so the ledger matches the snapshot
+        batch_size (int): Subscriptions checked per batch
+        max_samples (int): Mismatches returned in detail
+
+    Returns:
+        dict: Counts of checked, mismatched and repaired subscriptions, and
+        ``samples``: (user ID, deltas) pairs for the first mismatches
+    """
+    stats = {'checked': 0, 'mismatched': 0, 'repaired': 0, 'samples': []}
+    last_id = 0
+    while True:
+        # Keyset batches by id: memory stays flat however many subscriptions there are
+        batch = list(
+            UserSubscription.objects.filter(id__gt=last_id).order_by('id')
+            .values(*SNAPSHOT_FIELDS)[:batch_size]
+        )
+        if not batch:
+            break
+        last_id = batch[-1]['id']
+
+        mismatched = _ledger_differences(batch)
+        stats['mismatched'] += len(mismatched)
+        room = max_samples - len(stats['samples'])
+        stats['samples'] += list(mismatched.items())[:max(room, 0)]
+
+        if repair and mismatched:
+            with transaction.atomic():
+                # Re-read under lock so a credit change made meanwhile is not "repaired" away
+                locked = list(
+                    UserSubscription.objects.select_for_update().filter(user_id__in=mismatched).values(*SNAPSHOT_FIELDS)
+                )
+                repairs = [
+                    CreditLedgerEntry(
+                        user_id=user_id,
+                        entry_type=CreditLedgerEntry.RECONCILIATION,
+                        note='verify_credit_ledger --repair',
+                        **diff
+                    )
+                    for user_id, diff in _ledger_differences(locked).items()
+                ]
+                CreditLedgerEntry.objects.bulk_create(repairs)
+            stats['repaired'] += len(repairs)
+        stats['checked'] += len(batch)
+
+    return stats
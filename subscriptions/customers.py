@@ -0,0 +1,73 @@
+"""
+Stripe Customers
+Resolves the one Stripe customer of each user, creating it at most once
+"""
+import logging
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+
+from .gateway import get_gateway
+from .models import UserSubscription
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+def _stored_customer_id(user_id):
+    customer_id = User.objects.filter(pk=user_id).values_list('stripe_customer_id', flat=True).first()
+    if not customer_id:
+        # Older accounts only have it on their subscription
+        customer_id = UserSubscription.objects.filter(user_id=user_id).values_list('stripe_customer_id', flat=True).first()
+    return customer_id or None
+
+
+def _remember_customer_id(user_id, customer_id):
+    """Store the customer ID on the user and on a subscription that lacks it"""
+    missing = Q(stripe_customer_id__isnull=True) | Q(stripe_customer_id='')
+    User.objects.filter(missing, pk=user_id).update(stripe_customer_id=customer_id)
+    UserSubscription.objects.filter(missing, user_id=user_id).update(stripe_customer_id=customer_id)
+
+
+def get_stripe_customer_id(user):
+    """
+    Return the user's Stripe customer ID, creating the customer on first use
+
+    A stored ID is trusted as is, so checkouts of returning customers make
+    no Customer API call. Creation locks the user's row, so concurrent
+    checkouts of a new user wait for the first one instead of creating a
+    second customer; the Stripe idempotency key covers retries of the
+    create call itself.
+
+    Args:
+        user: User instance
+
+    Returns:
+        str: Stripe customer ID (cus_...)
+    """
+    customer_id = user.stripe_customer_id or _stored_customer_id(user.pk)
+    if customer_id:
+        if not user.stripe_customer_id:
+            _remember_customer_id(user.pk, customer_id)
+            user.stripe_customer_id = customer_id
+        return customer_id
+
+    with transaction.atomic():
+        User.objects.select_for_update().filter(pk=user.pk).values_list('pk', flat=True).first()
+        # Another request may have created the customer while we waited for the lock
+        customer_id = _stored_customer_id(user.pk)
+        if not customer_id:
+            customer = get_gateway().create_customer(
+                email=user.email,
+                name=getattr(user, 'full_name', None) or user.get_full_name() or user.username,
+                metadata={'user_id': user.pk},
+                idempotency_key=f'customer-user-{user.pk}',
+            )
+            customer_id = customer.id
+            logger.info(f"Created Stripe customer {customer_id} for user {user.pk}")
+        _remember_customer_id(user.pk, customer_id)
+
+    user.stripe_customer_id = customer_id
+    return customer_id
@@ -0,0 +1,235 @@
+"""
+Payment Gateway
+Stripe calls used by the checkout flows, behind an interface with an in-memory stand-in for tests and load tests
+"""
+import hashlib
+import hmac
+import itertools
+import json
+import secrets
+import threading
+import time
+
+import stripe
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+
+class StripeGateway:
+    """
+    Default gateway that talks to the Stripe API
+    """
+
+    def create_checkout_session(self, **params):
+        """Create a Checkout Session (stripe.checkout.Session.create)"""
+        return stripe.checkout.Session.create(**params)
+
+    def retrieve_checkout_session(self, session_id):
+        """Fetch a Checkout Session by ID"""
+        return stripe.checkout.Session.retrieve(session_id)
+
+    def create_customer(self, **params):
+        """Create a Customer (stripe.Customer.create)"""
+        return stripe.Customer.create(**params)
+
+    def retrieve_customer(self, customer_id):
+        """Fetch a Customer by ID"""
+        return stripe.Customer.retrieve(customer_id)
+
+    def construct_event(self, payload, sig_header, secret=None):
+        """
+        Verify a webhook signature and parse the event
+
+        Raises:
+            ValueError: Payload is not valid JSON
+            stripe.SignatureVerificationError: Signature does not match
+        """
+        return stripe.Webhook.construct_event(payload, sig_header, secret or settings.STRIPE_ENDPOINT_SECRET)
+
+
+class FakeStripeGateway(StripeGateway):
+    """
+    In-memory Stripe stand-in for tests and offline load tests
+
+    Sessions and customers live in this process only. Simulates the API
+    round trip with a fixed latency per call. complete_checkout_session()
+    plays the part of the customer paying, and signed_webhook() produces
+    payloads signed exactly like Stripe's so the real verification runs.
+    """
+
+    checkout_url = 'https://checkout.stripe.test/pay'
+
+    def __init__(self, latency=0.0, webhook_secret=None):
+        self.latency = latency
+        self.webhook_secret = webhook_secret
+        self.calls = 0
+        self.sessions = {}
+        self.customers = {}
+        self.idempotent_results = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _round_trip(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _new_id(self, prefix):
+        return f'{prefix}_fake_{next(self._ids)}{secrets.token_hex(4)}'
+
+    @staticmethod
+    def _object(data):
+        # Attribute and dict access, like the objects stripe-python returns
+        return stripe.StripeObject.construct_from(data, 'sk_test_fake')
+
+    @staticmethod
+    def _not_found(kind, object_id):
+        return stripe.InvalidRequestError(f"No such {kind}: '{object_id}'", 'id', http_status=404)
+
+    def create_checkout_session(self, **params):
+        self._round_trip()
+        line_items = params.get('line_items') or []
+        amount_total = sum(
+            (item.get('price_data') or {}).get('unit_amount', 0) * item.get('quantity', 1)
+            for item in line_items
+        )
+        currency = next(
+            ((item.get('price_data') or {}).get('currency') for item in line_items if item.get('price_data')),
+            'usd'
+        )
+        session_id = self._new_id('cs')
+        session = {
+            'id': session_id,
+            'object': 'checkout.session',
+            'url': f'{self.checkout_url}/{session_id}',
+            'mode': params.get('mode', 'payment'),
+            'status': 'open',
+            'payment_status': 'unpaid',
+            'customer': params.get('customer'),
+            'customer_email': params.get('customer_email'),
+            'payment_intent': None,
+            'subscription': None,
+            'amount_total': amount_total,
+            'currency': currency,
+            'success_url': params.get('success_url'),
+            'cancel_url': params.get('cancel_url'),
+            # Stripe stores metadata values as strings
+            'metadata': {key: str(value) for key, value in (params.get('metadata') or {}).items()},
+            'created': int(time.time()),
+        }
+        with self._lock:
+            self.sessions[session_id] = session
+        return self._object(session)
+
+    def retrieve_checkout_session(self, session_id):
+        self._round_trip()
+        with self._lock:
+            session = self.sessions.get(session_id)
+        if session is None:
+            raise self._not_found('checkout.session', session_id)
+        return self._object(dict(session))
+
+    def create_customer(self, idempotency_key=None, **params):
+        self._round_trip()
+        with self._lock:
+            if idempotency_key in self.idempotent_results:
+                return self._object(dict(self.idempotent_results[idempotency_key]))
+        customer = {
+            'id': self._new_id('cus'),
+            'object': 'customer',
+            'email': params.get('email'),
+            'name': params.get('name'),
+            'metadata': {key: str(value) for key, value in (params.get('metadata') or {}).items()},
+            'created': int(time.time()),
+        }
+        with self._lock:
+            self.customers[customer['id']] = customer
+            if idempotency_key:
+                self.idempotent_results[idempotency_key] = customer
+        return self._object(customer)
+
+    def retrieve_customer(self, customer_id):
+        self._round_trip()
+        with self._lock:
+            customer = self.customers.get(customer_id)
+        if customer is None:
+            raise self._not_found('customer', customer_id)
+        return self._object(dict(customer))
+
+    def complete_checkout_session(self, session_id):
+        """
+        Mark a session as paid, as if the customer finished Stripe Checkout
+
+        Returns:
+            tuple: (payload, sig_header) of the checkout.session.completed webhook
+        """
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                raise self._not_found('checkout.session', session_id)
+            if session['payment_status'] != 'paid':
+                session.update(
+                    status='complete',
+                    payment_status='paid',
+                    payment_intent=self._new_id('pi'),
+                )
+            session = dict(session)
+        return self.signed_webhook('checkout.session.completed', session)
+
+    def signed_webhook(self, event_type, data_object):
+        """
+        Build a webhook request body and its Stripe-Signature header
+
+        Returns:
+            tuple: (payload bytes, sig_header)
+        """
+        event = {
+            'id': self._new_id('evt'),
+            'object': 'event',
+            'type': event_type,
+            'created': int(time.time()),
+            'data': {'object': data_object},
+        }
+        payload = json.dumps(event).encode()
+        timestamp = int(time.time())
+        secret = self.webhook_secret or settings.STRIPE_ENDPOINT_SECRET
+        signature = hmac.new(secret.encode(), f'{timestamp}.'.encode() + payload, hashlib.sha256).hexdigest()
+        return payload, f't={timestamp},v1={signature}'
+
+
+_gateway = None
+
+
+def get_gateway():
+    """
+    Return the gateway used for Stripe calls
+
+    PAYMENT_GATEWAY = 'fake' selects FakeStripeGateway (for running the
+    load test against a local server); anything else uses Stripe.
+
+    Raises:
+        ImproperlyConfigured: The fake gateway is selected with DEBUG off
+    """
+    global _gateway
+    if _gateway is None:
+        if getattr(settings, 'PAYMENT_GATEWAY', 'stripe') == 'fake':
+            if not settings.DEBUG:
+                raise ImproperlyConfigured("PAYMENT_GATEWAY = 'fake' is only allowed with DEBUG on")
+            _gateway = FakeStripeGateway()
+        else:
+            _gateway = StripeGateway()
+    return _gateway
+
+
+def set_gateway(gateway):
+    """
+    Replace the payment gateway (e.g. with FakeStripeGateway)
+
+    Returns:
+        The previously configured gateway
+    """
+    global _gateway
+    previous = _gateway
+    _gateway = gateway
+    return previous
@@ -0,0 +1,248 @@
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import io
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from admin_dashboard.metrics import rebuild_daily_metrics
+from background_requests.models import Request, status_changed
+from notifications import signals as notification_signals
+from notifications.models import Notification
+from subscriptions.gateway import FakeStripeGateway, set_gateway
+from subscriptions.models import PaymentHistory, StripeEvent, SubscriptionPlan
+from subscriptions.webhooks import process_batch
+
+User = get_user_model()
+
+STEPS = ['create', 'select_pricing', 'confirm', 'webhook']
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+@contextlib.contextmanager
+def muted_request_notifications():
+    """Keep load test requests from notifying (and pushing to) the real admins"""
+    receivers = [
+        (post_save, notification_signals.notify_on_request_created),
+        (status_changed, notification_signals.notify_on_request_status_update),
+    ]
+    for signal, receiver in receivers:
+        signal.disconnect(receiver, sender=Request)
+    try:
+        yield
+    finally:
+        for signal, receiver in receivers:
+            signal.connect(receiver, sender=Request)
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test the request -> pricing -> confirm -> webhook payment flow in-process '
+        'against a local Stripe stand-in; benchmark data is deleted afterwards. '
+        'Writes to the configured database, so only run it against a scratch database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=8,
+            help='Concurrent virtual users, one thread each (default: 8)',
+        )
+        parser.add_argument(
+            '--flows',
+            type=int,
+            default=25,
+            help='Payment flows each virtual user runs (default: 25)',
+        )
+        parser.add_argument(
+            '--stripe-latency-ms',
+            type=float,
+            default=0.0,
+            help='Simulated Stripe API round trip in milliseconds (default: 0)',
+        )
+        parser.add_argument(
+            '--process-events',
+            action='store_true',
+            help='Also drain the webhook inbox afterwards and time the worker',
+        )
+        parser.add_argument(
+            '--keep-data',
+            action='store_true',
+            help='Do not delete the benchmark users, requests and events',
+        )
+        parser.add_argument(
+            '--scratch-db',
+            action='store_true',
+            help='Confirm the configured database is disposable (required when DEBUG is off)',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['scratch_db']:
+            raise CommandError(
+                "DEBUG is off: the load test writes users, requests and payments to the configured "
+                "database. Point it at a scratch database and pass --scratch-db."
+            )
+        users, flows = options['users'], options['flows']
+        gateway = FakeStripeGateway(latency=options['stripe_latency_ms'] / 1000.0)
+        previous_gateway = set_gateway(gateway)
+
+        self.stdout.write("=" * 70)
+        self.stdout.write(self.style.SUCCESS("💳 Payment Flow Load Test"))
+        self.stdout.write("=" * 70)
+        self.stdout.write(
+            f"Users: {users}  |  Flows per user: {flows}  |  Stripe latency: {options['stripe_latency_ms']}ms"
+        )
+        if connection.vendor == 'sqlite' and users > 1:
+            self.stdout.write(self.style.WARNING(
+                "⚠️  SQLite serializes writers; concurrent users will hit 'database is locked'. Use PostgreSQL."
+            ))
+
+        stamp = time.strftime('%H%M%S')
+        first_day = timezone.localdate()
+        plan = SubscriptionPlan.objects.create(
+            name=f'Load test {stamp}', plan_type='basic', price_per_report=25, description='Load test plan'
+        )
+        accounts = [
+            User.objects.create(username=f'loadtest_{stamp}_{i}', email=f'loadtest_{stamp}_{i}@example.com')
+            for i in range(users)
+        ]
+        timings = {step: [] for step in STEPS}
+        errors = []
+        lock = threading.Lock()
+
+        def virtual_user(account):
+            client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(account).access_token}')
+            try:
+                for _ in range(flows):
+                    try:
+                        flow_timings = self._run_flow(client, gateway, plan)
+                    except Exception as e:
+                        with lock:
+                            errors.append(str(e))
+                        continue
+                    with lock:
+                        for step, elapsed in flow_timings.items():
+                            timings[step].append(elapsed)
+            finally:
+                connection.close()
+
+        try:
+            # Views still print debug output; keep it out of the report
+            with override_settings(ALLOWED_HOSTS=['*']), muted_request_notifications(), \
+                    contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=users) as executor:
+                    list(executor.map(virtual_user, accounts))
+                elapsed = time.perf_counter() - start
+
+            self._report(timings, errors, elapsed, gateway)
+
+            if options['process_events']:
+                self._drain_inbox(accounts)
+        finally:
+            set_gateway(previous_gateway)
+            if not options['keep_data']:
+                self._cleanup(accounts, plan, first_day)
+
+        self.stdout.write("=" * 70)
+
+    def _run_flow(self, client, gateway, plan):
+        flow_timings = {}
+
+        def timed(step, call, expected_status=200):
+            start = time.perf_counter()
+            response = call()
+            flow_timings[step] = (time.perf_counter() - start) * 1000
+            if response.status_code != expected_status:
+                raise RuntimeError(f"{step} returned {response.status_code}: {response.content[:200]!r}")
+            return response
+
+        response = timed('create', lambda: client.post('/api/requests/api/', {
+            'name': 'Load Test', 'dob': '1990-01-01', 'city': 'Austin', 'state': 'TX',
+            'email': 'subject@example.com', 'phone_number': '5550100',
+        }, content_type='application/json'), expected_status=201)
+        request_id = response.json()['request']['id']
+
+        response = timed('select_pricing', lambda: client.post(
+            f'/api/requests/api/{request_id}/select-pricing/', {'plan_id': plan.id}, content_type='application/json'
+        ))
+        session_id = response.json()['session_id']
+
+        # The customer pays on Stripe's page
+        payload, sig_header = gateway.complete_checkout_session(session_id)
+
+        timed('confirm', lambda: client.get(
+            f'/api/requests/api/{request_id}/confirm-payment/', {'session_id': session_id}
+        ))
+        timed('webhook', lambda: client.post(
+            '/api/subscriptions/webhook/', payload, content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=sig_header
+        ))
+        return flow_timings
+
+    def _report(self, timings, errors, elapsed, gateway):
+        completed = len(timings['webhook'])
+        requests_made = sum(len(values) for values in timings.values())
+
+        self.stdout.write("-" * 70)
+        self.stdout.write(f"{'Step':<16} | {'Count':>7} | {'Mean ms':>8} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8}")
+        self.stdout.write("-" * 70)
+        flow_totals = [sum(step_times) for step_times in zip(*(timings[step] for step in STEPS))]
+        for label, values in [*timings.items(), ('full flow', flow_totals)]:
+            mean = sum(values) / len(values) if values else 0.0
+            self.stdout.write(
+                f"{label:<16} | {len(values):>7} | {mean:>8.1f} | {percentile(values, 50):>8.1f} | "
+                f"{percentile(values, 95):>8.1f} | {percentile(values, 99):>8.1f}"
+            )
+        self.stdout.write("-" * 70)
+        self.stdout.write(f"Elapsed: {elapsed:.2f}s  |  Stripe calls: {gateway.calls}")
+        self.stdout.write(f"Throughput: {requests_made / elapsed:.1f} requests/s, {completed / elapsed:.1f} flows/s")
+        if errors:
+            self.stdout.write(self.style.WARNING(f"⚠️  {len(errors)} flows failed, first error: {errors[0]}"))
+
+    def _drain_inbox(self, accounts):
+        pending = StripeEvent.objects.filter(status=StripeEvent.PENDING).count()
+        start = time.perf_counter()
+        processed = 0
+        while True:
+            stats = process_batch(batch_size=100)
+            processed += stats['processed']
+            if not stats['claimed']:
+                break
+        elapsed = time.perf_counter() - start
+        payments = PaymentHistory.objects.filter(user__in=accounts, status='succeeded').count()
+        self.stdout.write(
+            f"Webhook worker: {processed}/{pending} events in {elapsed:.2f}s "
+            f"({processed / elapsed if elapsed else 0:.1f} events/s), {payments} payments recorded"
+        )
+
+    def _cleanup(self, accounts, plan, first_day):
+        session_ids = list(
+            Request.objects.filter(user__in=accounts).values_list('stripe_checkout_session_id', flat=True)
+        )
+        StripeEvent.objects.filter(payload__data__object__id__in=session_ids).delete()
+        # Sender is SET_NULL, so notifications sent by the accounts would outlive them
+        Notification.objects.filter(Q(recipient__in=accounts) | Q(sender__in=accounts)).delete()
+        User.objects.filter(id__in=[account.id for account in accounts]).delete()
+        plan.delete()
+        # Take the benchmark payments and requests back out of the analytics rollup
+        rebuild_daily_metrics(start=first_day, end=timezone.localdate())
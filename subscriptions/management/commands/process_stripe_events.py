@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from subscriptions.webhooks import DEFAULT_MAX_ATTEMPTS, process_batch
+
+
+class Command(BaseCommand):
+    help = 'Apply queued Stripe webhook events in order per customer (runs until interrupted unless --once is given)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the inbox once and exit',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Number of events claimed per batch (default: 50)',
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=DEFAULT_MAX_ATTEMPTS,
+            help=f'Attempts before an event is marked as failed (default: {DEFAULT_MAX_ATTEMPTS})',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to sleep when the inbox is empty (default: 1)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS("💳 Stripe event worker started"))
+
+        totals = {'processed': 0, 'retried': 0, 'failed': 0}
+        try:
+            while True:
+                stats = process_batch(
+                    batch_size=options['batch_size'],
+                    max_attempts=options['max_attempts'],
+                )
+                for key in totals:
+                    totals[key] += stats[key]
+
+                if stats['claimed']:
+                    self.stdout.write(
+                        f"Processed {stats['claimed']} events: {stats['processed']} applied, "
+                        f"{stats['retried']} retried, {stats['failed']} failed"
+                    )
+                    continue
+
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("\nStopping Stripe event worker")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {totals['processed']} applied, {totals['retried']} retried, {totals['failed']} failed"
+        ))
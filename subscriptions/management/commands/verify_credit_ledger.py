@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+
+from subscriptions.credits import verify_credit_ledger
+
+
+class Command(BaseCommand):
+    help = 'Check that the credit ledger adds up to the balance snapshot on every subscription'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Subscriptions checked per batch (default: 1000)',
+        )
+        parser.add_argument(
+            '--repair',
+            action='store_true',
+            help='Append reconciliation entries so the ledger matches the snapshot',
+        )
+        parser.add_argument(
+            '--show',
+            type=int,
+            default=20,
+            help='Mismatches printed in detail (default: 20)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("=" * 70)
+        self.stdout.write(self.style.SUCCESS("🧾 Verifying report credit ledger"))
+        self.stdout.write("=" * 70)
+
+        stats = verify_credit_ledger(
+            repair=options['repair'],
+            batch_size=options['batch_size'],
+            max_samples=options['show'],
+        )
+
+        for user_id, diff in stats['samples']:
+            self.stdout.write(self.style.WARNING(
+                f"⚠️  User {user_id}: snapshot differs from ledger by "
+                f"{diff['purchased_delta']:+d} purchased, {diff['used_delta']:+d} used, "
+                f"{diff['trial_delta']:+d} trial"
+            ))
+
+        self.stdout.write(f"Checked: {stats['checked']}")
+        self.stdout.write(f"Mismatched: {stats['mismatched']}")
+        if options['repair']:
+            self.stdout.write(f"Repaired: {stats['repaired']}")
+        if stats['mismatched'] and not options['repair']:
+            self.stdout.write(self.style.ERROR("❌ Ledger and snapshot disagree"))
+        else:
+            self.stdout.write(self.style.SUCCESS("✅ Done"))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:14
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0002_alter_paymenthistory_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(help_text='Stripe event ID (evt_...)', max_length=255, unique=True)),
+                ('type', models.CharField(max_length=100)),
+                ('customer_id', models.CharField(blank=True, help_text='Stripe customer the event belongs to; events of one customer are applied in order', max_length=255, null=True)),
+                ('payload', models.JSONField(default=dict)),
+                ('stripe_created_at', models.DateTimeField(help_text='When Stripe created the event')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('processed', 'Processed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['stripe_created_at', 'id'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='subscriptio_status_474c12_idx'), models.Index(fields=['customer_id', 'stripe_created_at', 'id'], name='subscriptio_custome_c3fb32_idx')],
+            },
+        ),
+    ]
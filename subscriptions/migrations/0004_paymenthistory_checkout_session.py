@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0003_stripeevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymenthistory',
+            name='stripe_checkout_session_id',
+            field=models.CharField(blank=True, help_text='Checkout Session this payment fulfilled (guards against crediting it twice)', max_length=255, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_opening_balances(apps, schema_editor):
+    """Start every existing balance with one entry so the ledger matches the counters"""
+    UserSubscription = apps.get_model('subscriptions', 'UserSubscription')
+    CreditLedgerEntry = apps.get_model('subscriptions', 'CreditLedgerEntry')
+
+    batch = []
+    subscriptions = UserSubscription.objects.filter(
+        models.Q(total_reports_purchased__gt=0) | models.Q(total_reports_used__gt=0) | models.Q(free_trial_used=True)
+    ).values_list('user_id', 'total_reports_purchased', 'total_reports_used', 'free_trial_used')
+    for user_id, purchased, used, trial_used in subscriptions.iterator(chunk_size=2000):
+        batch.append(CreditLedgerEntry(
+            user_id=user_id,
+            entry_type='opening_balance',
+            purchased_delta=purchased,
+            used_delta=used,
+            trial_delta=1 if trial_used else 0,
+            note='Balance before the ledger was introduced',
+        ))
+        if len(batch) >= 2000:
+            CreditLedgerEntry.objects.bulk_create(batch)
+            batch = []
+    CreditLedgerEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0004_paymenthistory_checkout_session'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CreditLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_type', models.CharField(choices=[('opening_balance', 'Opening balance'), ('purchase', 'Purchase'), ('consumption', 'Consumption'), ('free_trial', 'Free trial'), ('admin_grant', 'Admin grant'), ('admin_adjustment', 'Admin adjustment'), ('refund', 'Refund'), ('reconciliation', 'Reconciliation')], max_length=20)),
+                ('purchased_delta', models.IntegerField(default=0, help_text='Change to total_reports_purchased')),
+                ('used_delta', models.IntegerField(default=0, help_text='Change to total_reports_used')),
+                ('trial_delta', models.SmallIntegerField(default=0, help_text='+1 when the free trial is used, -1 when it is reset')),
+                ('note', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(blank=True, help_text='Admin who made a manual change', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('payment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='credit_entries', to='subscriptions.paymenthistory')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credit_ledger', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Credit ledger entries',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['user', 'id'], name='subscriptio_user_id_9d4a5b_idx')],
+            },
+        ),
+        migrations.RunPython(record_opening_balances, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,16 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.db.models.signals import ModelSignal
 from django.utils import timezone
 from datetime import timedelta
 
 User = get_user_model()
 
+# Sent after a saved PaymentHistory row's status, amount, reports or plan differ
+# from the values it was loaded with. Receivers get ``instance`` and ``old_values``
+# ({field: value} for PaymentHistory.TRACKED_FIELDS).
+payment_changed = ModelSignal(use_caching=True)
+
 class SubscriptionPlan(models.Model):
     """Model for per-report subscription plans"""
     PLAN_TYPES = [
@@ -76,22 +82,55 @@ class UserSubscription(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Only changed through subscriptions.credits, which records every change in the credit ledger
+    CREDIT_FIELDS = ('free_trial_used', 'free_trial_date', 'total_reports_purchased', 'total_reports_used')
+
     def __str__(self):
         return f"{self.user.username} - {self.plan.name if self.plan else 'No Plan'}"
     
+    def save(self, *args, **kwargs):
+        """
+        Save without writing the credit fields back
+        
+        An update leaves the credit fields out unless update_fields names
+        them, so an instance loaded earlier can never overwrite a concurrent
+        credit change. A new subscription that starts with credits gets an
+        opening balance entry in the ledger.
+        """
+        from django.db import transaction
+        
+        if not self._state.adding:
+            if kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+                kwargs['update_fields'] = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name not in self.CREDIT_FIELDS
+                ]
+            return super().save(*args, **kwargs)
+        
+        if not (self.total_reports_purchased or self.total_reports_used or self.free_trial_used):
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            CreditLedgerEntry.objects.create(
+                user_id=self.user_id,
+                entry_type=CreditLedgerEntry.OPENING_BALANCE,
+                purchased_delta=self.total_reports_purchased,
+                used_delta=self.total_reports_used,
+                trial_delta=int(self.free_trial_used),
+            )
+    
     @property
     def can_use_free_trial(self):
         """Check if user can use their free trial search"""
         return not self.free_trial_used
     
     def use_free_trial(self):
-        """Mark free trial as used"""
-        if not self.free_trial_used:
-            self.free_trial_used = True
-            self.free_trial_date = timezone.now()
-            self.save()
-            return True
-        return False
+        """Mark free trial as used (a no-op returning False if it already was)"""
+        from .credits import use_free_trial
+        
+        used = use_free_trial(self.user_id)
+        self.refresh_from_db(fields=['free_trial_used', 'free_trial_date'])
+        return used
     
     @property
     def available_reports(self):
@@ -104,14 +143,22 @@ class UserSubscription(models.Model):
         return self.can_use_free_trial or self.available_reports > 0
     
     def increment_usage(self):
-        """Increment the report usage counter"""
-        if self.can_use_free_trial:
-            self.use_free_trial()
-        elif self.available_reports > 0:
-            self.total_reports_used += 1
-            self.save()
-        else:
+        """
+        Use the free trial, or else one purchased report
+        
+        Applied as conditional UPDATEs, so concurrent requests can neither
+        lose an update nor overdraw the balance.
+        
+        Raises:
+            ValueError: No free trial or purchased report left
+        """
+        from .credits import consume_report_credit
+        
+        consumed = consume_report_credit(self.user_id)
+        self.refresh_from_db(fields=['free_trial_used', 'free_trial_date', 'total_reports_purchased', 'total_reports_used'])
+        if consumed is None:
             raise ValueError("No reports available. Please purchase more reports.")
+        return consumed
 
 
 
@@ -139,6 +186,13 @@ class PaymentHistory(models.Model):
     # Stripe integration
     stripe_payment_intent_id = models.CharField(max_length=255, blank=True, null=True)
     stripe_charge_id = models.CharField(max_length=255, blank=True, null=True)
+    stripe_checkout_session_id = models.CharField(
+        max_length=255,
+        unique=True,
+        blank=True,
+        null=True,
+        help_text="Checkout Session this payment fulfilled (guards against crediting it twice)"
+    )
     
     # Additional info
     description = models.TextField(blank=True)
@@ -151,9 +205,134 @@ class PaymentHistory(models.Model):
         ordering = ['-created_at']
         verbose_name_plural = 'Payment Histories'
 
+    # Fields whose changes are announced with payment_changed
+    TRACKED_FIELDS = ('status', 'amount', 'reports_purchased', 'plan_id')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._loaded_values = self._tracked_values()
+
+    def _tracked_values(self):
+        # Read from __dict__ so a deferred field is not fetched
+        return {field: self.__dict__.get(field) for field in self.TRACKED_FIELDS}
+
+    def save(self, *args, **kwargs):
+        """Save and emit payment_changed when a tracked field differs from the loaded value"""
+        creating = self._state.adding
+        old_values = self._loaded_values
+        super().save(*args, **kwargs)
+        self._loaded_values = self._tracked_values()
+        if not creating and old_values['status'] is not None and old_values != self._loaded_values:
+            payment_changed.send(sender=self.__class__, instance=self, old_values=old_values)
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._loaded_values = self._tracked_values()
+
+    @classmethod
+    def change_status(cls, queryset, old_status, new_status):
+        """
+        Move payments from one status to another with conditional UPDATEs
+
+        A row only changes if it still has ``old_status``, so a redelivered
+        event finds nothing to do. ``payment_changed`` is sent for every row
+        that changed.
+
+        Args:
+            queryset: Payments to consider
+            old_status (str): Status the payments must have
+            new_status (str): Status to set
+
+        Returns:
+            list: Payments whose status changed
+        """
+        changed = []
+        for payment in queryset.filter(status=old_status):
+            if not cls.objects.filter(pk=payment.pk, status=old_status).update(
+                status=new_status, updated_at=timezone.now()
+            ):
+                continue
+            old_values = payment._tracked_values()
+            payment.status = new_status
+            payment._loaded_values = payment._tracked_values()
+            payment_changed.send(sender=cls, instance=payment, old_values=old_values)
+            changed.append(payment)
+        return changed
+
     def __str__(self):
         return f"{self.user.username} - ${self.amount} ({self.reports_purchased} report{'s' if self.reports_purchased > 1 else ''}) - {self.status}"
 
+class CreditLedgerEntry(models.Model):
+    """
+    Append-only history of report credit changes
+
+    Each entry is written in the same transaction as the change to the
+    counters on UserSubscription, which remain the balance snapshot. Summing
+    a user's deltas reproduces the snapshot; ``verify_credit_ledger`` checks
+    that.
+    """
+    # Entry types
+    OPENING_BALANCE = 'opening_balance'
+    PURCHASE = 'purchase'
+    CONSUMPTION = 'consumption'
+    FREE_TRIAL = 'free_trial'
+    ADMIN_GRANT = 'admin_grant'
+    ADMIN_ADJUSTMENT = 'admin_adjustment'
+    REFUND = 'refund'
+    RECONCILIATION = 'reconciliation'
+
+    ENTRY_TYPE_CHOICES = [
+        (OPENING_BALANCE, 'Opening balance'),
+        (PURCHASE, 'Purchase'),
+        (CONSUMPTION, 'Consumption'),
+        (FREE_TRIAL, 'Free trial'),
+        (ADMIN_GRANT, 'Admin grant'),
+        (ADMIN_ADJUSTMENT, 'Admin adjustment'),
+        (REFUND, 'Refund'),
+        (RECONCILIATION, 'Reconciliation'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='credit_ledger')
+    entry_type = models.CharField(max_length=20, choices=ENTRY_TYPE_CHOICES)
+    purchased_delta = models.IntegerField(default=0, help_text="Change to total_reports_purchased")
+    used_delta = models.IntegerField(default=0, help_text="Change to total_reports_used")
+    trial_delta = models.SmallIntegerField(default=0, help_text="+1 when the free trial is used, -1 when it is reset")
+    payment = models.ForeignKey(
+        PaymentHistory,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='credit_entries'
+    )
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        help_text="Admin who made a manual change"
+    )
+    note = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name_plural = 'Credit ledger entries'
+        indexes = [
+            models.Index(fields=['user', 'id']),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Credit ledger entries are append-only")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Credit ledger entries are append-only")
+
+    def __str__(self):
+        return f"{self.user_id} {self.entry_type}: {self.purchased_delta:+d} purchased, {self.used_delta:+d} used"
+
 class SubscriptionFeature(models.Model):
     """Model to track individual features and their availability per plan"""
     name = models.CharField(max_length=100)
@@ -183,3 +362,53 @@ class PlanFeature(models.Model):
 
     def __str__(self):
         return f"{self.plan.name} - {self.feature.name}"
+
+
+class StripeEvent(models.Model):
+    """
+    Inbox of verified Stripe webhook events
+
+    The webhook view only records the event; the ``process_stripe_events``
+    worker applies it. The unique event id makes Stripe's retries no-ops.
+    """
+    # Processing statuses
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    PROCESSED = 'processed'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (PROCESSING, 'Processing'),
+        (PROCESSED, 'Processed'),
+        (FAILED, 'Failed'),
+    ]
+
+    event_id = models.CharField(max_length=255, unique=True, help_text="Stripe event ID (evt_...)")
+    type = models.CharField(max_length=100)
+    customer_id = models.CharField(
+        max_length=255,
+        blank=True,
+        null=True,
+        help_text="Stripe customer the event belongs to; events of one customer are applied in order"
+    )
+    payload = models.JSONField(default=dict)
+    stripe_created_at = models.DateTimeField(help_text="When Stripe created the event")
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, null=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['stripe_created_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['customer_id', 'stripe_created_at', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.type} ({self.event_id}) - {self.status}"
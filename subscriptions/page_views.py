@@ -25,7 +25,7 @@ def select_plan(request):
             
             if not created:
                 subscription.plan = plan
-                subscription.save()
+                subscription.save(update_fields=['plan', 'updated_at'])
             
             messages.success(request, f'Plan "{plan.name}" selected successfully!')
             return redirect('subscriptions:my-dashboard')
@@ -1,3 +1,389 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from authentication.models import User
+
+from .credits import (
+    FREE_TRIAL, PURCHASED, add_report_credits, consume_report_credit, reset_usage, verify_credit_ledger
+)
+from .customers import get_stripe_customer_id
+from .gateway import FakeStripeGateway, get_gateway, set_gateway
+from .models import CreditLedgerEntry, PaymentHistory, StripeEvent, SubscriptionPlan, UserSubscription
+from .webhooks import claim_events, fulfill_checkout_session, handle_charge_refunded, process_batch
+
+WEBHOOK_SECRET = 'whsec_test'
+
+
+def signed_webhook(client, event, secret=WEBHOOK_SECRET):
+    """POST an event to the webhook with a valid Stripe-Signature header"""
+    payload = json.dumps(event)
+    timestamp = int(time.time())
+    signature = hmac.new(secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+    return client.post(
+        '/api/subscriptions/webhook/',
+        data=payload,
+        content_type='application/json',
+        HTTP_STRIPE_SIGNATURE=f't={timestamp},v1={signature}'
+    )
+
+
+def checkout_event(event_id, user, plan, created, quantity=2, customer='cus_1', payment_intent='pi_1'):
+    return {
+        'id': event_id,
+        'object': 'event',
+        'type': 'checkout.session.completed',
+        'created': created,
+        'data': {'object': {
+            'id': f'cs_{payment_intent}',
+            'object': 'checkout.session',
+            'customer': customer,
+            'payment_intent': payment_intent,
+            'payment_status': 'paid',
+            'amount_total': 5000,
+            'currency': 'usd',
+            'metadata': {'user_id': str(user.id), 'plan_id': str(plan.id), 'quantity': str(quantity)},
+        }},
+    }
+
+
+@override_settings(STRIPE_ENDPOINT_SECRET=WEBHOOK_SECRET)
+class StripeWebhookInboxTests(TestCase):
+    """Webhooks are recorded once and applied by the worker in order per customer"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass')
+        cls.plan = SubscriptionPlan.objects.create(name='Basic', description='Basic plan')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_view_only_records_event(self):
+        event = checkout_event('evt_1', self.user, self.plan, created=1_700_000_000)
+        with mock.patch('stripe.checkout.Session.retrieve') as retrieve, \
+                mock.patch('stripe.Subscription.retrieve') as subscription_retrieve, \
+                self.assertNumQueries(3):
+            # SAVEPOINT, INSERT, RELEASE
+            response = signed_webhook(self.client, event)
+        self.assertEqual(response.status_code, 200)
+        retrieve.assert_not_called()
+        subscription_retrieve.assert_not_called()
+
+        stripe_event = StripeEvent.objects.get()
+        self.assertEqual(stripe_event.customer_id, 'cus_1')
+        self.assertEqual(stripe_event.status, StripeEvent.PENDING)
+        self.assertFalse(PaymentHistory.objects.exists())
+
+    def test_invalid_signature_rejected(self):
+        event = checkout_event('evt_1', self.user, self.plan, created=1_700_000_000)
+        response = signed_webhook(self.client, event, secret='whsec_other')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_redelivery_is_applied_once(self):
+        event = checkout_event('evt_1', self.user, self.plan, created=1_700_000_000)
+        for _ in range(3):
+            self.assertEqual(signed_webhook(self.client, event).status_code, 200)
+        self.assertEqual(StripeEvent.objects.count(), 1)
+
+        stats = process_batch()
+        self.assertEqual(stats['processed'], 1)
+        # A second event for the same payment (e.g. success page confirmation) does not credit again
+        signed_webhook(self.client, checkout_event('evt_2', self.user, self.plan, created=1_700_000_001))
+        process_batch()
+
+        subscription = UserSubscription.objects.get(user=self.user)
+        self.assertEqual(subscription.total_reports_purchased, 2)
+        self.assertEqual(subscription.stripe_customer_id, 'cus_1')
+        self.assertEqual(PaymentHistory.objects.filter(status='succeeded').count(), 1)
+        self.assertEqual(StripeEvent.objects.filter(status=StripeEvent.PROCESSED).count(), 2)
+
+    def test_events_claimed_in_order_per_customer(self):
+        other = User.objects.create_user(username='other', email='other@example.com', password='pass')
+        # Received out of order: the later event arrives first
+        signed_webhook(self.client, checkout_event('evt_late', self.user, self.plan, 1_700_000_100, payment_intent='pi_2'))
+        signed_webhook(self.client, checkout_event('evt_early', self.user, self.plan, 1_700_000_000))
+        signed_webhook(self.client, checkout_event('evt_other', other, self.plan, 1_700_000_050, customer='cus_2', payment_intent='pi_3'))
+
+        claimed = claim_events(batch_size=10)
+        # One event per customer at a time, the earliest first
+        self.assertEqual([e.event_id for e in claimed], ['evt_early', 'evt_other'])
+
+    def test_failed_event_retried_without_blocking_other_customers(self):
+        other = User.objects.create_user(username='other', email='other@example.com', password='pass')
+        signed_webhook(self.client, checkout_event('evt_1', self.user, self.plan, 1_700_000_000))
+        signed_webhook(self.client, checkout_event('evt_2', self.user, self.plan, 1_700_000_001, payment_intent='pi_2'))
+        signed_webhook(self.client, checkout_event('evt_3', other, self.plan, 1_700_000_002, customer='cus_2', payment_intent='pi_3'))
+
+        handler = mock.Mock(side_effect=[RuntimeError('db down'), None])
+        with mock.patch.dict('subscriptions.webhooks.EVENT_HANDLERS', {'checkout.session.completed': handler}), \
+                self.assertLogs('subscriptions.webhooks', 'ERROR'):
+            stats = process_batch()
+
+        self.assertEqual(stats['retried'], 1)
+        self.assertEqual(stats['processed'], 1)
+        first = StripeEvent.objects.get(event_id='evt_1')
+        self.assertEqual(first.status, StripeEvent.PENDING)
+        self.assertEqual(first.last_error, 'db down')
+        # evt_2 waits behind the failed evt_1 of the same customer
+        self.assertEqual(StripeEvent.objects.get(event_id='evt_2').status, StripeEvent.PENDING)
+        self.assertEqual(StripeEvent.objects.get(event_id='evt_3').status, StripeEvent.PROCESSED)
+
+
+@override_settings(STRIPE_ENDPOINT_SECRET=WEBHOOK_SECRET)
+class FakeGatewayCheckoutTests(TestCase):
+    """The purchase flow runs end to end against the local Stripe stand-in"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass')
+        cls.plan = SubscriptionPlan.objects.create(name='Basic', description='Basic plan')
+
+    def setUp(self):
+        self.gateway = FakeStripeGateway(webhook_secret=WEBHOOK_SECRET)
+        previous = set_gateway(self.gateway)
+        self.addCleanup(set_gateway, previous)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_purchase_confirm_and_webhook_credit_once(self):
+        response = self.client.post('/api/subscriptions/purchase-report/', {'plan_id': self.plan.id, 'quantity': 3})
+        self.assertEqual(response.status_code, 200)
+        session_id = response.data['session_id']
+
+        # Not paid yet
+        response = self.client.get('/api/subscriptions/confirm-payment/', {'session_id': session_id})
+        self.assertEqual(response.status_code, 400)
+
+        payload, sig_header = self.gateway.complete_checkout_session(session_id)
+        response = self.client.get('/api/subscriptions/confirm-payment/', {'session_id': session_id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['reports_added'], 3)
+
+        response = self.client.post(
+            '/api/subscriptions/webhook/', payload, content_type='application/json', HTTP_STRIPE_SIGNATURE=sig_header
+        )
+        self.assertEqual(response.status_code, 200)
+        process_batch()
+
+        subscription = UserSubscription.objects.get(user=self.user)
+        self.assertEqual(subscription.total_reports_purchased, 3)
+        self.assertEqual(subscription.stripe_customer_id, self.gateway.sessions[session_id]['customer'])
+        self.assertEqual(PaymentHistory.objects.get().amount, 75)
+
+    def test_unknown_session_rejected(self):
+        response = self.client.get('/api/subscriptions/confirm-payment/', {'session_id': 'cs_missing'})
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(PAYMENT_GATEWAY='fake', DEBUG=False)
+    def test_fake_gateway_refused_without_debug(self):
+        set_gateway(None)
+        with self.assertRaises(ImproperlyConfigured):
+            get_gateway()
+
+    @override_settings(DEBUG=False)
+    def test_load_test_refused_without_debug(self):
+        with self.assertRaises(CommandError):
+            call_command('loadtest_payments', stdout=StringIO())
+        self.assertFalse(User.objects.filter(username__startswith='loadtest_').exists())
+
+
+class StripeCustomerTests(TestCase):
+    """Each user gets one Stripe customer, created once and then read locally"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass')
+        self.gateway = FakeStripeGateway()
+        previous = set_gateway(self.gateway)
+        self.addCleanup(set_gateway, previous)
+
+    def test_created_once_then_trusted(self):
+        customer_id = get_stripe_customer_id(self.user)
+        self.assertEqual(len(self.gateway.customers), 1)
+
+        calls = self.gateway.calls
+        fresh_user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_stripe_customer_id(fresh_user), customer_id)
+        self.assertEqual(self.gateway.calls, calls)
+
+    def test_subscription_customer_id_adopted(self):
+        UserSubscription.objects.create(user=self.user, stripe_customer_id='cus_legacy')
+        self.assertEqual(get_stripe_customer_id(self.user), 'cus_legacy')
+        self.assertEqual(self.gateway.calls, 0)
+        self.assertEqual(User.objects.get(pk=self.user.pk).stripe_customer_id, 'cus_legacy')
+
+    def test_customer_id_stored_on_subscription(self):
+        UserSubscription.objects.create(user=self.user)
+        customer_id = get_stripe_customer_id(self.user)
+        self.assertEqual(UserSubscription.objects.get(user=self.user).stripe_customer_id, customer_id)
+
+    def test_purchases_reuse_customer(self):
+        plan = SubscriptionPlan.objects.create(name='Basic', description='Basic plan')
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for _ in range(3):
+            response = client.post('/api/subscriptions/purchase-report/', {'plan_id': plan.id, 'quantity': 1})
+            self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(len(self.gateway.customers), 1)
+        customer_ids = {session['customer'] for session in self.gateway.sessions.values()}
+        self.assertEqual(customer_ids, set(self.gateway.customers))
+
+
+class ReportCreditTests(TestCase):
+    """Credit changes are conditional UPDATEs that stale instances cannot overwrite"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass')
+        self.subscription = UserSubscription.objects.create(user=self.user, free_trial_used=True, total_reports_purchased=1)
+
+    def test_free_trial_then_purchased_then_nothing(self):
+        subscription = UserSubscription.objects.create(
+            user=User.objects.create(username='trial', email='trial@example.com'), total_reports_purchased=1
+        )
+        self.assertEqual(subscription.increment_usage(), FREE_TRIAL)
+        self.assertTrue(subscription.free_trial_used)
+        self.assertEqual(subscription.increment_usage(), PURCHASED)
+        self.assertEqual(subscription.available_reports, 0)
+        with self.assertRaises(ValueError):
+            subscription.increment_usage()
+
+    def test_stale_instances_cannot_overdraw(self):
+        first = UserSubscription.objects.get(pk=self.subscription.pk)
+        second = UserSubscription.objects.get(pk=self.subscription.pk)
+        self.assertTrue(first.can_make_request and second.can_make_request)
+
+        first.increment_usage()
+        with self.assertRaises(ValueError):
+            second.increment_usage()
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.total_reports_used, 1)
+
+    def test_consume_is_one_statement_per_step(self):
+        # Free trial UPDATE (no match) + purchased UPDATE + ledger INSERT
+        with self.assertNumQueries(3):
+            self.assertEqual(consume_report_credit(self.user), PURCHASED)
+        with self.assertNumQueries(2):
+            self.assertIsNone(consume_report_credit(self.user))
+
+    def test_stale_plan_change_keeps_credits(self):
+        plan = SubscriptionPlan.objects.create(name='Premium', description='Premium plan')
+        gateway = FakeStripeGateway()
+        self.addCleanup(set_gateway, set_gateway(gateway))
+        get_or_create = UserSubscription.objects.get_or_create
+
+        def get_or_create_then_credit(*args, **kwargs):
+            # A webhook credits the user after the view loaded its subscription
+            result = get_or_create(*args, **kwargs)
+            add_report_credits(self.user, 2)
+            return result
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with mock.patch.object(UserSubscription.objects, 'get_or_create', side_effect=get_or_create_then_credit):
+            response = client.post('/api/subscriptions/purchase-report/', {'plan_id': plan.id, 'quantity': 1})
+        self.assertEqual(response.status_code, 200)
+
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.plan, plan)
+        self.assertEqual(self.subscription.total_reports_purchased, 3)
+
+    def test_purchases_are_not_lost(self):
+        stale = UserSubscription.objects.get(pk=self.subscription.pk)
+        add_report_credits(self.user, 2)
+        add_report_credits(self.user, 3)
+        stale.use_free_trial()
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.total_reports_purchased, 6)
+
+
+class CreditLedgerTests(TestCase):
+    """Every credit change leaves a ledger entry that adds up to the snapshot"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass')
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='pass')
+        self.plan = SubscriptionPlan.objects.create(name='Basic', description='Basic plan')
+        self.subscription = UserSubscription.objects.create(user=self.user)
+
+    def test_operations_are_recorded(self):
+        add_report_credits(self.user, 3)
+        consume_report_credit(self.user)
+        consume_report_credit(self.user)
+        reset_usage(UserSubscription.objects.filter(pk=self.subscription.pk), created_by=self.admin)
+
+        entry_types = list(self.user.credit_ledger.order_by('id').values_list('entry_type', flat=True))
+        self.assertEqual(entry_types, [
+            CreditLedgerEntry.PURCHASE,
+            CreditLedgerEntry.FREE_TRIAL,
+            CreditLedgerEntry.CONSUMPTION,
+            CreditLedgerEntry.ADMIN_ADJUSTMENT,
+        ])
+        self.assertEqual(self.user.credit_ledger.last().created_by, self.admin)
+        self.assertEqual(verify_credit_ledger()['mismatched'], 0)
+
+    def test_full_refund_takes_back_unused_reports_once(self):
+        event = checkout_event('evt_1', self.user, self.plan, created=1_700_000_000, quantity=3)
+        payment, _ = fulfill_checkout_session(event['data']['object'])
+        consume_report_credit(self.user)  # free trial
+        consume_report_credit(self.user)  # one purchased report
+
+        charge = {'id': 'ch_1', 'object': 'charge', 'refunded': True, 'payment_intent': 'pi_1'}
+        handle_charge_refunded(charge)
+        handle_charge_refunded(charge)
+
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.available_reports, 0)
+        self.assertEqual(self.subscription.total_reports_purchased, 1)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'refunded')
+        self.assertEqual(payment.credit_entries.filter(entry_type=CreditLedgerEntry.REFUND).count(), 1)
+        self.assertEqual(verify_credit_ledger()['mismatched'], 0)
+
+    def test_verify_detects_and_repairs_drift(self):
+        add_report_credits(self.user, 2)
+        # A write that bypasses the credits module
+        UserSubscription.objects.filter(pk=self.subscription.pk).update(total_reports_purchased=5)
+
+        stats = verify_credit_ledger()
+        self.assertEqual(stats['mismatched'], 1)
+        self.assertEqual(stats['samples'], [(self.user.id, {'purchased_delta': 3, 'used_delta': 0, 'trial_delta': 0})])
+        self.assertEqual(verify_credit_ledger(repair=True)['repaired'], 1)
+        self.assertEqual(self.user.credit_ledger.last().purchased_delta, 3)
+        self.assertEqual(verify_credit_ledger()['mismatched'], 0)
+
+    def test_full_save_cannot_bypass_the_ledger(self):
+        stale = UserSubscription.objects.get(pk=self.subscription.pk)
+        add_report_credits(self.user, 2)
+        consume_report_credit(self.user)
+        stale.stripe_customer_id = 'cus_1'
+        stale.save()
+
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.total_reports_purchased, 2)
+        self.assertTrue(self.subscription.free_trial_used)
+        self.assertEqual(self.subscription.stripe_customer_id, 'cus_1')
+
+        other = User.objects.create(username='other', email='other@example.com')
+        UserSubscription.objects.create(user=other, total_reports_purchased=3, free_trial_used=True)
+        self.assertEqual(other.credit_ledger.get().entry_type, CreditLedgerEntry.OPENING_BALANCE)
+        self.assertEqual(verify_credit_ledger()['mismatched'], 0)
+
+    def test_entries_are_append_only(self):
+        add_report_credits(self.user, 1)
+        entry = self.user.credit_ledger.get()
+        entry.purchased_delta = 100
+        with self.assertRaises(ValueError):
+            entry.save()
+        with self.assertRaises(ValueError):
+            entry.delete()
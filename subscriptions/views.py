@@ -3,9 +3,10 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django.contrib.auth import get_user_model
-from django.db.models import Sum, Count
+from django.db.models import Count
 from django.utils import timezone
 from datetime import datetime, timedelta
+import json
 import stripe
 from django.conf import settings
 from drf_yasg.utils import swagger_auto_schema
@@ -18,6 +19,10 @@ from .serializers import (
     SubscriptionUsageSerializer, SubscriptionStatsSerializer, StripeCustomerSerializer,
     PurchaseReportSerializer
 )
+from .credits import add_report_credits
+from .customers import get_stripe_customer_id
+from .gateway import get_gateway
+from .webhooks import fulfill_checkout_session, record_event
 
 # Configure Stripe
 stripe.api_key = settings.STRIPE_SECRET_KEY
@@ -125,7 +130,7 @@ class UserSubscriptionView(APIView):
                 if not created:
                     # Update existing subscription with new plan
                     subscription.plan = plan
-                    subscription.save()
+                    subscription.save(update_fields=['plan', 'updated_at'])
                     message = 'Subscription plan updated successfully'
                 else:
                     message = 'Subscription created successfully'
@@ -180,7 +185,7 @@ class UserSubscriptionView(APIView):
                 
                 # Update local subscription
                 subscription.plan = new_plan
-                subscription.save()
+                subscription.save(update_fields=['plan', 'updated_at'])
                 
                 return Response({
                     'message': 'Subscription updated successfully',
@@ -227,7 +232,8 @@ class UserSubscriptionView(APIView):
                     subscription.status = 'canceled'
                     subscription.end_date = timezone.now()
                 
-                subscription.save()
+                # Only touch updated_at: a full save would write stale credit counters back
+                subscription.save(update_fields=['updated_at'])
                 
                 return Response({
                     'message': 'Subscription canceled successfully',
@@ -240,25 +246,6 @@ class UserSubscriptionView(APIView):
             return Response({'error': 'No subscription found'}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
-    
-    def get_or_create_stripe_customer(self, user):
-        """Get or create a Stripe customer for the user"""
-        try:
-            # Try to find existing customer
-            subscription = UserSubscription.objects.filter(user=user).first()
-            if subscription and subscription.stripe_customer_id:
-                return stripe.Customer.retrieve(subscription.stripe_customer_id)
-        except:
-            pass
-        
-        # Create new customer
-        customer = stripe.Customer.create(
-            email=user.email,
-            name=f"{user.first_name} {user.last_name}".strip() or user.username,
-            metadata={'user_id': user.id}
-        )
-        
-        return customer
 
 class SubscriptionUsageView(APIView):
     """View to get user's subscription usage information"""
@@ -332,7 +319,7 @@ class StripeWebhookView(APIView):
     
     @swagger_auto_schema(
         operation_summary="Stripe Webhook Handler",
-        operation_description="Webhook endpoint for Stripe events. Handles subscription updates, payments, and cancellations. This endpoint is called by Stripe, not by users.",
+        operation_description="Webhook endpoint for Stripe events. Verified events are queued and applied by a background worker; redeliveries of the same event are ignored. This endpoint is called by Stripe, not by users.",
         operation_id="stripe_webhook",
         tags=['Payments'],
         responses={
@@ -345,183 +332,16 @@ class StripeWebhookView(APIView):
         sig_header = request.META.get('HTTP_STRIPE_SIGNATURE')
         
         try:
-            event = stripe.Webhook.construct_event(
-                payload, sig_header, settings.STRIPE_ENDPOINT_SECRET
-            )
+            get_gateway().construct_event(payload, sig_header)
         except ValueError:
             return Response({'error': 'Invalid payload'}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             # Handles SignatureVerificationError and other Stripe errors
             return Response({'error': f'Invalid signature: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Handle the event
-        if event['type'] == 'checkout.session.completed':
-            self.handle_checkout_session_completed(event['data']['object'])
-        elif event['type'] == 'payment_intent.succeeded':
-            self.handle_payment_succeeded(event['data']['object'])
-        elif event['type'] == 'payment_intent.payment_failed':
-            self.handle_payment_failed(event['data']['object'])
-        elif event['type'] == 'customer.subscription.updated':
-            self.handle_subscription_updated(event['data']['object'])
-        elif event['type'] == 'customer.subscription.deleted':
-            self.handle_subscription_deleted(event['data']['object'])
-        elif event['type'] == 'invoice.payment_succeeded':
-            self.handle_invoice_payment_succeeded(event['data']['object'])
-        
+        # Record only; the process_stripe_events worker applies the event
+        record_event(json.loads(payload))
         return Response({'status': 'success'})
-    
-    def handle_checkout_session_completed(self, session):
-        """Handle completed checkout session"""
-        try:
-            # Get user from metadata
-            user_id = session['metadata'].get('user_id')
-            plan_id = session['metadata'].get('plan_id')
-            
-            if not user_id or not plan_id:
-                return
-            
-            user = User.objects.get(id=user_id)
-            plan = SubscriptionPlan.objects.get(id=plan_id)
-            
-            stripe_subscription_id = session.get('subscription')
-            stripe_customer_id = session.get('customer')
-            
-            # Retrieve full subscription details from Stripe
-            stripe_subscription = stripe.Subscription.retrieve(stripe_subscription_id)
-            
-            # Create or update subscription
-            user_subscription, created = UserSubscription.objects.update_or_create(
-                user=user,
-                defaults={
-                    'plan': plan,
-                    'stripe_subscription_id': stripe_subscription_id,
-                    'stripe_customer_id': stripe_customer_id,
-                    'status': 'active' if stripe_subscription.status == 'active' else stripe_subscription.status,
-                    'start_date': timezone.now(),
-                    'end_date': timezone.datetime.fromtimestamp(
-                        stripe_subscription.current_period_end,
-                        tz=timezone.get_current_timezone()
-                    ),
-                    'trial_end': timezone.datetime.fromtimestamp(
-                        stripe_subscription.trial_end,
-                        tz=timezone.get_current_timezone()
-                    ) if stripe_subscription.trial_end else None,
-                }
-            )
-            
-            # Create payment record
-            PaymentHistory.objects.create(
-                user=user,
-                subscription=user_subscription,
-                amount=plan.price,
-                currency='USD',
-                status='succeeded',
-                stripe_payment_intent_id=session.get('payment_intent'),
-                description=f"Subscription to {plan.name} via Checkout"
-            )
-            
-        except (User.DoesNotExist, SubscriptionPlan.DoesNotExist):
-            pass
-        except Exception as e:
-            print(f"Error handling checkout session: {str(e)}")
-    
-    def handle_payment_succeeded(self, payment_intent):
-        """Handle successful payment"""
-        try:
-            subscription = UserSubscription.objects.filter(
-                stripe_customer_id=payment_intent['customer']
-            ).first()
-            
-            if not subscription:
-                return
-            
-            PaymentHistory.objects.create(
-                user=subscription.user,
-                subscription=subscription,
-                amount=payment_intent['amount'] / 100,  # Convert from cents
-                currency=payment_intent['currency'].upper(),
-                status='succeeded',
-                stripe_payment_intent_id=payment_intent['id'],
-                description=f"Payment for {subscription.plan.name if subscription.plan else 'Plan'}"
-            )
-            
-        except Exception as e:
-            print(f"Error handling payment succeeded: {str(e)}")
-    
-    def handle_payment_failed(self, payment_intent):
-        """Handle failed payment"""
-        try:
-            subscription = UserSubscription.objects.filter(
-                stripe_customer_id=payment_intent['customer']
-            ).first()
-            
-            if not subscription:
-                return
-            
-            PaymentHistory.objects.create(
-                user=subscription.user,
-                subscription=subscription,
-                amount=payment_intent['amount'] / 100,
-                currency=payment_intent['currency'].upper(),
-                status='failed',
-                stripe_payment_intent_id=payment_intent['id'],
-                failure_reason=payment_intent.get('last_payment_error', {}).get('message', 'Payment failed'),
-                description=f"Failed payment for {subscription.plan.name if subscription.plan else 'Plan'}"
-            )
-            
-        except Exception as e:
-            print(f"Error handling payment failed: {str(e)}")
-            pass
-    
-    def handle_subscription_updated(self, subscription_obj):
-        """Handle subscription updates from Stripe"""
-        try:
-            user_subscription = UserSubscription.objects.filter(
-                stripe_subscription_id=subscription_obj['id']
-            ).first()
-            
-            if not user_subscription:
-                return
-            
-            user_subscription.status = subscription_obj['status']
-            user_subscription.save()
-            
-        except Exception as e:
-            print(f"Error handling subscription update: {str(e)}")
-    
-    def handle_subscription_deleted(self, subscription_obj):
-        """Handle subscription cancellation from Stripe"""
-        try:
-            user_subscription = UserSubscription.objects.filter(
-                stripe_subscription_id=subscription_obj['id']
-            ).first()
-            
-            if not user_subscription:
-                return
-            
-            user_subscription.status = 'canceled'
-            user_subscription.end_date = timezone.now()
-            user_subscription.save()
-            
-        except Exception as e:
-            print(f"Error handling subscription deletion: {str(e)}")
-    
-    def handle_invoice_payment_succeeded(self, invoice):
-        """Handle successful invoice payment"""
-        try:
-            subscription = UserSubscription.objects.filter(
-                stripe_subscription_id=invoice['subscription']
-            ).first()
-            
-            if not subscription:
-                return
-            
-            # Update subscription status to active
-            subscription.status = 'active'
-            subscription.save()
-            
-        except Exception as e:
-            print(f"Error handling invoice payment: {str(e)}")
 
 class AdminSubscriptionStatsView(APIView):
     """Admin view for subscription statistics"""
@@ -542,17 +362,13 @@ class AdminSubscriptionStatsView(APIView):
         total_subscribers = UserSubscription.objects.count()
         active_subscribers = UserSubscription.objects.filter(plan__isnull=False).count()
         
-        # Calculate revenue
-        total_revenue = PaymentHistory.objects.filter(
-            status='succeeded'
-        ).aggregate(total=Sum('amount'))['total'] or 0
+        # Calculate revenue from the daily rollup
+        from admin_dashboard.metrics import metrics_totals
+        total_revenue = metrics_totals()['revenue']
         
         # Monthly revenue (current month)
-        current_month = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        monthly_revenue = PaymentHistory.objects.filter(
-            status='succeeded',
-            created_at__gte=current_month
-        ).aggregate(total=Sum('amount'))['total'] or 0
+        current_month = timezone.localdate().replace(day=1)
+        monthly_revenue = metrics_totals(since=current_month)['revenue']
         
         # Most popular plan
         popular_plan_data = UserSubscription.objects.filter(
@@ -643,8 +459,8 @@ class CreateCheckoutSessionView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Get or create Stripe customer
-            customer = self.get_or_create_stripe_customer(request.user)
+            # Stripe customer (created once, then read from the user)
+            customer_id = get_stripe_customer_id(request.user)
             
             # Determine the success and cancel URLs
             backend_url = settings.RENDER_EXTERNAL_HOSTNAME if hasattr(settings, 'RENDER_EXTERNAL_HOSTNAME') else 'http://127.0.0.1:8000'
@@ -656,8 +472,8 @@ class CreateCheckoutSessionView(APIView):
             
             # Create Checkout Session for one-time payment
             try:
-                checkout_session = stripe.checkout.Session.create(
-                    customer=customer.id,
+                checkout_session = get_gateway().create_checkout_session(
+                    customer=customer_id,
                     payment_method_types=['card'],
                     line_items=[{
                         'price_data': {
@@ -710,25 +526,6 @@ class CreateCheckoutSessionView(APIView):
                 'type': type(e).__name__,
                 'traceback': traceback.format_exc()
             }, status=status.HTTP_400_BAD_REQUEST)
-    
-    def get_or_create_stripe_customer(self, user):
-        """Get or create a Stripe customer for the user"""
-        try:
-            # Try to find existing customer
-            subscription = UserSubscription.objects.filter(user=user).first()
-            if subscription and subscription.stripe_customer_id:
-                return stripe.Customer.retrieve(subscription.stripe_customer_id)
-        except:
-            pass
-        
-        # Create new customer
-        customer = stripe.Customer.create(
-            email=user.email,
-            name=getattr(user, 'full_name', None) or f"{user.first_name} {user.last_name}".strip() or user.username,
-            metadata={'user_id': user.id}
-        )
-        
-        return customer
 
 
 class VerifyCheckoutSessionView(APIView):
@@ -770,7 +567,7 @@ class VerifyCheckoutSessionView(APIView):
         
         try:
             # Retrieve the checkout session from Stripe
-            checkout_session = stripe.checkout.Session.retrieve(session_id)
+            checkout_session = get_gateway().retrieve_checkout_session(session_id)
             
             # Check if payment was successful
             if checkout_session.payment_status != 'paid':
@@ -911,21 +708,14 @@ class PurchaseReportView(APIView):
             # Update plan if changed
             if subscription.plan != plan:
                 subscription.plan = plan
-                subscription.save()
+                subscription.save(update_fields=['plan', 'updated_at'])
             
-            # Get or create Stripe customer
-            if not subscription.stripe_customer_id:
-                customer = stripe.Customer.create(
-                    email=request.user.email,
-                    name=f"{request.user.first_name} {request.user.last_name}".strip() or request.user.username,
-                    metadata={'user_id': request.user.id}
-                )
-                subscription.stripe_customer_id = customer.id
-                subscription.save()
+            # Stripe customer (created once, then read from the user)
+            customer_id = get_stripe_customer_id(request.user)
             
             # Create Stripe Checkout Session
-            checkout_session = stripe.checkout.Session.create(
-                customer=subscription.stripe_customer_id,
+            checkout_session = get_gateway().create_checkout_session(
+                customer=customer_id,
                 payment_method_types=['card'],
                 line_items=[{
                     'price_data': {
@@ -1000,7 +790,7 @@ class ConfirmPaymentView(APIView):
         
         try:
             # Retrieve checkout session from Stripe
-            checkout_session = stripe.checkout.Session.retrieve(session_id)
+            checkout_session = get_gateway().retrieve_checkout_session(session_id)
             
             # Check if payment was successful
             if checkout_session.payment_status != 'paid':
@@ -1009,42 +799,20 @@ class ConfirmPaymentView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Get metadata
-            user_id = int(checkout_session.metadata.get('user_id'))
-            plan_id = int(checkout_session.metadata.get('plan_id'))
             quantity = int(checkout_session.metadata.get('quantity', 1))
-            subscription_id = int(checkout_session.metadata.get('subscription_id'))
-            
-            # Get user and subscription
-            from django.contrib.auth import get_user_model
-            User = get_user_model()
-            user = User.objects.get(id=user_id)
-            subscription = UserSubscription.objects.get(id=subscription_id)
-            plan = SubscriptionPlan.objects.get(id=plan_id)
-            
-            # Add reports to subscription
-            subscription.total_reports_purchased += quantity
-            subscription.save()
-            
-            # Calculate amount
-            amount = float(plan.price_per_report) * quantity
             
-            # Create payment history
-            PaymentHistory.objects.create(
-                user=user,
-                subscription=subscription,
-                plan=plan,
-                amount=amount,
-                reports_purchased=quantity,
-                currency='USD',
-                status='succeeded',
-                stripe_payment_intent_id=checkout_session.payment_intent,
-                description=f"Purchase of {quantity} {plan.name} report{'s' if quantity > 1 else ''}"
-            )
+            # Credit the reports unless the webhook worker already did
+            payment, created = fulfill_checkout_session(checkout_session)
+            if payment is None:
+                return Response(
+                    {'error': 'Checkout session has no user'}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            subscription = UserSubscription.objects.get(user_id=payment.user_id)
             
             return Response({
-                'message': 'Payment confirmed successfully',
-                'reports_added': quantity,
+                'message': 'Payment confirmed successfully' if created else 'Payment already confirmed',
+                'reports_added': quantity if created else 0,
                 'available_reports': subscription.total_reports_purchased - subscription.total_reports_used,
                 'subscription': UserSubscriptionSerializer(subscription).data
             }, status=status.HTTP_200_OK)
@@ -1124,8 +892,8 @@ class TestPurchaseReportsView(APIView):
             amount = float(plan.price_per_report) * quantity
             
             # Add reports directly
-            subscription.total_reports_purchased += quantity
-            subscription.save()
+            add_report_credits(request.user, quantity)
+            subscription.refresh_from_db()
             
             # Create payment history record (marked as test)
             PaymentHistory.objects.create(
@@ -1233,18 +1001,12 @@ def subscribe_plan_view(request):
                 messages.warning(request, 'You already have a subscription! You can purchase more reports.')
                 return redirect('subscriptions:subscription_dashboard')
             
-            # Create or get Stripe customer
-            if not request.user.stripe_customer_id:
-                customer = stripe.Customer.create(
-                    email=request.user.email,
-                    name=request.user.get_full_name() or request.user.email,
-                )
-                request.user.stripe_customer_id = customer.id
-                request.user.save()
+            # Stripe customer (created once, then read from the user)
+            customer_id = get_stripe_customer_id(request.user)
             
             # Create Stripe Checkout Session
-            checkout_session = stripe.checkout.Session.create(
-                customer=request.user.stripe_customer_id,
+            checkout_session = get_gateway().create_checkout_session(
+                customer=customer_id,
                 payment_method_types=['card'],
                 line_items=[{
                     'price': plan.stripe_price_id,
@@ -1283,7 +1045,7 @@ def subscription_success_view(request):
     
     try:
         # Retrieve the session from Stripe
-        session = stripe.checkout.Session.retrieve(session_id)
+        session = get_gateway().retrieve_checkout_session(session_id)
         
         if session.payment_status == 'paid':
             user_id = session.metadata.get('user_id')
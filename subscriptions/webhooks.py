@@ -0,0 +1,340 @@
+"""
+Stripe Webhook Inbox
+Records verified Stripe events on receipt and applies them in a worker, in order per customer
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Q, Sum
+from django.utils import timezone
+
+from .credits import add_report_credits, refund_report_credits
+from .models import CreditLedgerEntry, PaymentHistory, StripeEvent, SubscriptionPlan, UserSubscription
+
+logger = logging.getLogger(__name__)
+
+# Retry policy
+DEFAULT_MAX_ATTEMPTS = 8
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 60 * 60
+
+# Rows stuck in processing longer than this are assumed to belong to a dead worker
+STALE_LOCK_SECONDS = 5 * 60
+
+
+def _event_customer_id(event):
+    """Stripe customer an event belongs to (None when it has none)"""
+    obj = (event.get('data') or {}).get('object') or {}
+    if obj.get('object') == 'customer':
+        return obj.get('id')
+    customer = obj.get('customer')
+    if isinstance(customer, dict):
+        customer = customer.get('id')
+    return customer or None
+
+
+def record_event(event):
+    """
+    Store a verified Stripe event in the inbox
+
+    Args:
+        event (dict): Decoded event payload
+
+    Returns:
+        tuple: (StripeEvent or None, created) - created is False for a redelivery
+    """
+    try:
+        with transaction.atomic():
+            stripe_event = StripeEvent.objects.create(
+                event_id=event['id'],
+                type=event['type'],
+                customer_id=_event_customer_id(event),
+                payload=event,
+                stripe_created_at=datetime.fromtimestamp(event.get('created') or 0, tz=dt_timezone.utc),
+            )
+    except IntegrityError:
+        # Stripe retried an event we already have
+        return None, False
+    return stripe_event, True
+
+
+# ==================== Event handlers ====================
+
+def fulfill_checkout_session(session):
+    """
+    Record a paid Checkout Session and credit its reports exactly once
+
+    Called from the webhook worker and from the success-page confirmation;
+    whichever runs first does the work. The payment row is unique per
+    Checkout Session, so the loser of a race hits the constraint instead
+    of crediting twice; the credits themselves are a single F() UPDATE.
+
+    Args:
+        session (dict): Stripe Checkout Session
+
+    Returns:
+        tuple: (PaymentHistory or None, created)
+    """
+    metadata = session.get('metadata') or {}
+    user_id = metadata.get('user_id')
+    if not user_id:
+        return None, False
+    payment_intent_id = session.get('payment_intent')
+    customer_id = session.get('customer')
+    if isinstance(customer_id, dict):
+        customer_id = customer_id.get('id')
+
+    if payment_intent_id:
+        # Recorded before payments were keyed by session
+        legacy = PaymentHistory.objects.filter(
+            stripe_payment_intent_id=payment_intent_id,
+            stripe_checkout_session_id__isnull=True,
+            status='succeeded'
+        ).first()
+        if legacy:
+            return legacy, False
+
+    plan = SubscriptionPlan.objects.filter(id=metadata.get('plan_id')).first() if metadata.get('plan_id') else None
+    quantity = int(metadata.get('quantity') or 1)
+    if session.get('amount_total') is not None:
+        amount = Decimal(session['amount_total']) / 100
+    else:
+        amount = (plan.price_per_report if plan else Decimal('0')) * quantity
+
+    with transaction.atomic():
+        subscription, _ = UserSubscription.objects.get_or_create(user_id=user_id)
+        try:
+            with transaction.atomic():
+                payment = PaymentHistory.objects.create(
+                    user_id=user_id,
+                    subscription=subscription,
+                    plan=plan,
+                    amount=amount,
+                    reports_purchased=quantity,
+                    currency=(session.get('currency') or 'usd').upper(),
+                    status='succeeded',
+                    stripe_payment_intent_id=payment_intent_id or session['id'],
+                    stripe_checkout_session_id=session['id'],
+                    description=(
+                        f"Purchase of {quantity} {plan.name} report{'s' if quantity > 1 else ''}"
+                        if plan else "Stripe Checkout payment"
+                    )
+                )
+        except IntegrityError:
+            # Already fulfilled by the other path
+            return PaymentHistory.objects.get(stripe_checkout_session_id=session['id']), False
+
+        subscriptions = UserSubscription.objects.filter(pk=subscription.pk)
+        if customer_id:
+            subscriptions.filter(
+                Q(stripe_customer_id__isnull=True) | Q(stripe_customer_id='')
+            ).update(stripe_customer_id=customer_id)
+        if plan:
+            subscriptions.exclude(plan=plan).update(plan=plan)
+        if 'quantity' in metadata:
+            # Report bundle purchase (PurchaseReportView)
+            add_report_credits(user_id, quantity, payment=payment)
+
+        if metadata.get('request_id'):
+            _mark_request_paid(metadata['request_id'], payment_intent_id)
+
+    return payment, True
+
+
+def _mark_request_paid(request_id, payment_intent_id):
+    """Mark the background check a checkout paid for as paid"""
+    from background_requests.models import Request
+
+    bg_request = Request.objects.filter(id=request_id).exclude(payment_status='payment_completed').first()
+    if bg_request is None:
+        return
+    bg_request.payment_status = 'payment_completed'
+    bg_request.stripe_payment_intent_id = payment_intent_id
+    bg_request.payment_date = timezone.now()
+    bg_request.save()
+
+
+def handle_checkout_session_completed(session):
+    """Handle checkout.session.completed"""
+    if session.get('payment_status') not in (None, 'paid', 'no_payment_required'):
+        # Delayed payment methods complete later via async_payment_succeeded
+        return
+    fulfill_checkout_session(session)
+
+
+def handle_payment_succeeded(payment_intent):
+    """Handle payment_intent.succeeded: confirm payments recorded as pending"""
+    PaymentHistory.change_status(
+        PaymentHistory.objects.filter(stripe_payment_intent_id=payment_intent['id']),
+        'pending',
+        'succeeded'
+    )
+
+
+def handle_payment_failed(payment_intent):
+    """Handle payment_intent.payment_failed: record the failed attempt once"""
+    subscription = UserSubscription.objects.filter(
+        stripe_customer_id=payment_intent.get('customer')
+    ).select_related('plan').first()
+    if not subscription:
+        return
+
+    failure_reason = (payment_intent.get('last_payment_error') or {}).get('message') or 'Payment failed'
+    if PaymentHistory.objects.filter(
+        stripe_payment_intent_id=payment_intent['id'],
+        status='failed',
+        failure_reason=failure_reason[:255]
+    ).exists():
+        return
+
+    PaymentHistory.objects.create(
+        user_id=subscription.user_id,
+        subscription=subscription,
+        plan=subscription.plan,
+        amount=Decimal(payment_intent['amount']) / 100,
+        currency=payment_intent['currency'].upper(),
+        status='failed',
+        stripe_payment_intent_id=payment_intent['id'],
+        failure_reason=failure_reason[:255],
+        description=f"Failed payment for {subscription.plan.name if subscription.plan else 'Plan'}"
+    )
+
+
+def handle_charge_refunded(charge):
+    """Handle charge.refunded: mark a fully refunded payment and take back its unused reports"""
+    if not charge.get('refunded') or not charge.get('payment_intent'):
+        # Partial refunds are settled manually
+        return
+    payment = PaymentHistory.objects.filter(
+        stripe_payment_intent_id=charge['payment_intent'],
+        status='succeeded'
+    ).first()
+    if payment is None:
+        return
+
+    with transaction.atomic():
+        # Conditional update: a redelivered refund finds nothing left to change
+        if not PaymentHistory.change_status(PaymentHistory.objects.filter(pk=payment.pk), 'succeeded', 'refunded'):
+            return
+        purchased = payment.credit_entries.filter(
+            entry_type=CreditLedgerEntry.PURCHASE
+        ).aggregate(total=Sum('purchased_delta'))['total'] or 0
+        if purchased:
+            refund_report_credits(payment.user_id, purchased, payment=payment, note=f"Refund of {charge['id']}")
+
+
+EVENT_HANDLERS = {
+    'checkout.session.completed': handle_checkout_session_completed,
+    'checkout.session.async_payment_succeeded': fulfill_checkout_session,
+    'payment_intent.succeeded': handle_payment_succeeded,
+    'payment_intent.payment_failed': handle_payment_failed,
+    'charge.refunded': handle_charge_refunded,
+}
+
+
+# ==================== Worker ====================
+
+def claim_events(batch_size=50):
+    """
+    Lock and return the next events that are due
+
+    An event is only claimed once every earlier event of the same customer
+    has been processed (or given up on), so a customer's events are applied
+    in the order Stripe created them while different customers proceed in
+    parallel.
+    """
+    now = timezone.now()
+    unfinished = [StripeEvent.PENDING, StripeEvent.PROCESSING]
+    earlier_unfinished = StripeEvent.objects.filter(
+        customer_id=OuterRef('customer_id'),
+        status__in=unfinished,
+    ).filter(
+        Q(stripe_created_at__lt=OuterRef('stripe_created_at'))
+        | Q(stripe_created_at=OuterRef('stripe_created_at'), id__lt=OuterRef('id'))
+    )
+
+    with transaction.atomic():
+        # Release events abandoned by a crashed worker
+        StripeEvent.objects.filter(
+            status=StripeEvent.PROCESSING,
+            locked_at__lt=now - timedelta(seconds=STALE_LOCK_SECONDS)
+        ).update(status=StripeEvent.PENDING, locked_at=None)
+
+        events = list(
+            StripeEvent.objects.select_for_update(skip_locked=True)
+            .filter(status=StripeEvent.PENDING, next_attempt_at__lte=now)
+            .exclude(Q(customer_id__isnull=False) & Exists(earlier_unfinished))
+            .order_by('stripe_created_at', 'id')[:batch_size]
+        )
+        if events:
+            StripeEvent.objects.filter(
+                id__in=[event.id for event in events]
+            ).update(status=StripeEvent.PROCESSING, locked_at=now)
+
+    return events
+
+
+def process_event(stripe_event):
+    """
+    Apply one event with its handler
+
+    The handler and the status change commit together, so an event is never
+    applied without being marked as processed.
+    """
+    handler = EVENT_HANDLERS.get(stripe_event.type)
+    with transaction.atomic():
+        if handler:
+            handler(stripe_event.payload['data']['object'])
+        StripeEvent.objects.filter(pk=stripe_event.pk).update(
+            status=StripeEvent.PROCESSED,
+            attempts=stripe_event.attempts + 1,
+            locked_at=None,
+            last_error=None,
+            processed_at=timezone.now(),
+        )
+
+
+def _mark_failed(stripe_event, error, max_attempts):
+    attempts = stripe_event.attempts + 1
+    delay = min(BACKOFF_BASE_SECONDS * (2 ** (attempts - 1)), BACKOFF_MAX_SECONDS)
+    permanent = attempts >= max_attempts
+    StripeEvent.objects.filter(pk=stripe_event.pk).update(
+        status=StripeEvent.FAILED if permanent else StripeEvent.PENDING,
+        attempts=attempts,
+        next_attempt_at=timezone.now() + timedelta(seconds=delay),
+        locked_at=None,
+        last_error=str(error),
+    )
+    return permanent
+
+
+def process_batch(batch_size=50, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Claim and apply one batch of events
+
+    Returns:
+        dict: Counts of claimed, processed, retried and failed events
+    """
+    stats = {'claimed': 0, 'processed': 0, 'retried': 0, 'failed': 0}
+    events = claim_events(batch_size)
+    stats['claimed'] = len(events)
+
+    for stripe_event in events:
+        try:
+            process_event(stripe_event)
+            stats['processed'] += 1
+        except Exception as e:
+            logger.exception(f"Stripe event {stripe_event.event_id} ({stripe_event.type}) failed")
+            if _mark_failed(stripe_event, e, max_attempts):
+                stats['failed'] += 1
+            else:
+                stats['retried'] += 1
+
+    if events:
+        logger.info(
+            f"Stripe event batch: {stats['processed']} processed, "
+            f"{stats['retried']} retried, {stats['failed']} failed"
+        )
+    return stats